@@ -27,7 +27,10 @@ class DataLogger:
             ])
 
     def log(self, frame_count, data1, data2, gaze_direction):
-        """1フレーム分のデータをCSVファイルに追記"""
+        """
+        1フレーム分のデータをCSVファイルに追記
+        値が変わったフレームだけを記録してもよい（各行は次の行のフレームまで続いたものとして集計する）
+        """
         with open(self.log_file, mode='a', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
             writer.writerow([
@@ -37,25 +40,36 @@ class DataLogger:
                 gaze_direction
             ])
 
-    def save_report(self):
-        """ログファイルを読み込み、Excelとグラフでレポートを生成"""
+    def save_report(self, last_frame=None):
+        """
+        ログファイルを読み込み、Excelとグラフでレポートを生成
+        last_frame: 最後に描画したフレーム番号（最終行が何フレーム続いたかの計算に使う）
+        """
         print("分析レポートを生成しています...")
         try:
             df = pd.read_csv(self.log_file)
         except pd.errors.EmptyDataError:
             print("ログファイルが空です。レポートは生成されません。")
             return
+        if df.empty:
+            print("ログファイルが空です。レポートは生成されません。")
+            return
         
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         output_excel = os.path.join(self.data_dir, f"{timestamp}_report.xlsx")
 
-        # データ集計
-        emotions1 = df["Cam1_Emotion"].value_counts()
-        emotions2 = df["Cam2_Emotion"].value_counts()
+        # 各行が次の行までに何フレーム続いたか（変化したフレームだけが記録されているため）
+        frame_counts = df["Frame Count"]
+        end_frame = frame_counts.iloc[-1] if last_frame is None else max(last_frame, frame_counts.iloc[-1])
+        frames = frame_counts.shift(-1, fill_value=end_frame + 1) - frame_counts
+
+        # データ集計（フレーム数で重み付け）
+        emotions1 = frames.groupby(df["Cam1_Emotion"]).sum()
+        emotions2 = frames.groupby(df["Cam2_Emotion"]).sum()
         emotions_avg = (emotions1.add(emotions2, fill_value=0) / 2)
 
-        faces1 = df["Cam1_FaceDirection"].value_counts()
-        faces2 = df["Cam2_FaceDirection"].value_counts()
+        faces1 = frames.groupby(df["Cam1_FaceDirection"]).sum()
+        faces2 = frames.groupby(df["Cam2_FaceDirection"]).sum()
         faces_avg = (faces1.add(faces2, fill_value=0) / 2)
 
         # Excelに書き出し
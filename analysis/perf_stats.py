@@ -0,0 +1,131 @@
+import csv
+import json
+import os
+import threading
+import time
+import numpy as np
+from config import PERF_STATS_ENABLED, PERF_WINDOW
+
+
+class _StageTimer:
+    """with 文で囲んだ区間の処理時間を記録するタイマー"""
+    __slots__ = ('stats', 'stage', 'start')
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    """計測が無効な場合のタイマー（何もしない）"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class PerfStats:
+    """
+    処理段階（カメラ読み込み・YOLO・CNN・描画など）ごとの処理時間を記録するクラス
+    段階ごとに直近 window 回分をリングバッファに保持し、p50/p95/p99 を求める
+    計測には単調増加の time.perf_counter() を使う
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """プロセス全体で共有する計測器を返す"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __init__(self, window=PERF_WINDOW, enabled=PERF_STATS_ENABLED):
+        self.window = window
+        self.enabled = enabled
+        self.stages = {}  # 段階名 -> {'samples', 'count', 'total'}
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+
+    def measure(self, stage):
+        """with self.measure('yolo'): のように使い、区間の処理時間を記録する"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def record(self, stage, seconds):
+        """処理時間 (秒) を1回分記録する"""
+        if not self.enabled:
+            return
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = {'samples': np.zeros(self.window, dtype=np.float64), 'count': 0, 'total': 0.0}
+                self.stages[stage] = entry
+            entry['samples'][entry['count'] % self.window] = seconds
+            entry['count'] += 1
+            entry['total'] += seconds
+
+    def samples(self, stage):
+        """段階の直近の処理時間 (秒) の配列（古い順とは限らない）"""
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                return np.empty(0)
+            return entry['samples'][:min(entry['count'], self.window)].copy()
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.start_time = time.perf_counter()
+
+    def summary(self):
+        """段階ごとの回数・平均・p50/p95/p99・最大 (ミリ秒) を辞書で返す"""
+        with self.lock:
+            snapshot = {stage: (entry['samples'][:min(entry['count'], self.window)].copy(), entry['count'], entry['total'])
+                        for stage, entry in self.stages.items()}
+
+        result = {}
+        for stage, (samples, count, total) in sorted(snapshot.items()):
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+            result[stage] = {
+                "count": count,
+                "rate": count / max(time.perf_counter() - self.start_time, 1e-9),
+                "mean_ms": total / count * 1000,
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "max_ms": samples.max() * 1000,
+            }
+        return result
+
+    def export(self, log_file_path):
+        """セッションのログの隣に、集計結果を JSON と CSV で書き出す（例: mapping_log_perf.json）"""
+        summary = self.summary()
+        root, _ = os.path.splitext(log_file_path)
+        json_path, csv_path = f"{root}_perf.json", f"{root}_perf.csv"
+
+        with open(json_path, mode='w', encoding='utf-8') as file:
+            json.dump({"window": self.window, "stages": summary}, file, indent=2)
+        with open(csv_path, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(["Stage", "Count", "Rate", "Mean_ms", "P50_ms", "P95_ms", "P99_ms", "Max_ms"])
+            for stage, values in summary.items():
+                writer.writerow([stage] + [round(value, 4) for value in values.values()])
+        return json_path, csv_path
@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import time
+
+
+class _Span:
+    """with 文で囲んだ区間の開始・終了時刻をタイムラインに記録する"""
+    __slots__ = ('timeline', 'name', 'start')
+
+    def __init__(self, timeline, name):
+        self.timeline = timeline
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timeline.add(self.name, self.start, time.perf_counter())
+        return False
+
+
+class StartupTimeline:
+    """
+    起動時の処理（モデルの読み込み・ウォームアップ・カメラの準備など）の開始と終了の時刻を記録するクラス
+    並列に読み込んだ処理は区間が重なるため、起動にかかった時間の内訳を確認できる
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """プロセス全体で共有するタイムラインを返す"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []  # (名前, 開始, 終了, スレッド名)。時刻は origin からの秒数
+        self.lock = threading.Lock()
+
+    def span(self, name):
+        """with self.span('yolo'): のように使い、区間を記録する"""
+        return _Span(self, name)
+
+    def mark(self, name):
+        """その時点の出来事（最初の推論結果が届いた、など）を長さ0の区間として記録する"""
+        now = time.perf_counter()
+        self.add(name, now, now)
+
+    def add(self, name, start, end):
+        with self.lock:
+            self.events.append((name, start - self.origin, end - self.origin, threading.current_thread().name))
+
+    def report(self):
+        """開始時刻の順に、各区間の開始・終了・長さ (秒) を表示する"""
+        with self.lock:
+            events = sorted(self.events, key=lambda event: event[1])
+        print(f"{'startup':<40}{'start':>8}{'end':>8}{'took':>8}  thread")
+        for name, start, end, thread in events:
+            took = f"{end - start:>8.2f}" if end > start else f"{'':>8}"
+            print(f"{name:<40}{start:>8.2f}{end:>8.2f}{took}  {thread}")
+
+    def export(self, log_file_path):
+        """セッションのログの隣に JSON で書き出す（例: mapping_log_startup.json）"""
+        root, _ = os.path.splitext(log_file_path)
+        path = f"{root}_startup.json"
+        with self.lock:
+            events = [{"name": name, "start": start, "end": end, "thread": thread}
+                      for name, start, end, thread in sorted(self.events, key=lambda event: event[1])]
+        with open(path, mode='w', encoding='utf-8') as file:
+            json.dump({"events": events}, file, indent=2)
+        return path
@@ -0,0 +1,73 @@
+"""
+顔検出の縮小率ごとの処理速度と検出率を比較するベンチマーク
+
+    python -m benchmarks.bench_detection_scale [--source 録画.mp4] [--frames 100]
+
+縮小せずに検出した顔を基準に、各縮小率で同じ顔（IoU 0.5 以上）を見つけられた割合と、
+1フレームあたりの検出時間・スループットを表示する
+source にはカメラID・動画・画像ディレクトリ・"synthetic:N" を指定できる
+"""
+import argparse
+import time
+import numpy as np
+
+from config import DETECTION_SCALES
+from input_processing.emotion_detector import EmotionDetector, choose_detection_scale
+from input_processing.face_tracker import box_iou
+from input_processing.frame_source import open_frame_source
+
+
+def load_frames(source, num_frames):
+    cap = open_frame_source(source, realtime=False)
+    frames = []
+    while len(frames) < num_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def count_matches(reference, boxes):
+    """基準の矩形のうち、IoU 0.5 以上の矩形が見つかった数"""
+    return sum(any(box_iou(ref, box) >= 0.5 for box in boxes) for ref in reference)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', default="synthetic:4")
+    parser.add_argument('--frames', type=int, default=100)
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames)
+    if not frames:
+        print(f"{args.source} からフレームを読み込めませんでした。")
+        return
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames ({width}x{height}), auto scale = {choose_detection_scale(height)}")
+
+    detector = EmotionDetector()
+    detector.detection_scale = 1.0
+    detector.detect_boxes(frames[0])  # ウォームアップ
+    reference = [detector.detect_boxes(frame) for frame in frames]
+    total_faces = sum(len(boxes) for boxes in reference)
+
+    print(f"{'scale':>5} | {'input':>9} | {'ms/frame':>8} | {'fps':>6} | {'recall [%]':>10} | {'frames w/ face [%]':>18}")
+    print("-" * 72)
+    for scale in sorted(DETECTION_SCALES):
+        detector.detection_scale = scale
+        detector.detect_boxes(frames[0])
+        start = time.perf_counter()
+        detected = [detector.detect_boxes(frame) for frame in frames]
+        elapsed = (time.perf_counter() - start) / len(frames)
+
+        matched = sum(count_matches(ref, boxes) for ref, boxes in zip(reference, detected))
+        recall = matched / total_faces * 100 if total_faces else float('nan')
+        with_face = np.mean([len(boxes) > 0 for boxes in detected]) * 100
+        size = f"{int(width * scale)}x{int(height * scale)}"
+        print(f"{scale:>5.2f} | {size:>9} | {elapsed * 1000:>8.2f} | {1 / elapsed:>6.1f} | {recall:>10.1f} | {with_face:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+感情CNNの推論バックエンドごとの精度と速度を比較するベンチマーク
+
+    python -m benchmarks.bench_emotion_backends [--csv ./fer2013.csv]
+
+eager（fp32）の出力を基準に、各バックエンドの予測クラスの一致率と確率の最大誤差、
+およびバッチサイズごとの1回の順伝播の処理時間を表示する
+FER2013 のCSVがあればその画像で校正・比較し、なければランダムな画像を使う
+（学習済みの重みがない場合はランダムな重みで速度のみを比較する）
+"""
+import argparse
+import os
+import time
+import torch
+
+from config import EMOTION_MODEL_PATH
+from train_model import EmotionCNN, load_calibration_batches
+from input_processing.emotion_backends import BACKENDS, build_backend, load_eager_model
+
+BATCH_SIZES = [1, 2, 4, 8, 16, 32]
+REPEATS = 50
+
+
+def measure(func, repeats=REPEATS):
+    func()  # ウォームアップ（TorchScript は最初の数回で最適化される）
+    func()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default='./fer2013.csv', help="校正・精度比較に使う FER2013 のCSV")
+    parser.add_argument('--samples', type=int, default=512)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    if os.path.exists(EMOTION_MODEL_PATH):
+        model = load_eager_model(EMOTION_MODEL_PATH)
+    else:
+        print(f"{EMOTION_MODEL_PATH} が見つからないため、ランダムな重みを使用します。")
+        model = EmotionCNN().eval()
+
+    if os.path.exists(args.csv):
+        batches = load_calibration_batches(args.csv, args.samples)
+    else:
+        print(f"{args.csv} が見つからないため、ランダムな画像を使用します。")
+        batches = list(torch.split(torch.rand(args.samples, 1, 48, 48) * 2 - 1, 64))
+    # 半分を校正、残り半分を精度比較に使う
+    half = max(1, len(batches) // 2)
+    calibration, evaluation = batches[:half], batches[half:] or batches
+    images = torch.cat(evaluation)
+
+    with torch.no_grad():
+        reference = torch.softmax(model(images), dim=1)
+
+    results = {}
+    for backend in BACKENDS:
+        backend_model = build_backend(model, backend, calibration)
+        with torch.no_grad():
+            probabilities = torch.softmax(backend_model(images), dim=1)
+        agreement = (probabilities.argmax(1) == reference.argmax(1)).float().mean().item() * 100
+        max_error = (probabilities - reference).abs().max().item()
+
+        timings = []
+        for batch_size in BATCH_SIZES:
+            batch = images[:batch_size] if len(images) >= batch_size else torch.rand(batch_size, 1, 48, 48) * 2 - 1
+            with torch.no_grad():
+                timings.append(measure(lambda: backend_model(batch)))
+        results[backend] = (agreement, max_error, timings)
+
+    header = " | ".join(f"{f'b={b} [ms]':>10}" for b in BATCH_SIZES)
+    print(f"{'backend':>12} | {'agree [%]':>9} | {'max err':>7} | {header} | {'speedup(b=32)':>13}")
+    print("-" * (52 + 13 * len(BATCH_SIZES)))
+    eager_time = results['eager'][2][-1]
+    for backend, (agreement, max_error, timings) in results.items():
+        row = " | ".join(f"{t:>10.3f}" for t in timings)
+        print(f"{backend:>12} | {agreement:>9.1f} | {max_error:>7.4f} | {row} | {eager_time / timings[-1]:>12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
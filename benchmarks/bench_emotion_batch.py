@@ -0,0 +1,84 @@
+"""
+顔の数ごとの感情分類コストを比較するベンチマーク
+
+    python -m benchmarks.bench_emotion_batch
+
+従来の1顔ずつの分類（PILベースの transforms + 顔ごとの順伝播）と、
+EmotionClassifier による一括分類の1フレームあたりの処理時間を表示する
+"""
+import os
+import time
+import numpy as np
+import torch
+from torchvision import transforms
+
+from config import EMOTION_MODEL_PATH
+from train_model import EmotionCNN
+from input_processing.emotion_detector import EmotionClassifier
+
+FACE_COUNTS = [1, 4, 16, 32]
+FRAME_SHAPE = (720, 1280)
+REPEATS = 30
+
+
+def load_model(device):
+    model = EmotionCNN()
+    if os.path.exists(EMOTION_MODEL_PATH):
+        model.load_state_dict(torch.load(EMOTION_MODEL_PATH, map_location=device))
+    return model.to(device).eval()
+
+
+def make_boxes(num_faces, rng):
+    """フレーム内にランダムな顔矩形 (N,4) を生成する"""
+    h, w = FRAME_SHAPE
+    sizes = rng.integers(60, 200, size=num_faces)
+    x1 = rng.integers(0, w - sizes)
+    y1 = rng.integers(0, h - sizes)
+    return np.stack([x1, y1, x1 + sizes, y1 + sizes], axis=1)
+
+
+def per_face_predict(gray, boxes, model, transform, device):
+    """変更前の EmotionDetector.detect と同じ1顔ずつの処理"""
+    results = []
+    for x1, y1, x2, y2 in boxes:
+        roi_tensor = transform(gray[y1:y2, x1:x2]).unsqueeze(0).to(device)
+        model.to(device).eval()
+        with torch.no_grad():
+            results.append(torch.softmax(model(roi_tensor), dim=1))
+    return results
+
+
+def measure(func, repeats=REPEATS):
+    func()  # ウォームアップ
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    device = torch.device('cpu')
+    model = load_model(device)
+    classifier = EmotionClassifier(device=device)
+    transform = transforms.Compose([
+        transforms.ToPILImage(),
+        transforms.Grayscale(),
+        transforms.Resize((48, 48)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.5], std=[0.5])
+    ])
+
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 256, size=FRAME_SHAPE, dtype=np.uint8)
+
+    print(f"{'faces':>5} | {'per-face [ms]':>13} | {'batched [ms]':>12} | {'speedup':>7}")
+    print("-" * 48)
+    for num_faces in FACE_COUNTS:
+        boxes = make_boxes(num_faces, rng)
+        sequential = measure(lambda: per_face_predict(gray, boxes, model, transform, device))
+        batched = measure(lambda: classifier.predict(gray, boxes, model))
+        print(f"{num_faces:>5} | {sequential:>13.2f} | {batched:>12.2f} | {sequential / batched:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+センシング処理（顔検出・追跡・感情認識・ランドマーク）の性能を計測するベンチマーク
+
+    python -m benchmarks.bench_sensing [--faces 1,4,8] [--sensors 1,2] [--size 1280x720]
+    python -m benchmarks.bench_sensing --source 録画.mp4
+
+合成フレーム（または録画）を実時間に合わせず最速で Sensor に流し、マイクは使わずに映像の処理だけを計測する
+1センサーあたりのスループット・フレーム時間のパーセンタイル・段階ごとの p50・CPU使用率・最大メモリを表示して JSON に保存する
+"""
+import argparse
+import time
+
+from analysis.perf_stats import PerfStats
+from input_processing.frame_source import SyntheticFaceSource, open_frame_source
+from input_processing.inference_engine import InferenceEngine
+from input_processing.sensor import Sensor
+from benchmarks.common import ResourceMonitor, frame_time_metrics, save_results, print_results
+
+WARMUP_FRAMES = 10
+STAGES = ('camera.read', 'sensor.gray', 'sensor.track', 'sensor.infer', 'detector.yolo',
+          'classifier.preprocess', 'classifier.cnn', 'engine.landmarks')
+
+
+def make_source(args, num_faces, index):
+    if args.source is not None:
+        return open_frame_source(args.source, realtime=False)
+    width, height = (int(v) for v in args.size.split('x'))
+    return SyntheticFaceSource(num_faces=num_faces, width=width, height=height, realtime=False, seed=index)
+
+
+def wait_frames(sensors, count, timeout):
+    deadline = time.monotonic() + timeout
+    while min(sensor.frames_processed for sensor in sensors) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def run(args, engine, num_faces, num_sensors):
+    perf = PerfStats.shared()
+    sensors = [Sensor(make_source(args, num_faces, i), mic_id=None, engine=engine) for i in range(num_sensors)]
+    for sensor in sensors:
+        sensor.start(audio=False)
+
+    # ウォームアップ後に計測をやり直す
+    wait_frames(sensors, WARMUP_FRAMES, args.timeout)
+    perf.window = args.frames * num_sensors
+    perf.reset()
+    start_counts = [sensor.frames_processed for sensor in sensors]
+    with ResourceMonitor() as monitor:
+        wait_frames(sensors, WARMUP_FRAMES + args.frames, args.timeout)
+    processed = sum(sensor.frames_processed - count for sensor, count in zip(sensors, start_counts))
+
+    for sensor in sensors:
+        sensor.stop()
+
+    metrics = frame_time_metrics(perf.samples('sensor.frame'))
+    metrics.update(monitor.metrics())
+    metrics["total_fps"] = processed / monitor.wall if monitor.wall > 0 else 0.0
+    summary = perf.summary()
+    for stage in STAGES:
+        if stage in summary:
+            metrics[f"{stage}.p50_ms"] = summary[stage]["p50_ms"]
+    metrics.update({f"engine.{name}": value for name, value in engine.get_stats().items()})
+    return metrics
+
+
+def int_list(text):
+    return [int(v) for v in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', default=None, help="合成フレームの代わりに使う動画・画像ディレクトリ")
+    parser.add_argument('--faces', type=int_list, default=[1, 4])
+    parser.add_argument('--sensors', type=int_list, default=[1])
+    parser.add_argument('--size', default="1280x720")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    engine = InferenceEngine.shared()
+    results = []
+    for num_sensors in args.sensors:
+        for num_faces in ([0] if args.source else args.faces):
+            params = {"sensors": num_sensors, "size": args.size if args.source is None else args.source}
+            if args.source is None:
+                params["faces"] = num_faces
+            metrics = run(args, engine, num_faces, num_sensors)
+            results.append({"name": "sensing", "params": params, "metrics": metrics})
+            print(f"{params}: {metrics['total_fps']:.1f} fps (all sensors), p95 {metrics.get('p95_ms', 0):.2f} ms")
+
+    print()
+    print_results(results, columns=("total_fps", "p50_ms", "p95_ms", "p99_ms", "cpu_percent", "peak_rss_mb"))
+    if not args.no_save:
+        save_results("sensing", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+ビジュアルエフェクトごとの描画性能を、ウィンドウを開かずに計測するベンチマーク
+
+    python -m benchmarks.bench_visuals [--visuals boids,gaze] [--sizes 1280x920,1920x1080] [--boids 50,200]
+
+SDL の dummy ビデオドライバで各エフェクトの update + draw を繰り返し、
+スループット・フレーム時間のパーセンタイル・update と draw それぞれの時間・フレームあたりの Surface の作成数・
+CPU使用率・最大メモリを表示して JSON に保存する
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import itertools
+import time
+import pygame
+
+from config import FPS
+from visuals.confetti import Confetti
+from visuals.particle_fountain import ParticleFountain
+from visuals.boids import Boids
+from visuals.emotional_wave import EmotionalWave
+from visuals.gaze_particles import GazeParticles
+from benchmarks.common import ResourceMonitor, frame_time_metrics, save_results, print_results
+
+EMOTIONS = ['Neutral', 'Happy', 'Angry', 'Sad', 'Surprise', 'Fear', 'Disgust']
+GAZES = ['center', 'left', 'right']
+WARMUP_FRAMES = 30
+
+
+class CountingSurface(pygame.Surface):
+    """作られた Surface の数を数える（エフェクトの描画ごとの確保回数の計測用）"""
+    created = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        CountingSurface.created += 1
+
+
+def make_visual(name, screen, params):
+    """エフェクトの、フレーム番号を受け取って update を行う関数と draw を行う関数を返す"""
+    dt = 1.0 / FPS
+    if name == 'confetti':
+        effect = Confetti(screen.get_width(), screen.get_height(), num_petals=params['petals'])
+        return (lambda i: effect.update(True, dt)), (lambda: effect.draw(screen))
+    if name == 'fountain':
+        effect = ParticleFountain(screen, position='left')
+        return (lambda i: effect.update(EMOTIONS[(i // 60) % len(EMOTIONS)], params['volume'])), effect.draw
+    if name == 'boids':
+        effect = Boids(screen, shape='triangle', num_boids=params['boids'])
+        return (lambda i: effect.update(EMOTIONS[(i // 90) % len(EMOTIONS)])), effect.draw
+    if name == 'wave':
+        effect = EmotionalWave(screen)
+        return (lambda i: effect.update(EMOTIONS[(i // 90) % len(EMOTIONS)], i)), effect.draw
+    if name == 'gaze':
+        effect = GazeParticles(screen, num_particles=params['particles'])
+        return (lambda i: effect.update(GAZES[(i // 60) % len(GAZES)])), effect.draw
+    raise ValueError(f"Unknown visual: {name}")
+
+
+def visual_params(name, args):
+    """エフェクトごとに変化させるパラメータの組み合わせ"""
+    sweeps = {
+        'confetti': {'petals': args.petals},
+        'fountain': {'volume': args.volume},
+        'boids': {'boids': args.boids},
+        'wave': {},
+        'gaze': {'particles': args.particles},
+    }[name]
+    keys = list(sweeps)
+    for size in args.sizes:
+        for values in itertools.product(*(sweeps[key] for key in keys)):
+            yield {'size': size, **dict(zip(keys, values))}
+
+
+def run(name, params, frames):
+    width, height = (int(v) for v in params['size'].split('x'))
+    screen = pygame.display.set_mode((width, height))
+    update, draw = make_visual(name, screen, params)
+
+    for i in range(WARMUP_FRAMES):
+        screen.fill((0, 0, 0))
+        update(i)
+        draw()
+
+    frame_times, update_times, draw_times = [], [], []
+    CountingSurface.created = 0
+    with ResourceMonitor() as monitor:
+        for i in range(WARMUP_FRAMES, WARMUP_FRAMES + frames):
+            start = time.perf_counter()
+            screen.fill((0, 0, 0))
+            update(i)
+            updated = time.perf_counter()
+            draw()
+            drawn = time.perf_counter()
+            pygame.display.flip()
+            frame_times.append(time.perf_counter() - start)
+            update_times.append(updated - start)
+            draw_times.append(drawn - updated)
+    metrics = {**frame_time_metrics(frame_times), **monitor.metrics()}
+    metrics["update_ms"] = sum(update_times) / frames * 1000
+    metrics["draw_ms"] = sum(draw_times) / frames * 1000
+    metrics["surfaces_per_frame"] = CountingSurface.created / frames
+    return metrics
+
+
+def int_list(text):
+    return [int(v) for v in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--visuals', default="confetti,fountain,boids,wave,gaze")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--sizes', type=lambda text: text.split(','), default=["1280x920"])
+    parser.add_argument('--boids', type=int_list, default=[200, 5000])
+    parser.add_argument('--particles', type=int_list, default=[3000, 100000])
+    parser.add_argument('--petals', type=int_list, default=[100, 500])
+    parser.add_argument('--volume', type=int_list, default=[20, 60])
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    # エフェクトが描画のたびに Surface を作っていないかを数える
+    pygame.Surface = CountingSurface
+    pygame.init()
+    results = []
+    for name in args.visuals.split(','):
+        for params in visual_params(name, args):
+            metrics = run(name, params, args.frames)
+            results.append({"name": name, "params": params, "metrics": metrics})
+            print(f"{name} {params}: {metrics['fps']:.1f} fps, p95 {metrics['p95_ms']:.2f} ms")
+    pygame.quit()
+
+    print()
+    print_results(results, columns=("fps", "p95_ms", "update_ms", "draw_ms", "surfaces_per_frame", "peak_rss_mb"))
+    if not args.no_save:
+        save_results("visuals", results)
+
+
+if __name__ == "__main__":
+    main()
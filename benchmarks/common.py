@@ -0,0 +1,112 @@
+"""
+ベンチマーク共通の計測・保存処理
+
+結果は DATA_DIR/benchmarks/<ベンチマーク名>-<コミット>-<日時>.json に保存し、
+benchmarks.compare で別のコミットの結果と比較できる
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+
+from config import DATA_DIR
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESULTS_DIR = os.path.join(DATA_DIR, "benchmarks")
+
+
+def peak_rss_mb():
+    """プロセスの最大常駐メモリ (MB)。取得できない環境では None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class ResourceMonitor:
+    """with 文で囲んだ区間の経過時間・CPU時間（全スレッドの合計）を計測する"""
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self.wall_start
+        self.cpu = time.process_time() - self.cpu_start
+        return False
+
+    def metrics(self):
+        return {
+            "wall_s": self.wall,
+            # 100% で1コア分。マルチスレッドの処理では100%を超えることがある
+            "cpu_percent": self.cpu / self.wall * 100 if self.wall > 0 else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+def frame_time_metrics(frame_times):
+    """フレームごとの処理時間 (秒) の配列から、スループットとパーセンタイル (ミリ秒) を求める"""
+    frame_times = np.asarray(frame_times, dtype=np.float64)
+    if len(frame_times) == 0:
+        return {"frames": 0}
+    p50, p95, p99 = np.percentile(frame_times, [50, 95, 99]) * 1000
+    return {
+        "frames": len(frame_times),
+        "fps": len(frame_times) / frame_times.sum() if frame_times.sum() > 0 else 0.0,
+        "mean_ms": frame_times.mean() * 1000,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "max_ms": frame_times.max() * 1000,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(benchmark, results, output_dir=RESULTS_DIR):
+    """
+    結果のリスト [{'name', 'params', 'metrics'}, ...] を、実行環境の情報と一緒にJSONで保存する
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    commit = git_commit()
+    path = os.path.join(output_dir, f"{benchmark}-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    document = {
+        "benchmark": benchmark,
+        "commit": commit,
+        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "platform": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(path, mode='w', encoding='utf-8') as file:
+        json.dump(document, file, indent=2)
+    print(f"結果を {path} に保存しました。")
+    return path
+
+
+def print_results(results, columns=("fps", "p50_ms", "p95_ms", "p99_ms", "cpu_percent", "peak_rss_mb")):
+    widths = [max(13, len(column) + 2) for column in columns]
+    header = f"{'name':<44}" + "".join(f"{column:>{width}}" for column, width in zip(columns, widths))
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        label = result["name"] + " " + ",".join(f"{k}={v}" for k, v in result["params"].items())
+        values = "".join(f"{result['metrics'].get(column) or 0:>{width}.2f}" for column, width in zip(columns, widths))
+        print(f"{label[:43]:<44}{values}")
@@ -0,0 +1,66 @@
+"""
+2つのベンチマーク結果 (JSON) を比較し、指標ごとの変化率を表示する
+
+    python -m benchmarks.compare 変更前.json 変更後.json [--threshold 5]
+
+同じ name と params の結果どうしを比較し、threshold (%) 以上悪化した指標に印を付ける
+fps を含む指標は大きいほど良く、それ以外（時間・CPU・メモリ）は小さいほど良いものとして扱う
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        document = json.load(file)
+    results = {}
+    for result in document["results"]:
+        key = (result["name"], json.dumps(result["params"], sort_keys=True))
+        results[key] = result["metrics"]
+    return document, results
+
+
+def higher_is_better(metric):
+    return "fps" in metric or metric.endswith("skip_rate") or metric.endswith("hit_rate")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=5.0, help="悪化とみなす変化率 (%%)")
+    args = parser.parse_args()
+
+    before_doc, before = load(args.before)
+    after_doc, after = load(args.after)
+    print(f"{before_doc['benchmark']}: {before_doc['commit']} ({before_doc['timestamp']}) -> "
+          f"{after_doc['commit']} ({after_doc['timestamp']})")
+
+    regressions = 0
+    for key in sorted(before.keys() & after.keys()):
+        name, params = key
+        print(f"\n{name} {params}")
+        for metric in sorted(before[key].keys() & after[key].keys()):
+            old, new = before[key][metric], after[key][metric]
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or isinstance(old, bool):
+                continue
+            change = (new - old) / abs(old) * 100 if old else 0.0
+            worse = -change if higher_is_better(metric) else change
+            mark = ""
+            if worse >= args.threshold:
+                mark = "  <-- regression"
+                regressions += 1
+            elif worse <= -args.threshold:
+                mark = "  (improved)"
+            print(f"  {metric:<32}{old:>12.3f}{new:>12.3f}{change:>+9.1f}%{mark}")
+
+    for key in sorted(before.keys() ^ after.keys()):
+        print(f"\n{key[0]} {key[1]}: 片方の結果にしかありません")
+
+    print(f"\n{regressions} 件の指標が {args.threshold}% 以上悪化しました。")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
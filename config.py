@@ -5,19 +5,107 @@ SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 920
 FPS = 30
 DURATION = 180  # プログラムの実行時間 (秒)
-CAMERA_WAIT_TIME = 10 # カメラやマイクが安定するまでの待機時間 (秒)
+STARTUP_TIMEOUT = 30 # 全センサーの最初の推論結果を待つ時間の上限 (秒)。揃わなくても描画を開始する
+WARM_UP_MODELS = True # 起動時にダミーのフレームで推論を1回行い、初回の推論の遅さを最初のフレームに持ち越さない
 
 # --- 機能の有効化 ---
-SHOW_DEBUG_WINDOWS = True
+SHOW_DEBUG_WINDOWS = True # False の場合、デバッグ表示のための描画を一切行わない
+DEBUG_VIEW_MODE = 'window' # 'window': OpenCVのウィンドウ, 'tile': Pygameの画面の右下に縮小して表示
+DEBUG_VIEW_FPS = 10 # デバッグ表示を更新する頻度の上限 (回/秒)
+DEBUG_TILE_SIZE = (320, 240) # 'tile' の場合の1枚の大きさ (幅, 高さ)
 NUM_SENSORS = 1
 USE_GAZE_TRACKING = False 
 ACTIVE_VISUALS = ['fountain' ] # 使用するビジュアル: 'confetti', 'fountain', 'boids', 'wave', 'gaze'
+CONFETTI_PETAL_COUNT = 100 # confetti の花びらの数
+BOIDS_COUNT = 50 # boids の個体数
+BOIDS_MAX_NEIGHBORS = 8 # boids の各個体が近傍として使う、最も近い個体の数の上限
+GAZE_PARTICLE_COUNT = 3000 # gaze のパーティクルの数
+FOUNTAIN_BALL_CAPACITY = 20000 # fountain の片側で同時に存在できるボールの数
+FOUNTAIN_PARTICLE_CAPACITY = 200000 # fountain の片側で同時に存在できる、ボールの消滅時のパーティクルの数
+SPRITE_CACHE_SIZE = 512 # 粒子の描画に使い回すスプライトの数の上限（超えた場合は最も長く使われていないものを捨てる）
+SPRITE_ALPHA_LEVELS = 32 # スプライトの不透明度を何段階に量子化するか
+WAVE_LINES = 25 # wave の線の数
+WAVE_X_STEP = 3 # wave の線を計算する x の間隔（ピクセル）。小さくすると滑らかになる
+WAVE_NOISE_TEXTURE = False # True の場合、wave のノイズを前もって計算した表から補間して引く
+
+# --- プロセス分離 ---
+# True の場合、各センサーと視線追跡を別プロセスで動かし、結果を共有メモリで受け取る
+# （描画ループとのGILの競合がなくなる代わりに、モデルはプロセスごとに読み込まれる）
+USE_PROCESS_ISOLATION = False
+WORKER_DEBUG_FRAME_SIZE = (320, 240) # 共有メモリで受け渡すデバッグ用フレームの大きさ (幅, 高さ)
+WORKER_DEBUG_MAX_BOXES = 8 # デバッグ用フレームと一緒に共有メモリで受け渡す顔の矩形の最大数
+SHARED_READ_TIMEOUT = 0.01 # 共有メモリの状態が書き込み中のまま読めない場合に、前回の値を使うまでの待ち時間 (秒)
+
+# --- 推論エンジン ---
+# 全センサーで共有する推論エンジンが、複数フレームをまとめて処理する際の待ち時間と最大数
+INFERENCE_BATCH_WINDOW = 0.005 # 最初のフレームが届いてから他のセンサーを待つ時間 (秒)
+INFERENCE_MAX_BATCH = 8 # 1回の推論でまとめるフレームの最大数
+# 感情CNNの推論バックエンド: 'eager', 'torchscript', 'fused', 'dynamic_int8', 'static_int8'
+# eager 以外は `python train_model.py --export <backend>` で書き出したモデルを使用する（int8 は CPU のみ）
+EMOTION_BACKEND = 'eager'
+# 顔の見た目がほとんど変わっていない場合は、前回の感情認識の結果を再利用してCNNを省略する
+USE_CHANGE_GATE = True
+CHANGE_GATE_SIZE = 16 # 比較に使う縮小画像の大きさ (ピクセル)
+CHANGE_GATE_THRESHOLD = 0.04 # 縮小画像の平均絶対差 (0-1) がこれ未満なら再利用する
+CHANGE_GATE_REFRESH_INTERVAL = 15 # 変化がなくてもこのフレーム数ごとに再分類する
+# 量子化した顔画像ごとの感情認識の結果を全センサーで共有して記録し、同じ見た目の顔ではCNNを省略する
+USE_EMOTION_CACHE = True
+EMOTION_CACHE_MAX_BYTES = 4 * 1024 * 1024 # 記録の合計サイズの上限 (バイト)
+EMOTION_CACHE_QUANTIZATION_BITS = 4 # 比較に使う画素値のビット数（小さいほど多少の違いを同じ顔とみなす）
+
+# --- カメラ・顔検出の解像度 ---
+# カメラに要求する取得解像度・フレームレート・圧縮形式（None の場合はデバイスの既定値のまま）
+CAPTURE_WIDTH = 1280
+CAPTURE_HEIGHT = 720
+CAPTURE_FPS = 30
+CAPTURE_FOURCC = 'MJPG' # 高解像度でもUSB帯域に収まりやすい
+# 顔検出（YOLO）は縮小したフレームで行い、矩形を元の解像度に戻してランドマーク推定に使う
+# 'auto' の場合は、CAMERA_VERTICAL_FOV と FACE_MAX_DISTANCE から最も遠い顔の大きさを見積もり、
+# その顔が DETECTION_MIN_FACE_PIXELS 以上で写る最小の縮小率を DETECTION_SCALES から選ぶ
+DETECTION_SCALE = 'auto'
+DETECTION_SCALES = (0.25, 0.35, 0.5, 0.75, 1.0)
+DETECTION_MAX_SIZE = 640 # YOLOに入力する画像の長辺の上限 (ピクセル)
+DETECTION_MIN_FACE_PIXELS = 24 # YOLOが安定して検出できる顔の高さ (縮小後のピクセル)
+CAMERA_VERTICAL_FOV = 50 # カメラの垂直画角 (度)
+FACE_MAX_DISTANCE = 3.0 # 検出したい最も遠い顔までの距離 (m)
+
+# --- 顔追跡 ---
+# 顔検出（YOLO）はNフレームごとに行い、その間はオプティカルフローで顔を追跡する
+USE_FACE_TRACKING = True
+DETECTION_INTERVAL_MIN = 1 # 検出間隔Nの最小値 (フレーム)
+DETECTION_INTERVAL_MAX = 15 # 検出間隔Nの最大値 (フレーム)
+DETECTION_CPU_BUDGET = 0.3 # 1フレームの処理時間のうち、顔検出に使ってよい割合
+
+# --- 視線追跡 ---
+# 視線追跡と同じカメラのセンサーがある場合は、そのセンサーの顔ランドマークを再利用する（顔検出を重複させない）
+GAZE_REUSE_SENSOR_LANDMARKS = True
+GAZE_EYE_ROI_SIZE = (32, 16) # 瞳孔を探す目の領域を縮小する大きさ (幅, 高さ)
+GAZE_PUPIL_DARKNESS = 25 # 目の領域で最も暗い画素からこの値以内の明るさの画素を瞳孔とみなす
+GAZE_HORIZONTAL_THRESHOLD = 0.15 # 瞳孔の位置が目の中心から目の幅のこの割合以上ずれたら左右とみなす
+GAZE_BLINK_EAR = 0.2 # 目の縦横比 (EAR) がこれ未満なら目を閉じているとみなす
+
+# --- 音声解析 ---
+AUDIO_SAMPLE_RATE = 44100
+AUDIO_HOP_SIZE = 512 # 特徴量を計算する間隔 (サンプル)
+AUDIO_FFT_SIZE = 1024
+AUDIO_NUM_BANDS = 8 # スペクトルを分割する帯域数（対数間隔）
+AUDIO_SMOOTHING = 0.3 # 音量の平滑化係数 (0-1、大きいほど新しい値を重視)
+STATE_VOLUME_EPSILON = 0.1 # 音量がこれ以上変化した場合のみ、新しい状態として公開する
+AUDIO_ONSET_THRESHOLD = 3.0 # スペクトル変化が直近の平均より標準偏差の何倍大きければ音の立ち上がりとみなすか
+
+# --- 処理時間の計測 ---
+PERF_STATS_ENABLED = True # 処理段階ごとの処理時間を計測し、終了時にログの隣へ JSON/CSV で書き出す
+PERF_WINDOW = 600 # パーセンタイルの計算に使う直近の計測回数
+PERF_HUD_KEY = 'p' # 画面上の計測結果の表示を切り替えるキー
 
 # --- デバイスID ---
+# カメラIDの代わりに、動画ファイル・画像ディレクトリのパスや "synthetic"（合成顔、"synthetic:4" で4人）も指定できます
+FRAME_SOURCE_REALTIME = True # False の場合、動画・画像・合成フレームを実時間に合わせず可能な限り速く読み込む
 # NUM_SENSORS = 1 の場合、CAMERA1_ID と MIC1_ID のみが使用されます
 CAMERA1_ID = 0
 CAMERA2_ID = 0
 GAZE_CAMERA_ID = 0
+# マイクIDの代わりにWAVファイルのパスも指定できます
 # NUM_SENSORS = 2 の場合にのみ、以下のIDが使用されます
 MIC1_ID = 1  
 MIC2_ID = 5
@@ -0,0 +1,208 @@
+import numpy as np
+import threading
+import time
+import wave
+from config import (AUDIO_SAMPLE_RATE, AUDIO_HOP_SIZE, AUDIO_FFT_SIZE, AUDIO_NUM_BANDS,
+                    AUDIO_SMOOTHING, AUDIO_ONSET_THRESHOLD)
+
+
+class AudioFeatures:
+    """1ホップ分の音響特徴量。公開後は書き換えないため、別スレッドからロックなしで読める"""
+    def __init__(self, seq, timestamp, rms, peak, volume, smoothed_volume, bands, centroid, onset, onset_strength):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.rms = rms
+        self.peak = peak
+        self.volume = volume  # 従来の np.linalg.norm(block) * 10 と同じ尺度の音量
+        self.smoothed_volume = smoothed_volume
+        self.bands = bands  # 帯域ごとのエネルギー (AUDIO_NUM_BANDS,)
+        self.centroid = centroid  # スペクトル重心 (Hz)
+        self.onset = onset  # 音の立ち上がりを検出したか
+        self.onset_strength = onset_strength
+
+
+class AudioEngine:
+    """
+    マイク（またはWAVファイル）の音声をリングバッファに溜め、
+    固定のホップ幅ごとに音量・スペクトル・立ち上がりなどの特徴量をまとめて計算するクラス
+    """
+    def __init__(self, samplerate=AUDIO_SAMPLE_RATE, hop_size=AUDIO_HOP_SIZE, fft_size=AUDIO_FFT_SIZE,
+                 num_bands=AUDIO_NUM_BANDS, buffer_seconds=2.0):
+        self.samplerate = samplerate
+        self.hop_size = hop_size
+        self.fft_size = fft_size
+
+        # リングバッファ（書き込みはコールバック、読み出しは process の1対1）
+        self.capacity = max(int(samplerate * buffer_seconds), fft_size * 4)
+        self.ring = np.zeros(self.capacity, dtype=np.float32)
+        self.write_pos = 0  # これまでに書き込んだサンプル数
+        self.read_pos = 0  # 次に処理するホップの先頭
+        self.samples_dropped = 0
+
+        # FFTの窓と帯域の境界（対数間隔）
+        self.window = np.hanning(fft_size).astype(np.float32)
+        self.freqs = np.fft.rfftfreq(fft_size, 1.0 / samplerate)
+        edges_hz = np.geomspace(40, samplerate / 2, num_bands + 1)
+        self.band_edges = np.unique(np.clip(np.searchsorted(self.freqs, edges_hz), 1, len(self.freqs) - 1))
+
+        # 立ち上がり検出の状態
+        self.prev_spectrum = np.zeros(len(self.freqs), dtype=np.float32)
+        self.flux_history = np.zeros(43, dtype=np.float32)  # 約0.5秒分
+
+        self.seq = 0
+        self.smoothed_volume = 0.0
+        self.batch = {}
+        self.latest = AudioFeatures(0, time.monotonic(), 0.0, 0.0, 0.0, 0.0,
+                                    np.zeros(len(self.band_edges) - 1, dtype=np.float32), 0.0, False, 0.0)
+
+    def push(self, samples):
+        """音声サンプルをリングバッファに書き込む（オーディオコールバックから呼ぶ）"""
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1)  # モノラルに変換
+        n = len(samples)
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            n = self.capacity
+
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self.ring[start:start + first] = samples[:first]
+        self.ring[:n - first] = samples[first:]
+        self.write_pos += n
+
+    def process(self):
+        """溜まった全てのホップの特徴量をまとめて計算し、最新の値を公開する。処理したホップ数を返す"""
+        write_pos = self.write_pos
+        # 処理が追いつかずに上書きされた分は読み飛ばす
+        oldest = write_pos - self.capacity + self.fft_size
+        if self.read_pos < oldest:
+            self.samples_dropped += oldest - self.read_pos
+            self.read_pos = oldest
+
+        num_hops = (write_pos - self.read_pos) // self.hop_size
+        if num_hops <= 0:
+            return 0
+
+        ends = self.read_pos + self.hop_size * np.arange(1, num_hops + 1)
+        index = (ends[:, None] - self.fft_size + np.arange(self.fft_size)) % self.capacity
+        frames = self.ring[index]  # (num_hops, fft_size)
+        self.read_pos += num_hops * self.hop_size
+
+        # 時間領域の特徴量（各ホップの新しいサンプルのみ）
+        hop_samples = frames[:, -self.hop_size:]
+        rms = np.sqrt(np.mean(hop_samples ** 2, axis=1))
+        peak = np.max(np.abs(hop_samples), axis=1)
+        volume = rms * np.sqrt(self.hop_size) * 10
+
+        # 周波数領域の特徴量
+        spectrum = np.abs(np.fft.rfft(frames * self.window, axis=1)).astype(np.float32)
+        power = spectrum ** 2
+        bands = np.add.reduceat(power, self.band_edges[:-1], axis=1)[:, :len(self.band_edges) - 1]
+        magnitude_sum = spectrum.sum(axis=1)
+        centroid = np.where(magnitude_sum > 0, spectrum @ self.freqs / np.maximum(magnitude_sum, 1e-12), 0.0)
+
+        # 立ち上がり検出: 対数スペクトルの正の変化量（スペクトルフラックス）を直近の平均と比較
+        log_spectrum = np.log1p(spectrum)
+        previous = np.vstack([self.prev_spectrum[None, :], log_spectrum[:-1]])
+        flux = np.maximum(log_spectrum - previous, 0).sum(axis=1)
+        self.prev_spectrum = log_spectrum[-1]
+        # 各ホップの閾値は、そのホップ直前の履歴の平均 + 標準偏差の定数倍（累積和でまとめて計算）
+        history_size = len(self.flux_history)
+        history = np.concatenate([self.flux_history, flux]).astype(np.float64)
+        cumsum = np.concatenate([[0.0], np.cumsum(history)])
+        cumsum_sq = np.concatenate([[0.0], np.cumsum(history ** 2)])
+        moving_mean = (cumsum[history_size:-1] - cumsum[:num_hops]) / history_size
+        moving_sq = (cumsum_sq[history_size:-1] - cumsum_sq[:num_hops]) / history_size
+        moving_std = np.sqrt(np.maximum(moving_sq - moving_mean ** 2, 0))
+        threshold = moving_mean + moving_std * AUDIO_ONSET_THRESHOLD + 1e-3
+        # 履歴が溜まるまで（起動直後）は立ち上がりとみなさない
+        warmed_up = self.seq + np.arange(1, num_hops + 1) > history_size
+        onset = (flux > threshold) & warmed_up
+        self.flux_history = history[-history_size:].astype(np.float32)
+
+        # 音量の平滑化（ホップごとの指数移動平均をまとめて適用）
+        decay = (1 - AUDIO_SMOOTHING) ** np.arange(num_hops - 1, -1, -1)
+        self.smoothed_volume = float(self.smoothed_volume * (1 - AUDIO_SMOOTHING) ** num_hops +
+                                     AUDIO_SMOOTHING * np.dot(decay, volume))
+
+        # 今回処理した全ホップの値（解析・計測用）
+        self.batch = {'rms': rms, 'peak': peak, 'volume': volume, 'centroid': centroid, 'onset': onset}
+
+        self.seq += num_hops
+        self.latest = AudioFeatures(
+            seq=self.seq, timestamp=time.monotonic(),
+            rms=float(rms[-1]), peak=float(peak[-1]), volume=float(volume[-1]),
+            smoothed_volume=self.smoothed_volume, bands=bands[-1], centroid=float(centroid[-1]),
+            onset=bool(onset.any()), onset_strength=float(flux.max()))
+        return num_hops
+
+    def analyze(self, samples):
+        """
+        信号全体をホップごとに解析し、特徴量の配列を辞書で返す（WAVファイルの解析・計測用）
+        """
+        results = {'rms': [], 'peak': [], 'volume': [], 'centroid': [], 'onset': []}
+        chunk = self.capacity - self.fft_size
+        for start in range(0, len(samples), chunk):
+            self.push(samples[start:start + chunk])
+            if self.process():
+                for key in results:
+                    results[key].append(self.batch[key])
+        return {key: np.concatenate(values) if values else np.array([]) for key, values in results.items()}
+
+
+def load_wav(path):
+    """WAVファイルを読み込み、(-1, 1) の float32 配列とサンプリングレートを返す"""
+    with wave.open(path, 'rb') as wav:
+        samplerate = wav.getframerate()
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        data = wav.readframes(wav.getnframes())
+
+    dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[width]
+    samples = np.frombuffer(data, dtype=dtype).astype(np.float32)
+    if width == 1:
+        samples = (samples - 128) / 128
+    else:
+        samples /= float(np.iinfo(dtype).max)
+    return samples.reshape(-1, channels).mean(axis=1), samplerate
+
+
+class WavFilePlayer:
+    """WAVファイルを実時間（または最速）でエンジンに流し込む、マイクの代わりの入力"""
+    def __init__(self, engine, path, realtime=True, loop=True):
+        self.engine = engine
+        self.samples, samplerate = load_wav(path)
+        if samplerate != engine.samplerate:
+            print(f"WavFilePlayer: {path} のサンプリングレート {samplerate}Hz を {engine.samplerate}Hz として扱います。")
+        self.realtime = realtime
+        self.loop = loop
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+
+    def _run(self):
+        hop = self.engine.hop_size
+        interval = hop / self.engine.samplerate
+        next_time = time.perf_counter()
+        position = 0
+        while self.running:
+            if position >= len(self.samples):
+                if not self.loop:
+                    break
+                position = 0
+            self.engine.push(self.samples[position:position + hop])
+            position += hop
+            if self.realtime:
+                next_time += interval
+                time.sleep(max(0.0, next_time - time.perf_counter()))
+        self.running = False
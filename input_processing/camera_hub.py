@@ -0,0 +1,90 @@
+import os
+import threading
+from .frame_grabber import FrameGrabber
+
+
+class Subscription:
+    """
+    CameraHub の1つの入力元に対する購読。利用者ごとに読み込んだ位置を持ち、
+    自分のペースで最新のフレームを受け取る
+    """
+    def __init__(self, hub, key, grabber):
+        self.hub = hub
+        self.key = key
+        self.grabber = grabber
+        self.last_seq = -1
+        self.frames_read = 0
+        self.frames_dropped = 0  # この購読者が読む前に新しいフレームで置き換えられた数
+
+    def read(self, timeout=None):
+        """前回より新しいフレームを待って返す（コピーはせず、全購読者で同じ Frame を共有する）"""
+        frame = self.grabber.read(self.last_seq, timeout)
+        if frame is None:
+            return None
+        if self.last_seq >= 0:
+            self.frames_dropped += frame.seq - self.last_seq - 1
+        self.last_seq = frame.seq
+        self.frames_read += 1
+        return frame
+
+    def close(self):
+        if self.hub is not None:
+            self.hub.unsubscribe(self)
+            self.hub = None
+
+
+class CameraHub:
+    """
+    物理カメラ（および動画などの入力元）ごとに読み込みを1つだけ行い、
+    同じフレームを複数の利用者（Sensor, GazeTracker）に配るクラス
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """プロセス全体で共有するハブを返す"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __init__(self):
+        self.grabbers = {}
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(source):
+        """同じデバイス・ファイルが同じキーになるように正規化する"""
+        if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+            return int(source)
+        if isinstance(source, str) and os.path.exists(source):
+            return os.path.abspath(source)
+        return source
+
+    def subscribe(self, source):
+        """入力元を購読する。最初の購読者が来た時に読み込みを開始し、開けなかった場合は None を返す"""
+        key = self._key(source)
+        with self.lock:
+            grabber = self.grabbers.get(key)
+            if grabber is None:
+                grabber = FrameGrabber(source)
+                if not grabber.start():
+                    return None
+                self.grabbers[key] = grabber
+                self.subscribers[key] = 0
+            self.subscribers[key] += 1
+            return Subscription(self, key, grabber)
+
+    def unsubscribe(self, subscription):
+        """購読をやめる。最後の購読者がいなくなった入力元は閉じる"""
+        with self.lock:
+            if subscription.key not in self.subscribers:
+                return
+            self.subscribers[subscription.key] -= 1
+            if self.subscribers[subscription.key] > 0:
+                return
+            del self.subscribers[subscription.key]
+            grabber = self.grabbers.pop(subscription.key)
+        grabber.stop()
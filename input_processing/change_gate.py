@@ -0,0 +1,147 @@
+import cv2
+import numpy as np
+from config import CHANGE_GATE_THRESHOLD, CHANGE_GATE_REFRESH_INTERVAL, CHANGE_GATE_SIZE
+from .face_tracker import box_iou
+
+
+class ChangeGate:
+    """
+    顔ごと（センサー・追跡ID単位）に、前回CNNで分類した時の顔画像と現在の顔画像を縮小して比較し、
+    変化が小さければ前回の確率を再利用して感情CNNの実行を省略するクラス
+    比較の基準は最後にCNNを実行した時の画像のため、少しずつの変化も積み重なれば再分類される
+    """
+    def __init__(self, threshold=CHANGE_GATE_THRESHOLD, refresh_interval=CHANGE_GATE_REFRESH_INTERVAL, size=CHANGE_GATE_SIZE):
+        self.threshold = threshold  # 縮小画像の平均絶対差 (0-1) がこれ未満なら再利用する
+        self.refresh_interval = refresh_interval  # 変化がなくてもこのフレーム数ごとに再分類する
+        self.size = size
+        self.entries = {}  # client_id -> {key: {'box', 'thumb', 'probabilities', 'age'}}
+        self.next_keys = {}  # client_id -> 追跡IDのない新しい顔に割り当てる次の番号
+
+        # 計測値
+        self.faces_checked = 0
+        self.faces_skipped = 0
+        self.forced_refreshes = 0
+        self.time_per_face = None  # CNNの1顔あたりの処理時間 (秒, 指数移動平均)
+
+    def thumbnail(self, gray, box):
+        """顔領域を size x size に縮小し、明るさの変化に左右されないよう平均を引いた画像を返す"""
+        h, w = gray.shape[:2]
+        x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+        x2, y2 = min(w, int(box[2])), min(h, int(box[3]))
+        if x2 <= x1 or y2 <= y1:
+            return None
+        thumb = cv2.resize(gray[y1:y2, x1:x2], (self.size, self.size), interpolation=cv2.INTER_AREA).astype(np.float32)
+        thumb -= thumb.mean()
+        return thumb
+
+    def _match_keys(self, client_entries, boxes):
+        """
+        追跡IDがない（検出した）フレームでは、前回の矩形とのIoUで同じ顔を対応付ける
+        対応する顔がなければ新しいキー（追跡IDと重ならない ('face', 番号)）を割り当て、次のフレームで比較できるようにする
+        """
+        keys = [None] * len(boxes)
+        used = set()
+        for i, box in enumerate(boxes):
+            best_key, best_iou = None, 0.5
+            for key, entry in client_entries.items():
+                if key in used:
+                    continue
+                iou = box_iou(box, entry['box'])
+                if iou > best_iou:
+                    best_key, best_iou = key, iou
+            if best_key is not None:
+                keys[i] = best_key
+                used.add(best_key)
+        return keys
+
+    def _adopt_track_ids(self, client_entries, boxes, track_ids):
+        """
+        追跡中のフレームでは追跡IDをキーにする
+        まだ記録のない追跡IDは、検出したフレームで ('face', 番号) などの別のキーで記録した顔とIoUで対応付け、
+        その記録を追跡IDのキーに付け替える（検出と追跡が交互に来ても同じ顔として比較できるようにする）
+        """
+        keys = list(track_ids)
+        unknown = [i for i, key in enumerate(keys) if key not in client_entries]
+        if unknown:
+            candidates = {key: entry for key, entry in client_entries.items() if key not in keys}
+            matched = self._match_keys(candidates, [boxes[i] for i in unknown])
+            for i, old_key in zip(unknown, matched):
+                if old_key is not None:
+                    client_entries[keys[i]] = client_entries.pop(old_key)
+        return keys
+
+    def _new_key(self, client_id):
+        number = self.next_keys.get(client_id, 0)
+        self.next_keys[client_id] = number + 1
+        return ('face', number)
+
+    def check(self, client_id, gray, boxes, track_ids=None, num_classes=7):
+        """
+        再利用できる顔の確率を埋めた (n, num_classes) の配列と、CNNで分類が必要な顔のマスクを返す
+        3つ目の戻り値は store() にそのまま渡す
+        """
+        client_entries = self.entries.get(client_id, {})
+        if track_ids is not None:
+            keys = self._adopt_track_ids(client_entries, boxes, track_ids)
+        else:
+            keys = [key if key is not None else self._new_key(client_id)
+                    for key in self._match_keys(client_entries, boxes)]
+        probabilities = np.zeros((len(boxes), num_classes), dtype=np.float32)
+        pending = np.ones(len(boxes), dtype=bool)
+        thumbs = []
+        for i, (key, box) in enumerate(zip(keys, boxes)):
+            thumb = self.thumbnail(gray, box)
+            thumbs.append(thumb)
+            self.faces_checked += 1
+            entry = client_entries.get(key)
+            if entry is None or thumb is None:
+                continue
+            if entry['age'] + 1 >= self.refresh_interval:
+                self.forced_refreshes += 1
+                continue
+            if np.mean(np.abs(thumb - entry['thumb'])) / 255.0 < self.threshold:
+                probabilities[i] = entry['probabilities']
+                pending[i] = False
+                self.faces_skipped += 1
+        return probabilities, pending, (keys, thumbs)
+
+    def store(self, client_id, boxes, probabilities, pending, context):
+        """
+        今回の結果を記録する。CNNで分類した顔は基準画像を更新し、再利用した顔は経過フレーム数を増やす
+        映っていない顔の記録は破棄する
+        """
+        keys, thumbs = context
+        previous = self.entries.get(client_id, {})
+        entries = {}
+        for key, box, probs, is_new, thumb in zip(keys, boxes, probabilities, pending, thumbs):
+            if key is None or thumb is None:
+                continue
+            if is_new:
+                entries[key] = {'box': box, 'thumb': thumb, 'probabilities': probs.copy(), 'age': 0}
+            else:
+                entry = previous[key]
+                entry['box'] = box
+                entry['age'] += 1
+                entries[key] = entry
+        self.entries[client_id] = entries
+
+    def record_inference(self, num_faces, elapsed):
+        """CNNの処理時間を記録する（省略した分のCPU時間の見積もりに使う）"""
+        if num_faces <= 0:
+            return
+        per_face = elapsed / num_faces
+        self.time_per_face = per_face if self.time_per_face is None else self.time_per_face * 0.9 + per_face * 0.1
+
+    def forget(self, client_id):
+        self.entries.pop(client_id, None)
+        self.next_keys.pop(client_id, None)
+
+    def get_stats(self):
+        """省略率と、省略によって節約できたCPU時間の見積もり (秒) を返す"""
+        return {
+            "faces_checked": self.faces_checked,
+            "faces_skipped": self.faces_skipped,
+            "skip_rate": self.faces_skipped / self.faces_checked if self.faces_checked else 0.0,
+            "forced_refreshes": self.forced_refreshes,
+            "cpu_time_saved": self.faces_skipped * (self.time_per_face or 0.0),
+        }
@@ -0,0 +1,121 @@
+import copy
+import os
+import torch
+import torch.nn as nn
+from config import EMOTION_MODEL_PATH, EMOTION_BACKEND
+from train_model import EmotionCNN
+
+# 利用できる推論バックエンド
+# - eager: 通常の PyTorch モデル (fp32)
+# - torchscript: TorchScript に変換して凍結したモデル (fp32)
+# - fused: 凍結後に optimize_for_inference で conv + relu などを融合したモデル (fp32)
+#          融合後のグラフは保存できないため、凍結したモデルを保存し、読み込み時に融合する
+# - dynamic_int8: 全結合層 (fc1, fc2) の重みを int8 に動的量子化したモデル
+# - static_int8: 校正データで活性値の範囲を求め、畳み込みも含めて int8 に静的量子化したモデル
+BACKENDS = ('eager', 'torchscript', 'fused', 'dynamic_int8', 'static_int8')
+INT8_BACKENDS = ('dynamic_int8', 'static_int8')
+INPUT_SHAPE = (1, 1, 48, 48)
+
+
+def backend_path(backend, weights_path=EMOTION_MODEL_PATH):
+    """バックエンドごとの保存先（eager は学習済みの重みそのもの）"""
+    if backend == 'eager':
+        return weights_path
+    root, _ = os.path.splitext(weights_path)
+    return f"{root}.{backend}.pt"
+
+
+def load_eager_model(weights_path=EMOTION_MODEL_PATH, device=torch.device('cpu')):
+    model = EmotionCNN()
+    model.load_state_dict(torch.load(weights_path, map_location=device))
+    return model.to(device).eval()
+
+
+def _select_quantized_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    return torch.backends.quantized.engine
+
+
+def build_backend(model, backend, calibration_batches=None, optimize=True, device=torch.device('cpu')):
+    """
+    fp32 の EmotionCNN から、device で実行する指定バックエンドのモデルを作成する
+    渡されたモデルは変更せず、複製してから変換する
+    calibration_batches: static_int8 の校正に使う (N,1,48,48) テンソルのリスト
+    optimize: False の場合、fused でも融合前の（保存可能な）凍結モデルを返す
+    device: 凍結したモデルは重みが定数として埋め込まれ、後から .to() で移せないため、変換時に指定する。
+            int8 のバックエンドは CPU 専用で、それ以外を指定すると ValueError になる
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend} (choose from {BACKENDS})")
+    if backend == 'eager':
+        return model
+    if backend in INT8_BACKENDS and device.type != 'cpu':
+        raise ValueError(f"{backend} supports only CPU (got device {device})")
+
+    model = copy.deepcopy(model).to(device).eval()
+    example = torch.zeros(INPUT_SHAPE, device=device)
+
+    if backend == 'dynamic_int8':
+        _select_quantized_engine()
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    elif backend == 'static_int8':
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+        engine = _select_quantized_engine()
+        # FX モードでは conv + relu が自動的に融合される
+        prepared = prepare_fx(model, get_default_qconfig_mapping(engine), example_inputs=(example,))
+        if not calibration_batches:
+            print("static_int8: 校正データがないため、ランダムな入力で校正します（精度が落ちる可能性があります）。")
+            calibration_batches = [torch.rand(32, *INPUT_SHAPE[1:]) * 2 - 1 for _ in range(8)]
+        with torch.no_grad():
+            for batch in calibration_batches:
+                prepared(batch)
+        model = convert_fx(prepared)
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    frozen = torch.jit.freeze(traced.eval())
+    if backend == 'fused' and optimize:
+        frozen = torch.jit.optimize_for_inference(frozen)
+    return frozen
+
+
+def export_backend(model, backend, weights_path=EMOTION_MODEL_PATH, calibration_batches=None):
+    """
+    バックエンドのモデルを作成して保存し、保存先のパスを返す
+    eager の保存先は学習済みの重みそのものなので、上書きせずにパスだけを返す
+    """
+    path = backend_path(backend, weights_path)
+    if backend == 'eager':
+        return path
+    torch.jit.save(build_backend(model, backend, calibration_batches, optimize=False), path)
+    return path
+
+
+def load_emotion_model(backend=EMOTION_BACKEND, device=torch.device('cpu'), weights_path=EMOTION_MODEL_PATH):
+    """
+    指定バックエンドの感情認識モデルと、そのモデルを実行するデバイスを返す
+    書き出し済みのファイルがない場合は、学習済みの重みからその場で作成する
+    """
+    if backend in INT8_BACKENDS and device.type != 'cpu':
+        print(f"{backend} は CPU でのみ実行できるため、CPU を使用します。")
+        device = torch.device('cpu')
+
+    if backend == 'eager':
+        return load_eager_model(weights_path, device), device
+
+    path = backend_path(backend, weights_path)
+    if os.path.exists(path):
+        if backend in INT8_BACKENDS:
+            _select_quantized_engine()
+        model = torch.jit.load(path, map_location=device)
+        if backend == 'fused':
+            model = torch.jit.optimize_for_inference(model)
+    else:
+        print(f"{path} が見つからないため、{weights_path} から {backend} モデルを作成します。")
+        model = build_backend(load_eager_model(weights_path, device), backend, device=device)
+    return model.eval(), device
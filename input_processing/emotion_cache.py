@@ -0,0 +1,80 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import EMOTION_CACHE_MAX_BYTES, EMOTION_CACHE_QUANTIZATION_BITS
+
+
+class EmotionCache:
+    """
+    前処理済みの 48x48 の顔画像を量子化してハッシュを取り、感情CNNの確率ベクトルを記録するLRUキャッシュ
+    全センサーで共有し、同じ見た目の顔（同じ人・同じ姿勢）が再び現れた場合はCNNを省略する
+    記録の合計サイズが max_bytes を超えた場合は、最も長く使われていないものから捨てる
+    """
+    def __init__(self, max_bytes=EMOTION_CACHE_MAX_BYTES, quantization_bits=EMOTION_CACHE_QUANTIZATION_BITS):
+        self.max_bytes = max_bytes
+        self.shift = 8 - quantization_bits  # 画素値の下位ビットを捨ててノイズの影響を減らす
+        self.entries = OrderedDict()  # key -> probabilities
+        self.bytes_used = 0
+        self.lock = threading.Lock()
+
+        # 計測値
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_keys(self, crops):
+        """(N,48,48) の uint8 の顔画像から、量子化した画像のハッシュ値のリストを作る"""
+        quantized = np.right_shift(crops, self.shift) if self.shift > 0 else crops
+        return [hashlib.blake2b(crop.tobytes(), digest_size=16).digest() for crop in quantized]
+
+    @staticmethod
+    def _entry_size(key, probabilities):
+        return sys.getsizeof(key) + sys.getsizeof(probabilities)
+
+    def lookup(self, keys, out):
+        """記録済みの確率を out の該当行に書き込み、記録のなかった顔の番号の配列を返す"""
+        missing = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                probabilities = self.entries.get(key)
+                if probabilities is None:
+                    missing.append(i)
+                    continue
+                self.entries.move_to_end(key)
+                out[i] = probabilities
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return np.array(missing, dtype=np.intp)
+
+    def insert(self, keys, probabilities):
+        """CNNで分類した結果を記録し、上限を超えた分を古いものから捨てる"""
+        with self.lock:
+            for key, probs in zip(keys, probabilities):
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    continue
+                probs = probs.copy()
+                self.entries[key] = probs
+                self.bytes_used += self._entry_size(key, probs)
+            while self.bytes_used > self.max_bytes and self.entries:
+                key, probs = self.entries.popitem(last=False)
+                self.bytes_used -= self._entry_size(key, probs)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes_used = 0
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+            "bytes_used": self.bytes_used,
+        }
@@ -2,20 +2,127 @@ import torch
 import cv2
 import numpy as np
 import logging
-from torchvision import transforms
+import math
 from ultralytics import YOLO
-from config import YOLO_FACE_MODEL_PATH
+from analysis.perf_stats import PerfStats
+from config import (YOLO_FACE_MODEL_PATH, DETECTION_SCALE, DETECTION_SCALES, DETECTION_MAX_SIZE,
+                    DETECTION_MIN_FACE_PIXELS, CAMERA_VERTICAL_FOV, FACE_MAX_DISTANCE)
 
 # YOLOv8のログ出力を抑制
 logging.getLogger('ultralytics').setLevel(logging.ERROR)
 torch.set_num_threads(4)
 
+EMOTION_LABELS = ['Angry', 'Disgust', 'Fear', 'Happy', 'Sad', 'Surprise', 'Neutral']
+
+
+def face_height_at_distance(frame_height, distance=FACE_MAX_DISTANCE, fov=CAMERA_VERTICAL_FOV, face_height=0.22):
+    """距離 distance (m) にいる顔（あご〜頭頂 約0.22m）がフレーム上で何ピクセルの高さに写るかを見積もる"""
+    view_height = 2 * distance * math.tan(math.radians(fov) / 2)
+    return frame_height * face_height / view_height
+
+
+def choose_detection_scale(frame_height, scales=DETECTION_SCALES, min_face_pixels=DETECTION_MIN_FACE_PIXELS):
+    """最も遠い顔が min_face_pixels 以上の大きさで写る、最小の縮小率を選ぶ"""
+    face_pixels = face_height_at_distance(frame_height)
+    for scale in sorted(scales):
+        if face_pixels * scale >= min_face_pixels:
+            return scale
+    return max(scales)
+
+
+class EmotionClassifier:
+    """
+    複数の顔領域をまとめて前処理し、CNNで一括分類するクラス
+    入力テンソル (N,1,48,48) はあらかじめ確保したバッファを再利用する
+    cache (EmotionCache) を渡した場合は、記録済みの顔画像の分類を省略する
+    """
+    def __init__(self, device=None, input_size=48, max_faces=32, cache=None):
+        self.emotion_labels = EMOTION_LABELS
+        self.device = device or (torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu'))
+        self.input_size = input_size
+        self.cache = cache
+        self.perf = PerfStats.shared()
+        self._allocate(max_faces)
+
+    def _allocate(self, capacity):
+        size = self.input_size
+        self.capacity = capacity
+        self._resized = np.empty((capacity, size, size), dtype=np.uint8)
+        self._batch = np.empty((capacity, 1, size, size), dtype=np.float32)
+        # torch.from_numpy はメモリを共有するため、コピーなしでテンソルとして扱える
+        self._batch_tensor = torch.from_numpy(self._batch)
+
+    def preprocess(self, grays: list[np.ndarray], boxes_list: list[np.ndarray]) -> torch.Tensor:
+        """
+        複数のグレースケール画像から顔領域を切り出し、(N,1,48,48) の正規化済みテンソルを返す
+        boxes_list: 画像ごとの (n,4) [x1, y1, x2, y2]。空の領域はゼロ埋めされる
+        """
+        n = sum(len(boxes) for boxes in boxes_list)
+        if n > self.capacity:
+            self._allocate(max(n, self.capacity * 2))
+
+        size = self.input_size
+        resized = self._resized[:n]
+        i = 0
+        for gray, boxes in zip(grays, boxes_list):
+            h, w = gray.shape[:2]
+            for x1, y1, x2, y2 in boxes:
+                x1, x2 = max(0, int(x1)), min(w, int(x2))
+                y1, y2 = max(0, int(y1)), min(h, int(y2))
+                if x2 <= x1 or y2 <= y1:
+                    resized[i] = 0
+                else:
+                    cv2.resize(gray[y1:y2, x1:x2], (size, size), dst=resized[i], interpolation=cv2.INTER_AREA)
+                i += 1
+
+        # ToTensor + Normalize(mean=0.5, std=0.5) と同等: x / 127.5 - 1
+        batch = self._batch[:n, 0]
+        np.multiply(resized, 1.0 / 127.5, out=batch, dtype=np.float32)
+        batch -= 1.0
+
+        tensor = self._batch_tensor[:n]
+        if self.device.type != 'cpu':
+            tensor = tensor.to(self.device, non_blocking=True)
+        return tensor
+
+    def predict_many(self, grays: list[np.ndarray], boxes_list: list[np.ndarray], model: torch.nn.Module) -> list[np.ndarray]:
+        """複数画像の全ての顔を1回の順伝播で分類し、画像ごとの確率 (n,7) のリストを返す"""
+        counts = [len(boxes) for boxes in boxes_list]
+        if sum(counts) == 0:
+            return [np.empty((0, len(self.emotion_labels)), dtype=np.float32) for _ in counts]
+
+        with self.perf.measure('classifier.preprocess'):
+            batch = self.preprocess(grays, boxes_list)
+        if self.cache is None:
+            with torch.no_grad(), self.perf.measure('classifier.cnn'):
+                probabilities = torch.softmax(model(batch), dim=1).cpu().numpy()
+        else:
+            # 記録済みの顔は再利用し、記録のない顔だけをCNNで分類する
+            n = len(batch)
+            keys = self.cache.make_keys(self._resized[:n])
+            probabilities = np.empty((n, len(self.emotion_labels)), dtype=np.float32)
+            missing = self.cache.lookup(keys, probabilities)
+            if len(missing):
+                index = torch.from_numpy(missing).to(batch.device)
+                with torch.no_grad(), self.perf.measure('classifier.cnn'):
+                    probabilities[missing] = torch.softmax(model(batch[index]), dim=1).cpu().numpy()
+                self.cache.insert([keys[i] for i in missing], probabilities[missing])
+        return np.split(probabilities, np.cumsum(counts)[:-1])
+
+    def predict(self, gray: np.ndarray, boxes: np.ndarray, model: torch.nn.Module) -> np.ndarray:
+        """顔ごとの確率ベクトル (N,7) を1回の順伝播で計算する"""
+        return self.predict_many([gray], [boxes], model)[0]
+
+
 class EmotionDetector:
     """
     YOLOv8で顔を検出し、CNNモデルで表情を認識するクラス
     """
-    def __init__(self, device=None):
-        self.emotion_labels = ['Angry', 'Disgust', 'Fear', 'Happy', 'Sad', 'Surprise', 'Neutral']
+    def __init__(self, device=None, cache=None, detection_scale=DETECTION_SCALE):
+        self.emotion_labels = EMOTION_LABELS
+        self.detection_scale = detection_scale  # 顔検出に使う縮小率、または 'auto'
+        self._auto_scales = {}  # フレームの高さ -> 'auto' で選んだ縮小率
+        self.perf = PerfStats.shared()
         self.device = device or (torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu'))
         print(f"EmotionDetector using device: {self.device}")
 
@@ -25,57 +132,100 @@ class EmotionDetector:
         self.yolo_model.model.conf = 0.5  # 信頼度の閾値
         self.yolo_model.model.iou = 0.45  # IoUの閾値
 
-        # 画像の前処理
-        self.transform = transforms.Compose([
-            transforms.ToPILImage(),
-            transforms.Grayscale(),
-            transforms.Resize((48, 48)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.5], std=[0.5])
-        ])
+        # 顔領域の一括前処理と分類
+        self.classifier = EmotionClassifier(device=self.device, cache=cache)
+
+    def detect_boxes(self, frame: np.ndarray) -> np.ndarray:
+        """フレームから顔の矩形 (N,4) [x1, y1, x2, y2] を検出する"""
+        return self.detect_boxes_batch([frame])[0]
+
+    def scale_for(self, frame_height: int) -> float:
+        """フレームの高さに対する顔検出の縮小率"""
+        if self.detection_scale != 'auto':
+            return float(self.detection_scale)
+        scale = self._auto_scales.get(frame_height)
+        if scale is None:
+            scale = choose_detection_scale(frame_height)
+            self._auto_scales[frame_height] = scale
+            print(f"EmotionDetector: 高さ {frame_height}px のフレームは {scale} 倍に縮小して顔を検出します。")
+        return scale
+
+    def detect_boxes_batch(self, frames: list[np.ndarray]) -> list[np.ndarray]:
+        """
+        複数フレームを1回のYOLO呼び出しで処理し、フレームごとの矩形 (n,4) を元の解像度の座標で返す
+        検出は縮小したフレームで行い、YOLOの入力サイズも縮小後の大きさに合わせる
+        frames には画像の代わりに Frame（frame_grabber）も渡せる。その場合の縮小画像は Frame.resized で
+        作り、同じフレームを使う他の利用者と共有する
+        """
+        scales = [self.scale_for(getattr(frame, 'image', frame).shape[0]) for frame in frames]
+        inputs = [self._downscale(frame, scale) for frame, scale in zip(frames, scales)]
+        # YOLOの入力サイズは32の倍数で、縮小後の長辺（上限 DETECTION_MAX_SIZE）に合わせる
+        longest = max(max(image.shape[:2]) for image in inputs)
+        imgsz = min(DETECTION_MAX_SIZE, int(math.ceil(longest / 32) * 32))
+        with self.perf.measure('detector.yolo'):
+            results = self.yolo_model(inputs, imgsz=imgsz, verbose=False)
+        return [np.round(result.boxes.xyxy.cpu().numpy().reshape(-1, 4) / scale).astype(np.int32)
+                for result, scale in zip(results, scales)]
+
+    def _downscale(self, frame, scale: float) -> np.ndarray:
+        """画像、または Frame を scale 倍に縮小する"""
+        if not isinstance(frame, np.ndarray):
+            return frame.resized(scale)
+        if scale == 1.0:
+            return frame
+        return cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    def make_faces(self, boxes: np.ndarray, probabilities: np.ndarray = None) -> list[dict]:
+        """
+        矩形と確率ベクトルから顔ごとの検出結果を組み立てる
+        probabilities が None の場合（感情モデルなし）は Neutral とする
+        """
+        faces = []
+        for i, box in enumerate(boxes):
+            face = {
+                'box': tuple(int(v) for v in box),
+                'probabilities': None,
+                'emotion': "Neutral",
+                'confidence': 0.0,
+            }
+            if probabilities is not None:
+                probs = probabilities[i]
+                index = int(np.argmax(probs))
+                face['probabilities'] = probs
+                face['emotion'] = self.emotion_labels[index]
+                face['confidence'] = float(probs[index])
+            faces.append(face)
+        return faces
+
+    def detect_faces(self, frame: np.ndarray, model: torch.nn.Module, gray: np.ndarray = None) -> list[dict]:
+        """
+        フレーム内の全ての顔について、矩形と感情の確率ベクトルを返す
+        戻り値: [{'box', 'probabilities', 'emotion', 'confidence'}, ...]
+        """
+        if frame is None:
+            return []
+        if gray is None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        boxes = self.detect_boxes(frame)
+        probabilities = self.classifier.predict(gray, boxes, model)
+        return self.make_faces(boxes, probabilities)
 
     def detect(self, frame: np.ndarray, model: torch.nn.Module) -> tuple[str, np.ndarray]:
         """
         フレームから最も確信度の高い感情を検出する
+        フレームには描画しない（デバッグ表示は DebugCompositor が行う）
         """
         if frame is None:
             return "Neutral", frame
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        results = self.yolo_model(frame, verbose=False)
+        faces = self.detect_faces(frame, model)
 
         detected_emotion = "Neutral"
         max_confidence = 0
+        for face in faces:
+            if face['confidence'] > max_confidence:
+                max_confidence = face['confidence']
+                detected_emotion = face['emotion']
 
-        if results:
-            for result in results:
-                for box in result.boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-
-                    try:
-                        roi_gray = gray[y1:y2, x1:x2]
-                        if roi_gray.size == 0:
-                            continue
-
-                        roi_tensor = self.transform(roi_gray).unsqueeze(0).to(self.device)
-                        model.to(self.device).eval()
-
-                        with torch.no_grad():
-                            outputs = model(roi_tensor)
-                            probabilities = torch.softmax(outputs, dim=1)
-                            max_prob, predicted = torch.max(probabilities, 1)
-
-                        prob_value = max_prob.item()
-                        if prob_value > max_confidence:
-                            max_confidence = prob_value
-                            detected_emotion = self.emotion_labels[predicted.item()]
-                        
-                        # 検出結果を描画（デバッグ用）
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-                        cv2.putText(frame, f"{detected_emotion}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 0, 0), 2)
-
-                    except Exception as e:
-                        print(f"Error processing face region: {e}")
-                        continue
-
-        return detected_emotion, frame
\ No newline at end of file
+        return detected_emotion, frame
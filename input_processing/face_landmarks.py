@@ -0,0 +1,96 @@
+import dlib
+import threading
+import numpy as np
+from config import SHAPE_PREDICTOR_PATH
+
+_predictors = {}
+_predictors_lock = threading.Lock()
+
+
+def load_shape_predictor(path=SHAPE_PREDICTOR_PATH):
+    """
+    dlibのランドマーク推定モデル（約100MB）を読み込む
+    同じプロセス内では推論エンジンと視線追跡で1つのモデルを共有し、2回目以降は読み込まない
+    """
+    with _predictors_lock:
+        predictor = _predictors.get(path)
+        if predictor is None:
+            predictor = dlib.shape_predictor(path)
+            _predictors[path] = predictor
+        return predictor
+
+
+def box_to_rect(box):
+    """[x1, y1, x2, y2] の矩形を dlib.rectangle に変換する"""
+    x1, y1, x2, y2 = (int(v) for v in box)
+    return dlib.rectangle(x1, y1, x2, y2)
+
+
+def shape_to_np(shape):
+    """dlibの full_object_detection を (68,2) の numpy 配列に変換する"""
+    return np.array([(p.x, p.y) for p in shape.parts()], dtype=np.int32)
+
+
+# 68点ランドマークの目の輪郭の番号（右目, 左目）。各目は目尻・上2点・目頭・下2点の順
+EYE_INDICES = np.array([range(36, 42), range(42, 48)])
+
+
+def eye_aspect_ratio(eyes):
+    """目の輪郭 (2,6,2) から、両目の縦横比 (EAR) を (2,) で返す。目を閉じると0に近づく"""
+    eyes = eyes.astype(np.float32)
+    vertical = (np.linalg.norm(eyes[:, 1] - eyes[:, 5], axis=1) +
+                np.linalg.norm(eyes[:, 2] - eyes[:, 4], axis=1))
+    horizontal = np.linalg.norm(eyes[:, 0] - eyes[:, 3], axis=1)
+    return vertical / np.maximum(2 * horizontal, 1e-6)
+
+
+def get_face_orientation(landmarks, box, frame_width, frame_height):
+    """
+    ランドマーク (68,2) と顔の矩形 [x1, y1, x2, y2] から顔の向きを判定する
+    """
+    # 顔のバウンディングボックスの座標
+    x1, y1, x2, y2 = box
+
+    # 顔の幅と高さ
+    face_width = x2 - x1
+    face_height = y2 - y1
+
+    # 画面に対する顔の大きさの割合
+    face_area_ratio = (face_width * face_height) / (frame_width * frame_height)
+
+    # 顔のランドマークの座標
+    nose_tip = landmarks[30]  # 鼻先
+    chin = landmarks[8]       # 顎
+    left_cheek = landmarks[1]  # 左頬
+    right_cheek = landmarks[15] # 右頬
+
+    # 差分を計算
+    dx = nose_tip[0] - (left_cheek[0] + right_cheek[0]) // 2
+    dy = nose_tip[1] - chin[1]
+
+    # 向き判定の閾値を顔の大きさに応じてスケーリング
+    dx_threshold = 15 * face_area_ratio * 10
+    dy_threshold_up = -110 * face_area_ratio * 13
+    dy_threshold_down = -68 * face_area_ratio * 18
+
+    direction = "center"
+
+    # 向きの判定
+    if dx < -dx_threshold and dy < dy_threshold_up:
+        direction = "up-right"
+    elif dx > dx_threshold and dy < dy_threshold_up:
+        direction = "up-left"
+    elif dx < -dx_threshold and dy > dy_threshold_down:
+        direction = "down-right"
+    elif dx > dx_threshold and dy > dy_threshold_down:
+        direction = "down-left"
+    elif dx < -dx_threshold:
+        direction = "right"
+    elif dx > dx_threshold:
+        direction = "left"
+    elif dy < dy_threshold_up:
+        direction = "up"
+    elif dy > dy_threshold_down:
+        direction = "down"
+
+    return direction
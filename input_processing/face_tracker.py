@@ -0,0 +1,158 @@
+import cv2
+import numpy as np
+import time
+from config import DETECTION_INTERVAL_MIN, DETECTION_INTERVAL_MAX, DETECTION_CPU_BUDGET
+
+
+def box_iou(a, b):
+    """2つの矩形 [x1, y1, x2, y2] のIoU"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTracker:
+    """
+    顔検出（YOLO）をNフレームごとに行い、その間は矩形をオプティカルフローで追跡するクラス
+    Nは顔の動きの大きさと、検出処理に使えるCPU時間の割合に応じて調整される
+    """
+    def __init__(self, min_interval=DETECTION_INTERVAL_MIN, max_interval=DETECTION_INTERVAL_MAX, cpu_budget=DETECTION_CPU_BUDGET):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.cpu_budget = cpu_budget  # 1フレームの処理時間のうち、顔検出に使ってよい割合
+        self.interval = min_interval
+        self.frames_since_detection = 0
+        self.force_detection = True
+
+        self.prev_gray = None
+        self.tracks = []  # [{'id', 'box', 'points'}, ...]
+        self.next_id = 0
+
+        # 計測値（指数移動平均）
+        self.motion = 0.0  # 顔の幅に対する1フレームあたりの移動量
+        self.detection_time = 0.0  # 顔検出を含む1フレームの処理時間 (秒)
+        self.frame_period = 1 / 30  # フレーム間隔 (秒)
+        self.last_frame_time = None
+
+        # LK法のパラメータ
+        self.lk_params = dict(winSize=(15, 15), maxLevel=2,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+    @staticmethod
+    def _ema(old, new, alpha=0.2):
+        return old + (new - old) * alpha
+
+    def needs_detection(self):
+        """このフレームで顔検出を行うべきかを返す"""
+        now = time.perf_counter()
+        if self.last_frame_time is not None:
+            self.frame_period = self._ema(self.frame_period, now - self.last_frame_time)
+        self.last_frame_time = now
+        return self.force_detection or self.frames_since_detection >= self.interval
+
+    def update_detections(self, gray, boxes, elapsed):
+        """
+        顔検出の結果で追跡対象を置き換え、前回の追跡対象とIoUで対応付けたIDのリストを返す
+        elapsed: 顔検出を行ったフレームの処理時間 (秒)
+        """
+        self.detection_time = self._ema(self.detection_time, elapsed) if self.detection_time else elapsed
+
+        tracks = []
+        unmatched = list(self.tracks)
+        for box in boxes:
+            best = max(unmatched, key=lambda t: box_iou(box, t['box']), default=None)
+            if best is not None and box_iou(box, best['box']) > 0.3:
+                unmatched.remove(best)
+                track_id = best['id']
+            else:
+                track_id = self.next_id
+                self.next_id += 1
+            tracks.append({'id': track_id, 'box': tuple(box), 'points': self._find_points(gray, box)})
+
+        self.tracks = tracks
+        self.prev_gray = gray
+        self.frames_since_detection = 0
+        self.force_detection = False
+        self._adapt_interval()
+        return [track['id'] for track in tracks]
+
+    def track(self, gray):
+        """
+        前フレームからの動きで矩形を更新し、(矩形のリスト, IDのリスト) を返す
+        追跡の信頼度が下がった場合は None を返し、次のフレームで検出を強制する
+        """
+        self.frames_since_detection += 1
+        if not self.tracks:
+            self.prev_gray = gray
+            return [], []
+
+        counts = [len(track['points']) for track in self.tracks]
+        if min(counts) == 0:
+            return self._lost()
+
+        prev_points = np.concatenate([track['points'] for track in self.tracks]).reshape(-1, 1, 2)
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, prev_points, None, **self.lk_params)
+        # 逆方向にも追跡し、往復で戻らない点は除外する
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, next_points, None, **self.lk_params)
+        error = np.linalg.norm(prev_points - back_points, axis=2).ravel()
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < 1.0)
+
+        motions = []
+        offset = 0
+        for track, count in zip(self.tracks, counts):
+            sl = slice(offset, offset + count)
+            offset += count
+            ok = good[sl]
+            if ok.sum() < max(4, count // 2):
+                return self._lost()
+
+            old = prev_points[sl][ok].reshape(-1, 2)
+            new = next_points[sl][ok].reshape(-1, 2)
+            shift = np.median(new - old, axis=0)
+            # 点群の広がりの比から拡大率を推定
+            old_spread = np.median(np.linalg.norm(old - old.mean(axis=0), axis=1))
+            new_spread = np.median(np.linalg.norm(new - new.mean(axis=0), axis=1))
+            scale = new_spread / old_spread if old_spread > 0 else 1.0
+
+            x1, y1, x2, y2 = track['box']
+            cx, cy = (x1 + x2) / 2 + shift[0], (y1 + y2) / 2 + shift[1]
+            hw, hh = (x2 - x1) * scale / 2, (y2 - y1) * scale / 2
+            track['box'] = (cx - hw, cy - hh, cx + hw, cy + hh)
+            track['points'] = new.astype(np.float32)
+            motions.append(np.linalg.norm(shift) / max(1, x2 - x1))
+
+        self.motion = self._ema(self.motion, max(motions))
+        self.prev_gray = gray
+        boxes = [tuple(int(round(v)) for v in track['box']) for track in self.tracks]
+        return boxes, [track['id'] for track in self.tracks]
+
+    def _lost(self):
+        self.force_detection = True
+        return None
+
+    def _find_points(self, gray, box):
+        """矩形内の追跡しやすい特徴点を求める"""
+        h, w = gray.shape[:2]
+        x1, y1, x2, y2 = max(0, int(box[0])), max(0, int(box[1])), min(w, int(box[2])), min(h, int(box[3]))
+        if x2 <= x1 or y2 <= y1:
+            return np.empty((0, 2), dtype=np.float32)
+        points = cv2.goodFeaturesToTrack(gray[y1:y2, x1:x2], maxCorners=30, qualityLevel=0.01, minDistance=5)
+        if points is None:
+            return np.empty((0, 2), dtype=np.float32)
+        return points.reshape(-1, 2) + np.array([x1, y1], dtype=np.float32)
+
+    def _adapt_interval(self):
+        """動きが大きいほど、またCPU予算に余裕があるほど検出間隔を短くする"""
+        # 動き: 顔の幅の2%/フレームを超えたら間隔を半分に、0.5%未満なら1フレーム延ばす
+        if self.motion > 0.02:
+            interval = self.interval // 2
+        elif self.motion < 0.005:
+            interval = self.interval + 1
+        else:
+            interval = self.interval
+
+        # CPU予算: 検出コストを検出間隔で割った値がフレーム時間の cpu_budget 以下になる間隔
+        budget_interval = int(np.ceil(self.detection_time / (self.cpu_budget * self.frame_period)))
+        self.interval = int(np.clip(max(interval, budget_interval), self.min_interval, self.max_interval))
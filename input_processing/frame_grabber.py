@@ -0,0 +1,126 @@
+import cv2
+import threading
+import time
+from config import FRAME_SOURCE_REALTIME
+from .frame_source import open_frame_source
+from analysis.perf_stats import PerfStats
+
+
+class Frame:
+    """
+    カメラから取得した1フレームと、その通し番号・取得時刻
+    複数の利用者で同じ画像を共有するため image は読み取り専用にする。
+    グレースケールや縮小画像は最初に要求された時に1回だけ計算し、全ての利用者で共有する
+    """
+    def __init__(self, image, seq, capture_time):
+        image.flags.writeable = False
+        self.image = image
+        self.seq = seq
+        self.capture_time = capture_time  # time.monotonic() の値
+        self._variants = {}
+        self._lock = threading.RLock()
+
+    def _variant(self, key, compute):
+        with self._lock:
+            variant = self._variants.get(key)
+            if variant is None:
+                variant = compute()
+                variant.flags.writeable = False
+                self._variants[key] = variant
+            return variant
+
+    def gray(self):
+        """グレースケール画像"""
+        return self._variant('gray', lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY))
+
+    def resized(self, scale, gray=False):
+        """scale 倍に縮小した画像（gray=True の場合はグレースケール）"""
+        if scale == 1.0:
+            return self.gray() if gray else self.image
+        source = self.gray if gray else (lambda: self.image)
+        return self._variant(('resized', scale, gray),
+                             lambda: cv2.resize(source(), None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+
+
+class FrameGrabber:
+    """
+    カメラからの読み込みを専用スレッドで行い、最新の1フレームだけを保持するクラス
+    推論が遅い場合でも、ドライバに溜まった古いフレームではなく常に最新のフレームを処理できる
+    source にはカメラID・動画/画像ディレクトリのパス・"synthetic" を指定できる（open_frame_source を参照）
+    """
+    def __init__(self, source=0, realtime=FRAME_SOURCE_REALTIME):
+        self.source = source
+        self.realtime = realtime
+        self.cap = None
+        self.running = False
+        self.thread = None
+
+        # 最新フレームのスロット
+        self.latest = None
+        self.condition = threading.Condition()
+
+        # 計測用カウンタ
+        self.frames_grabbed = 0
+        self.frames_dropped = 0  # 一度も読まれずに上書きされたフレーム数
+        self._latest_consumed = True
+        self.perf = PerfStats.shared()
+
+    def start(self):
+        """カメラを開いて読み込みスレッドを開始する。開けなかった場合は False を返す"""
+        self.cap = open_frame_source(self.source, self.realtime)
+        if not self.cap.isOpened():
+            return False
+        # ドライバ側のバッファを最小にする（対応していないバックエンドでは無視される）
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        if self.cap:
+            self.cap.release()
+        with self.condition:
+            self.condition.notify_all()
+
+    def _run(self):
+        while self.running:
+            with self.perf.measure('camera.read'):
+                ret, image = self.cap.read()
+            if not ret:
+                if self.cap.finished:
+                    break
+                time.sleep(0.1)
+                continue
+            capture_time = time.monotonic()
+
+            with self.condition:
+                if not self._latest_consumed:
+                    self.frames_dropped += 1
+                self.latest = Frame(image, self.frames_grabbed, capture_time)
+                self.frames_grabbed += 1
+                self._latest_consumed = False
+                self.condition.notify_all()
+
+        # 入力の終わりに達した場合は待機中の読み手を起こす
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def read(self, last_seq=-1, timeout=None):
+        """
+        last_seq より新しいフレームが届くまで待ち、最新のフレームを返す
+        タイムアウトした場合や停止中は None を返す
+        """
+        with self.condition:
+            ready = self.condition.wait_for(
+                lambda: not self.running or (self.latest is not None and self.latest.seq > last_seq),
+                timeout)
+            if not ready or not self.running:
+                return None
+            self._latest_consumed = True
+            return self.latest
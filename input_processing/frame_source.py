@@ -0,0 +1,218 @@
+import cv2
+import numpy as np
+import os
+import time
+from config import CAPTURE_WIDTH, CAPTURE_HEIGHT, CAPTURE_FPS, CAPTURE_FOURCC
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+class FrameSource:
+    """
+    フレームの入力元の基底クラス。cv2.VideoCapture と同じ read() / release() を持つ
+    realtime=True の場合は fps に合わせて読み込みを待機し、False の場合は可能な限り速く返す
+    """
+    def __init__(self, fps=30, realtime=True, loop=False):
+        self.fps = fps
+        self.realtime = realtime
+        self.loop = loop
+        self.finished = False  # 動画や画像列を最後まで読み終えた場合 True
+        self._next_frame_time = None
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        ret, image = self._read()
+        if ret:
+            self._pace()
+        return ret, image
+
+    def set(self, prop_id, value):
+        return False
+
+    def get(self, prop_id):
+        return 0
+
+    def release(self):
+        pass
+
+    def _read(self):
+        raise NotImplementedError
+
+    def _pace(self):
+        if not self.realtime or not self.fps:
+            return
+        now = time.perf_counter()
+        if self._next_frame_time is None or now - self._next_frame_time > 1.0:
+            self._next_frame_time = now
+        wait = self._next_frame_time - now
+        if wait > 0:
+            time.sleep(wait)
+        self._next_frame_time += 1.0 / self.fps
+
+
+class CameraSource(FrameSource):
+    """
+    カメラデバイス。ペースはデバイス側が決めるため待機しない
+    開いた時に解像度・フレームレート・圧縮形式を要求し、実際に設定された値を negotiated に記録する
+    """
+    def __init__(self, camera_id=0, width=CAPTURE_WIDTH, height=CAPTURE_HEIGHT, fps=CAPTURE_FPS, fourcc=CAPTURE_FOURCC):
+        super().__init__(fps=None, realtime=False)
+        self.camera_id = camera_id
+        self.cap = cv2.VideoCapture(camera_id)
+        self.negotiated = {}
+        if self.cap.isOpened():
+            self._negotiate(width, height, fps, fourcc)
+
+    def _negotiate(self, width, height, fps, fourcc):
+        # V4L2 などでは圧縮形式を先に設定しないと高解像度が選べないため、FOURCC → 解像度 → FPS の順に設定する
+        if fourcc:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if width and height:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+
+        code = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        self.negotiated = {
+            "width": int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": self.cap.get(cv2.CAP_PROP_FPS),
+            "fourcc": "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)) if code else None,
+        }
+        requested = {"width": width, "height": height, "fps": fps, "fourcc": fourcc}
+        mismatched = [name for name, value in requested.items()
+                      if value and self.negotiated[name] and self.negotiated[name] != value]
+        if mismatched:
+            print(f"CameraSource {self.camera_id}: 要求した設定 {requested} の一部が使えないため、"
+                  f"{self.negotiated} で取得します。")
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def _read(self):
+        return self.cap.read()
+
+    def set(self, prop_id, value):
+        return self.cap.set(prop_id, value)
+
+    def get(self, prop_id):
+        return self.cap.get(prop_id)
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """録画済みの動画ファイル"""
+    def __init__(self, path, realtime=True, loop=True):
+        self.cap = cv2.VideoCapture(path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        super().__init__(fps=fps, realtime=realtime, loop=loop)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def _read(self):
+        ret, image = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, image = self.cap.read()
+        self.finished = not ret
+        return ret, image
+
+    def get(self, prop_id):
+        return self.cap.get(prop_id)
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource(FrameSource):
+    """ディレクトリ内の画像をファイル名順に1枚ずつ返す"""
+    def __init__(self, directory, fps=30, realtime=True, loop=True):
+        super().__init__(fps=fps, realtime=realtime, loop=loop)
+        self.paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.index = 0
+
+    def isOpened(self):
+        return len(self.paths) > 0
+
+    def _read(self):
+        if self.index >= len(self.paths):
+            if not self.loop or not self.paths:
+                self.finished = True
+                return False, None
+            self.index = 0
+        image = cv2.imread(self.paths[self.index])
+        self.index += 1
+        return image is not None, image
+
+
+class SyntheticFaceSource(FrameSource):
+    """
+    顔の形を描いた合成フレームを生成する（カメラなしでの動作確認・計測用）
+    各顔はフレーム内をゆっくり移動し、表情（口の形）が周期的に変わる
+    """
+    def __init__(self, num_faces=1, width=640, height=480, fps=30, realtime=True, seed=0):
+        super().__init__(fps=fps, realtime=realtime, loop=True)
+        self.width, self.height = width, height
+        self.rng = np.random.default_rng(seed)
+        self.frame_count = 0
+
+        size = min(width, height)
+        self.face_size = self.rng.uniform(0.15, 0.3, num_faces) * size
+        self.pos = self.rng.uniform([0.2 * width, 0.2 * height], [0.8 * width, 0.8 * height], (num_faces, 2))
+        self.vel = self.rng.uniform(-1, 1, (num_faces, 2))
+        # 背景は一度だけ生成して使い回す
+        self.background = cv2.GaussianBlur(
+            self.rng.integers(40, 90, (height, width, 3), dtype=np.uint8), (21, 21), 0)
+
+    def _read(self):
+        image = self.background.copy()
+        self.pos += self.vel
+        margin = self.face_size[:, None] / 2
+        bounds = np.array([self.width, self.height])
+        bounce = (self.pos < margin) | (self.pos > bounds - margin)
+        self.vel[bounce] *= -1
+
+        for (cx, cy), size in zip(self.pos.astype(int), self.face_size):
+            self._draw_face(image, cx, cy, size)
+        self.frame_count += 1
+        return True, image
+
+    def _draw_face(self, image, cx, cy, size):
+        w, h = int(size * 0.4), int(size * 0.5)
+        cv2.ellipse(image, (cx, cy), (w, h), 0, 0, 360, (150, 180, 220), -1)
+        eye_y = cy - h // 4
+        for ex in (cx - w // 2, cx + w // 2):
+            cv2.ellipse(image, (ex, eye_y), (w // 5, h // 10), 0, 0, 360, (255, 255, 255), -1)
+            cv2.circle(image, (ex, eye_y), max(1, h // 14), (30, 30, 30), -1)
+        cv2.line(image, (cx, cy - h // 8), (cx, cy + h // 8), (110, 140, 180), 2)
+        smile = int(h * 0.1 * np.sin(self.frame_count * 0.05))
+        cv2.ellipse(image, (cx, cy + h // 2 - h // 6), (w // 2, abs(smile) + 1), 0,
+                    0 if smile >= 0 else 180, 180 if smile >= 0 else 360, (60, 60, 160), 3)
+
+
+def open_frame_source(spec, realtime=True):
+    """
+    設定値から入力元を作成する
+    - int または数字の文字列: カメラデバイス
+    - "synthetic" または "synthetic:N": N個の合成顔
+    - ディレクトリ: 画像列
+    - それ以外のパス: 動画ファイル
+    """
+    if isinstance(spec, FrameSource):
+        return spec
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return CameraSource(int(spec))
+    if spec.startswith("synthetic"):
+        num_faces = int(spec.split(":", 1)[1]) if ":" in spec else 1
+        return SyntheticFaceSource(num_faces=num_faces, realtime=realtime)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, realtime=realtime)
+    return VideoFileSource(spec, realtime=realtime)
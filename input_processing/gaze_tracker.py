@@ -2,29 +2,125 @@ import cv2
 import dlib
 import numpy as np
 import threading
-import time
-from config import SHAPE_PREDICTOR_PATH, SHOW_DEBUG_WINDOWS
+from config import (GAZE_EYE_ROI_SIZE, GAZE_PUPIL_DARKNESS,
+                    GAZE_HORIZONTAL_THRESHOLD, GAZE_BLINK_EAR)
+from .camera_hub import CameraHub
+from .face_landmarks import EYE_INDICES, eye_aspect_ratio, shape_to_np, load_shape_predictor
+from analysis.perf_stats import PerfStats
+from analysis.startup_timeline import StartupTimeline
+
+
+class GazeEstimator:
+    """
+    ランドマーク (68,2) から両目の瞳孔の位置を求め、視線方向を判定するクラス
+    目の領域は固定サイズに縮小し、瞳孔は暗い画素の重心（モーメント）として両目まとめて計算する
+    """
+    def __init__(self, roi_size=GAZE_EYE_ROI_SIZE, darkness=GAZE_PUPIL_DARKNESS,
+                 threshold=GAZE_HORIZONTAL_THRESHOLD, blink_ear=GAZE_BLINK_EAR):
+        self.roi_width, self.roi_height = roi_size
+        self.darkness = darkness
+        self.threshold = threshold
+        self.blink_ear = blink_ear
+
+        # 両目分の作業用バッファ (2, 高さ, 幅)
+        self.rois = np.zeros((2, self.roi_height, self.roi_width), dtype=np.uint8)
+        self.masks = np.zeros((2, self.roi_height, self.roi_width), dtype=np.uint8)
+        self.blurred = np.zeros((2, self.roi_height, self.roi_width), dtype=np.uint8)
+        self.xs = np.arange(self.roi_width, dtype=np.float32)
+        self.last_pupils = None  # デバッグ用: 目の領域内の瞳孔の位置 (2,2)、見つからない目は nan
+
+    def _extract_eyes(self, gray, eyes):
+        """目ごとに輪郭を囲む矩形を切り出して固定サイズに縮小し、輪郭の内側のマスクを作る"""
+        h, w = gray.shape[:2]
+        mins = eyes.min(axis=1)
+        maxs = eyes.max(axis=1) + 1
+        valid = np.ones(2, dtype=bool)
+        for i in range(2):
+            x1, y1 = max(0, int(mins[i, 0])), max(0, int(mins[i, 1]))
+            x2, y2 = min(w, int(maxs[i, 0])), min(h, int(maxs[i, 1]))
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                valid[i] = False
+                continue
+            cv2.resize(gray[y1:y2, x1:x2], (self.roi_width, self.roi_height), dst=self.rois[i], interpolation=cv2.INTER_AREA)
+            scale = np.array([self.roi_width / (x2 - x1), self.roi_height / (y2 - y1)], dtype=np.float32)
+            polygon = np.round((eyes[i] - (x1, y1)) * scale).astype(np.int32)
+            self.masks[i] = 0
+            cv2.fillPoly(self.masks[i], [polygon], 1)
+        return valid
+
+    def estimate(self, gray, landmarks):
+        """グレースケール画像とランドマーク (68,2) から "Left" / "Right" / "Center" / "Blink" を返す"""
+        self.last_pupils = None
+        eyes = landmarks[EYE_INDICES]  # (2,6,2)
+        open_eyes = eye_aspect_ratio(eyes) >= self.blink_ear
+        if not open_eyes.any():
+            return "Blink"
+
+        valid = self._extract_eyes(gray, eyes) & open_eyes
+        if not valid.any():
+            return "Blink"
+
+        # 目の輪郭の内側で、最も暗い画素に近い明るさの画素を重み付けして重心を求める
+        # ぼかしは目ごとにかけ、もう片方の目の画素が境目に混ざらないようにする
+        for i in range(2):
+            cv2.GaussianBlur(self.rois[i], (3, 3), 0, dst=self.blurred[i], borderType=cv2.BORDER_REPLICATE)
+        rois = self.blurred.astype(np.float32)
+        masked = np.where(self.masks > 0, rois, 255.0)
+        darkest = masked.min(axis=(1, 2), keepdims=True)
+        weights = np.maximum(darkest + self.darkness - masked, 0) * self.masks
+        m00 = weights.sum(axis=(1, 2))
+        found = valid & (m00 > 0)
+        if not found.any():
+            return "Blink"
+
+        m00 = np.maximum(m00, 1e-6)
+        cx = (weights.sum(axis=1) @ self.xs) / m00
+        cy = (weights.sum(axis=2) @ np.arange(self.roi_height, dtype=np.float32)) / m00
+        self.last_pupils = np.where(found[:, None], np.stack([cx, cy], axis=1), np.nan)
+
+        # 瞳孔の目の中心からのずれ（目の幅に対する割合）を、見つかった目で平均する
+        dx = float(np.mean(cx[found] / self.roi_width - 0.5))
+        if dx > self.threshold:
+            return "Left"  # カメラから見て
+        elif dx < -self.threshold:
+            return "Right"  # カメラから見て
+        return "Center"
+
 
 class GazeTracker:
     """
-    dlibを使用して視線方向を追跡するクラス
+    視線方向を追跡するクラス
+    landmark_source に同じカメラの Sensor を渡した場合は、そのセンサーが推定した顔ランドマークを再利用し、
+    渡さない場合は dlib で顔を検出してランドマークを推定する
     """
-    def __init__(self, camera_id=0):
+    def __init__(self, camera_id=0, landmark_source=None):
         self.camera_id = camera_id
-        self.detector = dlib.get_frontal_face_detector()
-        self.predictor = dlib.shape_predictor(SHAPE_PREDICTOR_PATH)
-        
+        self.landmark_source = landmark_source
+        self.detector = None
+        self.predictor = None
+        if landmark_source is None:
+            self.detector = dlib.get_frontal_face_detector()
+            with StartupTimeline.shared().span("gaze.shape_predictor"):
+                self.predictor = load_shape_predictor()
+        self.estimator = GazeEstimator()
+        self.perf = PerfStats.shared()
+
         self.current_gaze_direction = "Center"
         self.last_frame = None
+        self.last_landmarks = None
+        self.frames_processed = 0
+        # 最初のフレームを処理したらセットされる（メインループの開始の判定に使う）
+        self.ready = threading.Event()
         self.running = False
         self.thread = None
-        self.debug_window_name = f"Gaze Tracker {self.camera_id} - Debug"
+        self.debug_name = f"Gaze Tracker {self.camera_id}"
 
 
     def start(self):
         """視線追跡を別スレッドで開始"""
         self.running = True
-        self.thread = threading.Thread(target=self._tracking_thread, daemon=True)
+        target = self._tracking_thread if self.landmark_source is None else self._reuse_thread
+        self.thread = threading.Thread(target=target, daemon=True)
         self.thread.start()
         print("GazeTracker started.")
 
@@ -38,75 +134,73 @@ class GazeTracker:
     def get_current_gaze(self):
         return self.current_gaze_direction
 
+    def wait_until_ready(self, timeout=None):
+        """最初のフレームの処理が終わるまで待つ。タイムアウトした場合は False を返す"""
+        return self.ready.wait(timeout)
+
+    def _update(self, frame, gray, landmarks):
+        if landmarks is not None:
+            with self.perf.measure('gaze.estimate'):
+                self.current_gaze_direction = self.estimator.estimate(gray, landmarks)
+        else:
+            self.current_gaze_direction = "Center"
+        self.last_frame = frame
+        self.last_landmarks = landmarks
+        self.frames_processed += 1
+        if not self.ready.is_set():
+            StartupTimeline.shared().mark(f"{self.debug_name} first result")
+            self.ready.set()
+
+    def get_debug_info(self):
+        """デバッグ表示用の最新のフレームと注記（描画は DebugCompositor がメインスレッドで行う）"""
+        frame, landmarks = self.last_frame, self.last_landmarks
+        if frame is None:
+            return None
+        return {
+            "name": self.debug_name,
+            "seq": self.frames_processed,
+            "frame": frame,
+            "boxes": [],
+            "points": landmarks[EYE_INDICES].reshape(-1, 2) if landmarks is not None else None,
+            "lines": [self.current_gaze_direction],
+        }
+
     def _tracking_thread(self):
-        cap = cv2.VideoCapture(self.camera_id)
-        if not cap.isOpened():
+        # 同じカメラを使うセンサーとは、フレームとグレースケール画像を共有する
+        subscription = CameraHub.shared().subscribe(self.camera_id)
+        if subscription is None:
             print(f"GazeTracker: Camera {self.camera_id} could not be opened.")
             return
 
         while self.running:
-            ret, frame = cap.read()
-            if not ret:
-                time.sleep(0.1)
+            grabbed = subscription.read(timeout=0.5)
+            if grabbed is None:
                 continue
 
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.detector(gray)
-
+            gray = grabbed.gray()
+            with self.perf.measure('gaze.detect'):
+                faces = self.detector(gray)
+            landmarks = None
             if len(faces) > 0:
-                face = faces[0] # 最初の顔を対象とする
-                landmarks = self.predictor(gray, face)
-                
-                # 右目の処理
-                self.current_gaze_direction = self._detect_gaze_from_eye(landmarks, frame, range(36, 42))
-            else:
-                self.current_gaze_direction = "Center"
-
-            # デバッグ用にテキストを描画
-            cv2.putText(frame, self.current_gaze_direction, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-            self.last_frame = frame.copy()
-            
-            if SHOW_DEBUG_WINDOWS:
-                cv2.imshow(self.debug_window_name, self.last_frame)
-                cv2.waitKey(1) 
-        
-        cap.release()
-        if SHOW_DEBUG_WINDOWS:
-                    try:
-                        cv2.destroyWindow(self.debug_window_name)
-                    except cv2.error:
-                        pass
-                    
-    def _detect_gaze_from_eye(self, landmarks, frame, eye_points):
-        # 目の領域を抽出
-        region = np.array([(landmarks.part(i).x, landmarks.part(i).y) for i in eye_points], np.int32)
-        x, y, w, h = cv2.boundingRect(region)
-        
-        eye_frame = frame[y:y+h, x:x+w]
-        if eye_frame.size == 0:
-            return "Blink"
+                # 最初の顔を対象とし、ランドマークは (68,2) の配列に一度だけ変換する
+                with self.perf.measure('gaze.landmarks'):
+                    landmarks = shape_to_np(self.predictor(gray, faces[0]))
+            self._update(grabbed.image, gray, landmarks)
+
+        subscription.close()
+
+    def _reuse_thread(self):
+        # センサーの推論結果を待ち、最も大きい顔のランドマークから視線を求める（顔検出は行わない）
+        last_seq = -1
+        while self.running:
+            result = self.landmark_source.wait_for_result(last_seq, timeout=0.5)
+            if result is None:
+                continue
+            grabbed, faces = result
+            last_seq = grabbed.seq
 
-        # 瞳孔検出（簡略版）
-        eye_gray = cv2.cvtColor(eye_frame, cv2.COLOR_BGR2GRAY)
-        eye_gray = cv2.GaussianBlur(eye_gray, (7, 7), 0)
-        _, threshold = cv2.threshold(eye_gray, 40, 255, cv2.THRESH_BINARY_INV)
-        
-        contours, _ = cv2.findContours(threshold, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        contours = sorted(contours, key=lambda c: cv2.contourArea(c), reverse=True)
-
-        if len(contours) > 0:
-            cnt = contours[0]
-            (px, py, pw, ph) = cv2.boundingRect(cnt)
-            pupil_center = (px + pw // 2, py + ph // 2)
-            
-            # 視線方向の判定
-            eye_center_x = w // 2
-            dx = pupil_center[0] - eye_center_x
-            
-            if dx > 8:
-                return "Left" # カメラから見て
-            elif dx < -8:
-                return "Right" # カメラから見て
-            else:
-                return "Center"
-        return "Blink"
\ No newline at end of file
+            landmarks = None
+            if faces:
+                largest_face = max(faces, key=lambda face: (face['box'][2] - face['box'][0]) * (face['box'][3] - face['box'][1]))
+                landmarks = largest_face.get('landmarks')
+            self._update(grabbed.image, grabbed.gray(), landmarks)
@@ -0,0 +1,259 @@
+import cv2
+import numpy as np
+import torch
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import (EMOTION_BACKEND, INFERENCE_BATCH_WINDOW, INFERENCE_MAX_BATCH,
+                    USE_CHANGE_GATE, USE_EMOTION_CACHE, WARM_UP_MODELS, CAPTURE_WIDTH, CAPTURE_HEIGHT)
+from .emotion_detector import EmotionDetector
+from analysis.perf_stats import PerfStats
+from analysis.startup_timeline import StartupTimeline
+from .face_landmarks import box_to_rect, shape_to_np, get_face_orientation, load_shape_predictor
+from .emotion_backends import load_emotion_model
+from .change_gate import ChangeGate
+from .emotion_cache import EmotionCache
+
+
+class InferenceRequest:
+    """推論エンジンに投入された1フレーム分の要求と、その結果"""
+    def __init__(self, frame, client_id, gray=None, boxes=None, track_ids=None):
+        # frame には Frame（frame_grabber）も渡せる。顔検出の縮小画像は Frame.resized で作り、他の利用者と共有する
+        self.source = frame
+        self.frame = getattr(frame, 'image', frame)
+        self.client_id = client_id
+        self.gray = gray
+        self.boxes = boxes  # None の場合はYOLOで顔を検出する
+        self.track_ids = track_ids
+        self.faces = []
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """結果が出るまで待機する。タイムアウトした場合は False を返す"""
+        return self.done.wait(timeout)
+
+
+class InferenceEngine:
+    """
+    YOLO・感情CNN・dlibランドマークのモデルをプロセス内で1つだけ保持し、
+    複数のセンサーから届いたフレームをまとめて推論するクラス
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """プロセス全体で共有するエンジンを返す（初回呼び出し時に生成）"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __init__(self, device=None, batch_window=INFERENCE_BATCH_WINDOW, max_batch=INFERENCE_MAX_BATCH,
+                 emotion_backend=EMOTION_BACKEND, warm_up=WARM_UP_MODELS):
+        self.device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.emotion_backend = emotion_backend
+        self.perf = PerfStats.shared()
+        self.timeline = StartupTimeline.shared()
+
+        # モデルと検出器の初期化（全センサーで1つずつ）
+        # YOLO・感情CNN・dlibのモデルはファイルの読み込みの多くがGILを解放するため、並列に読み込む
+        # 感情認識の結果のキャッシュも全センサーで共有する
+        self.emotion_cache = EmotionCache() if USE_EMOTION_CACHE else None
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="model-loader") as executor:
+            detector_future = executor.submit(self._timed, "engine.yolo", EmotionDetector,
+                                              device=self.device, cache=self.emotion_cache)
+            model_future = executor.submit(self._timed, "engine.emotion_model", self._load_emotion_model)
+            predictor_future = executor.submit(self._timed, "engine.shape_predictor", load_shape_predictor)
+            self.emotion_detector = detector_future.result()
+            self.emotion_model, emotion_device = model_future.result()
+            self.landmark_predictor = predictor_future.result()
+        # int8 のモデルは CPU で実行するため、入力テンソルも CPU に置く
+        if emotion_device is not None:
+            self.emotion_detector.classifier.device = emotion_device
+
+        # 初回の推論だけ遅くなる分（メモリの確保・カーネルの選択など）を、最初のフレームが届く前に済ませる
+        if warm_up:
+            with self.timeline.span("engine.warm_up"):
+                self.warm_up()
+        # 変化のない顔は前回の感情認識の結果を再利用する
+        self.change_gate = ChangeGate() if USE_CHANGE_GATE else None
+
+        # 要求キューと処理スレッド
+        self.requests = queue.Queue()
+        self.num_clients = 0
+        self.next_client_id = 0
+        self.client_lock = threading.Lock()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _timed(self, name, function, *args, **kwargs):
+        with self.timeline.span(name):
+            return function(*args, **kwargs)
+
+    def _load_emotion_model(self):
+        """(モデル, 実行するデバイス) を返す。読み込めなかった場合は (None, None)"""
+        try:
+            model, device = load_emotion_model(self.emotion_backend, self.device)
+            print(f"InferenceEngine: Emotion model loaded successfully ({self.emotion_backend}).")
+            return model, device
+        except Exception as e:
+            print(f"InferenceEngine: Failed to load emotion model - {e}")
+            return None, None
+
+    def warm_up(self, width=CAPTURE_WIDTH, height=CAPTURE_HEIGHT):
+        """
+        ダミーのフレームでYOLO・感情CNN・ランドマーク推定を1回ずつ実行する
+        結果のキャッシュや変化の判定には記録しない
+        """
+        try:
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+            gray = np.zeros((height, width), dtype=np.uint8)
+            self.emotion_detector.detect_boxes_batch([frame])
+            size = min(height, width) // 3
+            box = np.array([[width // 2 - size // 2, height // 2 - size // 2, width // 2 + size // 2, height // 2 + size // 2]])
+            if self.emotion_model is not None:
+                classifier = self.emotion_detector.classifier
+                cache, classifier.cache = classifier.cache, None
+                try:
+                    classifier.predict_many([gray], [box], self.emotion_model)
+                finally:
+                    classifier.cache = cache
+            self.landmark_predictor(gray, box_to_rect(box[0]))
+        except Exception as e:
+            print(f"InferenceEngine: Warm-up failed - {e}")
+
+    def register(self):
+        """センサーを登録し、要求の送り先を識別するIDを返す"""
+        with self.client_lock:
+            self.num_clients += 1
+            self.next_client_id += 1
+            return self.next_client_id
+
+    def unregister(self, client_id=None):
+        with self.client_lock:
+            self.num_clients = max(0, self.num_clients - 1)
+        if self.change_gate and client_id is not None:
+            self.change_gate.forget(client_id)
+
+    def get_stats(self):
+        """感情CNNの省略率・キャッシュのヒット率などの計測値を返す（キャッシュの値は cache_ で始まる）"""
+        stats = {}
+        if self.change_gate is not None:
+            stats.update(self.change_gate.get_stats())
+        if self.emotion_cache is not None:
+            stats.update({f"cache_{name}": value for name, value in self.emotion_cache.get_stats().items()})
+        return stats
+
+    def submit(self, frame, client_id=0, gray=None, boxes=None, track_ids=None):
+        """
+        フレームを推論キューに投入し、結果を受け取るための要求オブジェクトを返す
+        boxes を渡した場合（追跡中の顔）はYOLOを省略し、その矩形で感情とランドマークを推定する
+        """
+        request = InferenceRequest(frame, client_id, gray, boxes, track_ids)
+        self.requests.put(request)
+        return request
+
+    def infer(self, frame, client_id=0, gray=None, boxes=None, track_ids=None, timeout=None):
+        """フレームを投入し、同じバッチの推論が終わるまで待って結果を返す"""
+        request = self.submit(frame, client_id, gray, boxes, track_ids)
+        request.wait(timeout)
+        return request
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+
+    def _collect_batch(self):
+        """最初の要求が届いてから batch_window の間、他のセンサーの要求を待ってまとめる"""
+        try:
+            first = self.requests.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.perf_counter() + self.batch_window
+        # 登録済みの全センサーから要求が揃えば待たずに処理する
+        while len(batch) < min(self.max_batch, max(1, self.num_clients)):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self.running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            try:
+                with self.perf.measure('engine.batch'):
+                    self._process_batch(batch)
+            except Exception as e:
+                print(f"InferenceEngine: Error processing batch - {e}")
+            finally:
+                for request in batch:
+                    request.done.set()
+
+    def _process_batch(self, batch):
+        # グレースケール変換はフレームごとに1回だけ行い、CNNとランドマークで共有する
+        grays = [request.gray if request.gray is not None else cv2.cvtColor(request.frame, cv2.COLOR_BGR2GRAY)
+                 for request in batch]
+
+        # 顔検出: 矩形が未知のフレームだけ、まとめてYOLOを1回で実行（dlibの顔検出は行わない）
+        boxes_list = [request.boxes for request in batch]
+        pending = [i for i, boxes in enumerate(boxes_list) if boxes is None]
+        if pending:
+            detected = self.emotion_detector.detect_boxes_batch([batch[i].source for i in pending])
+            for i, boxes in zip(pending, detected):
+                boxes_list[i] = boxes
+
+        # 感情認識: 全フレームの全ての顔をCNNの1回の順伝播で分類
+        if self.emotion_model is not None:
+            probabilities = self._classify(batch, grays, boxes_list)
+        else:
+            probabilities = [None] * len(batch)
+
+        start = time.perf_counter()
+        for request, gray, boxes, probs in zip(batch, grays, boxes_list, probabilities):
+            faces = self.emotion_detector.make_faces(boxes, probs)
+            height, width = gray.shape[:2]
+            # YOLOの矩形をそのままランドマーク推定に使い、顔ごとに向きを付与する
+            for i, face in enumerate(faces):
+                if request.track_ids is not None:
+                    face['track_id'] = request.track_ids[i]
+                landmarks = shape_to_np(self.landmark_predictor(gray, box_to_rect(face['box'])))
+                face['landmarks'] = landmarks
+                face['direction'] = get_face_orientation(landmarks, face['box'], width, height)
+            request.faces = faces
+        self.perf.record('engine.landmarks', time.perf_counter() - start)
+
+    def _classify(self, batch, grays, boxes_list):
+        """変化のない顔は前回の確率を再利用し、残りの顔だけをCNNでまとめて分類する"""
+        classifier = self.emotion_detector.classifier
+        if self.change_gate is None:
+            return classifier.predict_many(grays, boxes_list, self.emotion_model)
+
+        num_classes = len(classifier.emotion_labels)
+        gated = [self.change_gate.check(request.client_id, gray, boxes, request.track_ids, num_classes)
+                 for request, gray, boxes in zip(batch, grays, boxes_list)]
+        pending_boxes = [np.asarray(boxes).reshape(-1, 4)[pending] for boxes, (_, pending, _) in zip(boxes_list, gated)]
+
+        start = time.perf_counter()
+        computed = classifier.predict_many(grays, pending_boxes, self.emotion_model)
+        self.change_gate.record_inference(sum(len(boxes) for boxes in pending_boxes), time.perf_counter() - start)
+
+        probabilities = []
+        for request, boxes, (probs, pending, context), new_probs in zip(batch, boxes_list, gated, computed):
+            probs[pending] = new_probs
+            self.change_gate.store(request.client_id, boxes, probs, pending, context)
+            probabilities.append(probs)
+        return probabilities
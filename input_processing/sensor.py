@@ -1,19 +1,20 @@
-import cv2
-import dlib
-import torch
 import sounddevice as sd
-import numpy as np
 import threading
 import time
-from config import SHOW_DEBUG_WINDOWS, SHAPE_PREDICTOR_PATH, EMOTION_MODEL_PATH
-from .emotion_detector import EmotionDetector
-from train_model import EmotionCNN 
+from config import USE_FACE_TRACKING, FRAME_SOURCE_REALTIME, STATE_VOLUME_EPSILON
+from .inference_engine import InferenceEngine
+from .face_tracker import FaceTracker
+from .camera_hub import CameraHub
+from .audio_engine import AudioEngine, WavFilePlayer
+from .sensor_state import StateBuffer
+from analysis.perf_stats import PerfStats
+from analysis.startup_timeline import StartupTimeline
 
 class Sensor:
     """
     1台のカメラとマイクからの情報（感情、顔向き、音量）を処理するクラス
     """
-    def __init__(self, camera_id=0, mic_id=1):
+    def __init__(self, camera_id=0, mic_id=1, engine=None):
         # デバイスID
         self.camera_id = camera_id
         self.mic_id = mic_id
@@ -23,39 +24,46 @@ class Sensor:
         self.current_face_direction = "center"
         self.current_volume = 0
         self.last_processed_frame = None
+        # 最新の推論結果 (Frame, faces)。視線追跡などがランドマークを再利用するために公開する
+        self.last_result = None
+        self.result_condition = threading.Condition()
         self.running = False
-
-        # モデルと検出器の初期化
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.emotion_model = self._load_emotion_model()
-        self.emotion_detector = EmotionDetector(device=self.device)
-        self.face_detector = dlib.get_frontal_face_detector()
-        self.landmark_predictor = dlib.shape_predictor(SHAPE_PREDICTOR_PATH)
-        self.debug_window_name = f"Sensor {self.camera_id} - Debug"
+        # 描画ループ向けに公開する状態（更新ごとに seq が増える）
+        self.state = StateBuffer()
+
+        # 遅延計測用（time.monotonic() の値）
+        self.last_capture_time = None  # 処理したフレームの取得時刻
+        self.last_processed_time = None  # そのフレームの処理完了時刻
+        self.frames_processed = 0
+        # 最初のフレームの推論結果を公開したらセットされる（メインループの開始の判定に使う）
+        self.ready = threading.Event()
+        self.perf = PerfStats.shared()
+        self.timeline = StartupTimeline.shared()
+
+        # モデルは全センサーで共有する推論エンジンが保持する
+        self.engine = engine or InferenceEngine.shared()
+        self.client_id = None
+        # 検出の合間は顔を追跡し、YOLOの実行回数を減らす
+        self.tracker = FaceTracker() if USE_FACE_TRACKING else None
+        self.debug_name = f"Sensor {self.camera_id}"
+
+        # 音声はリングバッファに溜め、一定のホップ幅ごとに特徴量を計算する
+        self.audio_engine = AudioEngine()
 
         # スレッド
+        self.subscription = None
         self.capture_thread = None
         self.audio_thread = None
 
-    def _load_emotion_model(self):
-        try:
-            model = EmotionCNN()
-            model.load_state_dict(torch.load(EMOTION_MODEL_PATH, map_location=self.device))
-            model.to(self.device)
-            model.eval()
-            print(f"Sensor {self.camera_id}: Emotion model loaded successfully.")
-            return model
-        except Exception as e:
-            print(f"Sensor {self.camera_id}: Failed to load emotion model - {e}")
-            return None
-
-    def start(self):
-        """センサーの処理を別スレッドで開始"""
+    def start(self, audio=True):
+        """センサーの処理を別スレッドで開始（audio=False の場合は映像のみ）"""
         self.running = True
+        self.client_id = self.engine.register()
         self.capture_thread = threading.Thread(target=self._run_capture, daemon=True)
-        self.audio_thread = threading.Thread(target=self._run_audio, daemon=True)
         self.capture_thread.start()
-        self.audio_thread.start()
+        if audio:
+            self.audio_thread = threading.Thread(target=self._run_audio, daemon=True)
+            self.audio_thread.start()
         print(f"Sensor (Cam: {self.camera_id}, Mic: {self.mic_id}) started.")
 
     def stop(self):
@@ -63,124 +71,166 @@ class Sensor:
         self.running = False
         if self.capture_thread: self.capture_thread.join()
         if self.audio_thread: self.audio_thread.join() # Audio stream stops when flag is false
+        if self.client_id is not None:
+            self.engine.unregister(self.client_id)
+            self.client_id = None
         print(f"Sensor (Cam: {self.camera_id}, Mic: {self.mic_id}) stopped.")
 
     def _run_capture(self):
-        cap = cv2.VideoCapture(self.camera_id)
-        if not cap.isOpened():
+        # カメラの読み込みは共有のハブに任せ、ここでは常に最新のフレームだけを処理する
+        # 同じカメラを使う他のセンサー・視線追跡とはフレームとグレースケール画像を共有する
+        with self.timeline.span(f"{self.debug_name} camera open"):
+            self.subscription = CameraHub.shared().subscribe(self.camera_id)
+        if self.subscription is None:
             print(f"Error: Could not open camera {self.camera_id}.")
             return
         
         while self.running:
-            ret, frame = cap.read()
-            if not ret:
-                time.sleep(0.1)
+            grabbed = self.subscription.read(timeout=0.5)
+            if grabbed is None:
                 continue
+            frame_start = time.perf_counter()
+            frame = grabbed.image
+            with self.perf.measure('sensor.gray'):
+                gray = grabbed.gray()
+
+            # 検出の合間は追跡した矩形を使い、YOLOを省略する
+            boxes, track_ids = None, None
+            if self.tracker and not self.tracker.needs_detection():
+                with self.perf.measure('sensor.track'):
+                    tracked = self.tracker.track(gray)
+                if tracked is not None:
+                    boxes, track_ids = tracked
+
+            # 推論エンジンに投入し、他のセンサーのフレームとまとめて処理する
+            start = time.perf_counter()
+            result = self.engine.infer(grabbed, self.client_id, gray=gray, boxes=boxes, track_ids=track_ids)
+            self.perf.record('sensor.infer', time.perf_counter() - start)
+            if self.tracker and boxes is None:
+                track_ids = self.tracker.update_detections(gray, [face['box'] for face in result.faces], time.perf_counter() - start)
+                for face, track_id in zip(result.faces, track_ids):
+                    face['track_id'] = track_id
+
+            # 感情認識: 最も確信度の高い顔の感情
+            if self.engine.emotion_model is not None:
+                self.current_emotion = "Neutral"
+                if result.faces:
+                    self.current_emotion = max(result.faces, key=lambda face: face['confidence'])['emotion']
             
-            # 感情認識
-            if self.emotion_model:
-                self.current_emotion, _ = self.emotion_detector.detect(frame.copy(), self.emotion_model)
-            
-            # 顔向き認識
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_detector(gray)
-            if len(faces) > 0:
-                largest_face = max(faces, key=lambda rect: rect.width() * rect.height())
-                landmarks = self.landmark_predictor(gray, largest_face)
-                self.current_face_direction = self._get_face_orientation(landmarks, largest_face, frame.shape[1], frame.shape[0])
-                # 顔の矩形を描画
-                x, y, w, h = largest_face.left(), largest_face.top(), largest_face.width(), largest_face.height()
-                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            
-
-            info_text_emo = f"Emotion: {self.current_emotion}"
-            info_text_face = f"Face: {self.current_face_direction}"
-            info_text_vol = f"Volume: {self.current_volume:.2f}"
-            cv2.putText(frame, info_text_emo, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            cv2.putText(frame, info_text_face, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            cv2.putText(frame, info_text_vol, (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            
-            if SHOW_DEBUG_WINDOWS:
-                cv2.imshow(self.debug_window_name, frame)
-                cv2.waitKey(1)
-
-        
-        cap.release()
-        if SHOW_DEBUG_WINDOWS:
-            try:
-                cv2.destroyWindow(self.debug_window_name)
-            except cv2.error:
-                pass
+            # 顔向き認識: 最も大きい顔の向き
+            if result.faces:
+                largest_face = max(result.faces, key=lambda face: (face['box'][2] - face['box'][0]) * (face['box'][3] - face['box'][1]))
+                self.current_face_direction = largest_face['direction']
+
+            self.state.publish(emotion=self.current_emotion, face_direction=self.current_face_direction)
+            with self.result_condition:
+                self.last_result = (grabbed, result.faces)
+                self.result_condition.notify_all()
+
+            self.last_processed_frame = frame
+            self.last_capture_time = grabbed.capture_time
+            self.last_processed_time = time.monotonic()
+            self.frames_processed += 1
+            self.perf.record('sensor.frame', time.perf_counter() - frame_start)
+            if not self.ready.is_set():
+                self.timeline.mark(f"{self.debug_name} first result")
+                self.ready.set()
+
+        self.subscription.close()
     
     def _run_audio(self):
         def audio_callback(indata, frames, time, status):
             if status:
                 print(status)
-            self.current_volume = np.linalg.norm(indata) * 10
+            self.audio_engine.push(indata)
         
         try:
-            with sd.InputStream(device=self.mic_id, callback=audio_callback):
+            # マイクIDの代わりにWAVファイルが指定された場合は、ファイルを流し込む
+            if isinstance(self.mic_id, str) and self.mic_id.lower().endswith('.wav'):
+                player = WavFilePlayer(self.audio_engine, self.mic_id, realtime=FRAME_SOURCE_REALTIME)
+                player.start()
+                print(f"Audio file playback started: {self.mic_id}")
+                while self.running:
+                    self._update_audio()
+                    time.sleep(0.01)
+                player.stop()
+                return
+
+            with sd.InputStream(device=self.mic_id, callback=audio_callback) as stream:
+                if int(stream.samplerate) != self.audio_engine.samplerate:
+                    self.audio_engine = AudioEngine(samplerate=int(stream.samplerate))
                 print(f"Audio stream started for Mic ID: {self.mic_id}")
                 while self.running:
-                    sd.sleep(100)
+                    self._update_audio()
+                    sd.sleep(10)
         except Exception as e:
             print(f"Error with audio stream on Mic ID {self.mic_id}: {e}")
 
-    def _get_face_orientation(self, landmarks, face_rect, frame_width, frame_height):
-        # 顔のバウンディングボックスの座標
-        x1 = face_rect.left()
-        y1 = face_rect.top()
-        x2 = face_rect.right()
-        y2 = face_rect.bottom()
-
-        # 顔の幅と高さ
-        face_width = x2 - x1
-        face_height = y2 - y1
-
-        # 画面に対する顔の大きさの割合
-        face_area_ratio = (face_width * face_height) / (frame_width * frame_height)
-
-        # 顔のランドマークの座標
-        nose_tip = landmarks.part(30)  # 鼻先
-        chin = landmarks.part(8)       # 顎
-        left_cheek = landmarks.part(1)  # 左頬
-        right_cheek = landmarks.part(15) # 右頬
-
-        # 差分を計算
-        dx = nose_tip.x - (left_cheek.x + right_cheek.x) // 2
-        dy = nose_tip.y - chin.y
-
-        # 向き判定の閾値を顔の大きさに応じてスケーリング
-        dx_threshold = 15 * face_area_ratio * 10
-        dy_threshold_up = -110 * face_area_ratio * 13
-        dy_threshold_down = -68 * face_area_ratio * 18
-
-        direction = "center"
-
-        # 向きの判定
-        if dx < -dx_threshold and dy < dy_threshold_up:
-            direction = "up-right"
-        elif dx > dx_threshold and dy < dy_threshold_up:
-            direction = "up-left"
-        elif dx < -dx_threshold and dy > dy_threshold_down:
-            direction = "down-right"
-        elif dx > dx_threshold and dy > dy_threshold_down:
-            direction = "down-left"
-        elif dx < -dx_threshold:
-            direction = "right"
-        elif dx > dx_threshold:
-            direction = "left"
-        elif dy < dy_threshold_up:
-            direction = "up"
-        elif dy > dy_threshold_down:
-            direction = "down"
-
-        return direction
+    def _update_audio(self):
+        """溜まった音声の特徴量を計算し、音量を更新する"""
+        if self.audio_engine.process():
+            self.current_volume = self.audio_engine.latest.smoothed_volume
+            # 細かな揺らぎでは新しい状態として扱わない
+            if abs(self.current_volume - self.state.read().volume) >= STATE_VOLUME_EPSILON:
+                self.state.publish(volume=self.current_volume)
+
+    def get_audio_features(self):
+        """最新の音響特徴量（AudioFeatures）を返す"""
+        return self.audio_engine.latest
+
+    def get_state(self, out=None):
+        """
+        現在のセンサーの状態（SensorState）を返す
+        out を渡すとそのオブジェクトに上書きするため、毎フレームの生成を避けられる
+        """
+        return self.state.read(out)
+
+    def wait_until_ready(self, timeout=None):
+        """最初のフレームの推論結果が出るまで待つ。タイムアウトした場合は False を返す"""
+        return self.ready.wait(timeout)
+
+    def wait_for_result(self, last_seq=-1, timeout=None):
+        """
+        last_seq より新しいフレームの推論結果 (Frame, faces) を待って返す。タイムアウトした場合は None
+        faces の各要素は 'box', 'emotion', 'landmarks' (68,2) などを持つ
+        """
+        with self.result_condition:
+            ready = self.result_condition.wait_for(
+                lambda: self.last_result is not None and self.last_result[0].seq > last_seq, timeout)
+            return self.last_result if ready else None
+
+    def get_debug_info(self):
+        """デバッグ表示用の最新のフレームと注記（描画は DebugCompositor がメインスレッドで行う）"""
+        result = self.last_result
+        if result is None:
+            return None
+        grabbed, faces = result
+        state = self.state.read()
+        return {
+            "name": self.debug_name,
+            "seq": grabbed.seq,
+            "frame": grabbed.image,
+            "boxes": [face['box'] for face in faces],
+            "lines": [f"Emotion: {state.emotion}", f"Face: {state.face_direction}", f"Volume: {state.volume:.2f}"],
+        }
 
     def get_all_data(self):
         """現在のセンサーデータを辞書で返す"""
+        return self.state.read().as_dict()
+
+    def get_latency_stats(self):
+        """最新の処理結果の取得時刻・処理時刻と、読み捨てられたフレーム数を返す"""
+        latency = None
+        if self.last_capture_time is not None:
+            latency = self.last_processed_time - self.last_capture_time
+        engine_stats = self.engine.get_stats()
         return {
-            "emotion": self.current_emotion,
-            "face_direction": self.current_face_direction,
-            "volume": self.current_volume,
+            "capture_time": self.last_capture_time,
+            "processed_time": self.last_processed_time,
+            "latency": latency,
+            "frames_grabbed": self.subscription.grabber.frames_grabbed if self.subscription else 0,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.subscription.frames_dropped if self.subscription else 0,
+            "emotion_skip_rate": engine_stats.get("skip_rate", 0.0),
+            "emotion_cache_hit_rate": engine_stats.get("cache_hit_rate", 0.0),
         }
\ No newline at end of file
@@ -0,0 +1,316 @@
+import atexit
+import multiprocessing as mp
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from config import SHOW_DEBUG_WINDOWS, WORKER_DEBUG_FRAME_SIZE, WORKER_DEBUG_MAX_BOXES, SHARED_READ_TIMEOUT
+from .sensor_state import SensorState
+
+# 文字列の状態は共有メモリ上では番号で表す
+EMOTIONS = ['Angry', 'Disgust', 'Fear', 'Happy', 'Sad', 'Surprise', 'Neutral']
+DIRECTIONS = ['center', 'left', 'right', 'up', 'down', 'up-left', 'up-right', 'down-left', 'down-right']
+GAZES = ['Center', 'Left', 'Right', 'Blink']
+
+# 共有メモリ上のレコード。seq が奇数の間は書き込み中（シーケンスロック）
+# デバッグ用フレームもこのレコードの seq で保護し、boxes にはそのフレーム上の顔の矩形を num_boxes 個まで置く
+STATE_DTYPE = np.dtype([
+    ('seq', np.int64),
+    ('state_seq', np.int64),
+    ('emotion', np.int32),
+    ('face_direction', np.int32),
+    ('gaze', np.int32),
+    ('volume', np.float64),
+    ('emotion_time', np.float64),
+    ('face_direction_time', np.float64),
+    ('volume_time', np.float64),
+    ('heartbeat', np.float64),
+    ('frame_seq', np.int64),
+    ('num_boxes', np.int32),
+    ('boxes', np.int32, (WORKER_DEBUG_MAX_BOXES, 4)),
+    ('ready', np.int64),
+])
+
+
+def _index(labels, value):
+    return labels.index(value) if value in labels else 0
+
+
+def _time_or_nan(value):
+    return np.nan if value is None else value
+
+
+class SharedBlock:
+    """状態レコードと（任意で）デバッグ用フレームを置く共有メモリ"""
+    def __init__(self, name=None, frame_shape=None):
+        frame_bytes = int(np.prod(frame_shape)) if frame_shape else 0
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=STATE_DTYPE.itemsize + frame_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.record = np.ndarray((1,), dtype=STATE_DTYPE, buffer=self.shm.buf)[0]
+        self.frame = None
+        if frame_shape:
+            self.frame = np.ndarray(frame_shape, dtype=np.uint8, buffer=self.shm.buf, offset=STATE_DTYPE.itemsize)
+        # 最後に一貫して読めたレコードとフレーム。書き込み中のまま読めない場合はこれを返す
+        self.last_good = self.record.copy()
+        self.last_frame = None
+        self.last_frame_seq = 0
+        self.last_boxes = np.empty((0, 4), dtype=np.int32)
+        self.stale_reads = 0
+
+    def write(self, frame=None, **values):
+        """
+        ワーカー側（書き込みは1プロセスのみ）
+        frame: 共有メモリと同じ大きさに縮小済みのデバッグ用フレーム。渡した場合は frame_seq も増やす
+        """
+        record = self.record
+        record['seq'] += 1
+        for name, value in values.items():
+            record[name] = value
+        if frame is not None:
+            self.frame[...] = frame
+            record['frame_seq'] += 1
+        record['seq'] += 1
+
+    def read(self, timeout=SHARED_READ_TIMEOUT):
+        """
+        メインプロセス側。書き込み中でない一貫したレコードのコピーを返す
+        timeout 秒以内に読めない場合（ワーカーが書き込みの途中で終了し、seq が奇数のまま残った場合など）は
+        最後に読めたレコードを返す
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = int(self.record['seq'])
+            if seq % 2 == 0:
+                copy = self.record.copy()
+                if int(self.record['seq']) == seq:
+                    self.last_good = copy
+                    return copy
+            if time.monotonic() >= deadline:
+                self.stale_reads += 1
+                return self.last_good.copy()
+            time.sleep(0)
+
+    def read_frame(self, timeout=SHARED_READ_TIMEOUT):
+        """
+        メインプロセス側。デバッグ用フレームのコピーと通し番号、そのフレーム上の顔の矩形 (n,4) を返す
+        read() と同じく書き込み中でないことを確かめて読み、読めない場合は最後に読めたものを返す
+        通し番号が前回から変わっていない場合は、コピーせずに前回のものを返す
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = int(self.record['seq'])
+            if seq % 2 == 0:
+                frame_seq = int(self.record['frame_seq'])
+                if frame_seq == self.last_frame_seq:
+                    return self.last_frame, self.last_frame_seq, self.last_boxes
+                frame = self.frame.copy()
+                boxes = self.record['boxes'][:self.record['num_boxes']].copy()
+                if int(self.record['seq']) == seq:
+                    self.last_frame, self.last_frame_seq, self.last_boxes = frame, frame_seq, boxes
+                    return frame, frame_seq, boxes
+            if time.monotonic() >= deadline:
+                self.stale_reads += 1
+                return self.last_frame, self.last_frame_seq, self.last_boxes
+            time.sleep(0)
+
+    def close(self, unlink=False):
+        # numpy のビューが共有メモリを参照したままだと close できないため先に外す
+        self.record = None
+        self.frame = None
+        self.last_frame = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _worker_main(kind, args, shm_name, frame_shape, stop_event):
+    """子プロセスの本体。Sensor / GazeTracker を動かし、状態を共有メモリに書き出す"""
+    import cv2
+    parent = mp.parent_process()
+    block = SharedBlock(shm_name, frame_shape)
+    small = np.empty(frame_shape, dtype=np.uint8) if frame_shape else None
+    boxes = np.zeros((WORKER_DEBUG_MAX_BOXES, 4), dtype=np.int32)
+    if kind == 'sensor':
+        from .sensor import Sensor
+        worker = Sensor(*args)
+    else:
+        from .gaze_tracker import GazeTracker
+        worker = GazeTracker(*args)
+    worker.start()
+
+    state = SensorState()
+    last_frame = None
+    last_gaze, gaze_seq = None, 0
+    try:
+        # 停止要求があるか、親プロセスが終了した（孤児になった）場合は終了する
+        while not stop_event.is_set() and parent.is_alive():
+            values = {'heartbeat': time.monotonic(), 'ready': int(worker.ready.is_set())}
+            faces = []
+            if kind == 'sensor':
+                worker.get_state(state)
+                values.update(
+                    state_seq=state.seq,
+                    emotion=_index(EMOTIONS, state.emotion),
+                    face_direction=_index(DIRECTIONS, state.face_direction),
+                    volume=state.volume,
+                    emotion_time=_time_or_nan(state.emotion_time),
+                    face_direction_time=_time_or_nan(state.face_direction_time),
+                    volume_time=_time_or_nan(state.volume_time))
+                # フレームと顔の矩形は、同じフレームの推論結果から取る
+                result = worker.last_result
+                frame, faces = (result[0].image, result[1]) if result is not None else (None, [])
+            else:
+                gaze = worker.get_current_gaze()
+                if gaze != last_gaze:
+                    last_gaze, gaze_seq = gaze, gaze_seq + 1
+                values.update(state_seq=gaze_seq, gaze=_index(GAZES, gaze))
+                frame = worker.last_frame
+
+            # デバッグ用フレームは作業用のバッファに縮小し、状態と同じ書き込みの中で共有メモリに写す
+            shared_frame = None
+            if small is not None and frame is not None and frame is not last_frame:
+                cv2.resize(frame, (frame_shape[1], frame_shape[0]), dst=small, interpolation=cv2.INTER_AREA)
+                scale = np.array([frame_shape[1] / frame.shape[1], frame_shape[0] / frame.shape[0]] * 2)
+                num_boxes = min(len(faces), WORKER_DEBUG_MAX_BOXES)
+                for i in range(num_boxes):
+                    boxes[i] = np.round(np.asarray(faces[i]['box'][:4]) * scale)
+                values.update(num_boxes=num_boxes, boxes=boxes)
+                shared_frame = small
+                last_frame = frame
+
+            block.write(frame=shared_frame, **values)
+            time.sleep(0.005)
+    finally:
+        worker.stop()
+        block.close()
+
+
+class _WorkerProcess:
+    """
+    Sensor / GazeTracker を別プロセスで動かすためのプロキシの共通部分
+    結果は共有メモリで受け取り、描画ループ側ではピクル化を行わない
+    """
+    kind = None
+
+    def __init__(self, *args, share_debug_frames=SHOW_DEBUG_WINDOWS):
+        self.args = args
+        self.debug_name = f"{self.__class__.__name__} {args[0]}"
+        self.frame_shape = (WORKER_DEBUG_FRAME_SIZE[1], WORKER_DEBUG_FRAME_SIZE[0], 3) if share_debug_frames else None
+        self.context = mp.get_context('spawn')
+        self.block = None
+        self.process = None
+        self.stop_event = None
+        self._reported_exit = False
+
+    def start(self):
+        self.block = SharedBlock(frame_shape=self.frame_shape)
+        self.stop_event = self.context.Event()
+        self.process = self.context.Process(
+            target=_worker_main,
+            args=(self.kind, self.args, self.block.name, self.frame_shape, self.stop_event),
+            daemon=True)
+        self.process.start()
+        atexit.register(self.stop)
+        print(f"{self.__class__.__name__} {self.args} started (pid {self.process.pid}).")
+
+    def stop(self):
+        if self.process is None:
+            return
+        self.stop_event.set()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            print(f"{self.__class__.__name__} {self.args}: ワーカーが応答しないため強制終了します。")
+            self.process.terminate()
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.block.close(unlink=True)
+        self.process = None
+        atexit.unregister(self.stop)
+        print(f"{self.__class__.__name__} {self.args} stopped.")
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def _read(self):
+        if self.process is None:
+            return None
+        if not self.process.is_alive():
+            # ワーカーが異常終了した場合は、最後に読めた値を返し続ける（書き込み途中のレコードは待たない）
+            if not self._reported_exit:
+                print(f"{self.__class__.__name__} {self.args}: ワーカーが終了しました (exit code {self.process.exitcode})。")
+                self._reported_exit = True
+            return self.block.read(timeout=0)
+        return self.block.read()
+
+    def wait_until_ready(self, timeout=None):
+        """ワーカーが最初のフレームを処理するまで待つ。タイムアウトした場合やワーカーが終了した場合は False を返す"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.process is not None and self.process.is_alive():
+            if int(self.block.read()['ready']):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return False
+
+    def get_debug_frame(self):
+        """最新のデバッグ用フレームのコピーと、その通し番号・顔の矩形を返す"""
+        if self.block is None or self.block.frame is None:
+            return None, 0, np.empty((0, 4), dtype=np.int32)
+        return self.block.read_frame()
+
+    def _debug_lines(self):
+        return []
+
+    def get_debug_info(self):
+        """デバッグ表示用の縮小済みフレームと注記（DebugCompositor から呼ばれる）"""
+        frame, seq, boxes = self.get_debug_frame()
+        if frame is None or seq == 0:
+            return None
+        return {"name": self.debug_name, "seq": seq, "frame": frame,
+                "boxes": boxes, "lines": self._debug_lines()}
+
+
+class SensorProcess(_WorkerProcess):
+    """Sensor と同じインターフェースで、センサーを別プロセスで動かすプロキシ"""
+    kind = 'sensor'
+
+    def get_state(self, out=None):
+        if out is None:
+            out = SensorState()
+        record = self._read()
+        if record is None:
+            return out
+        out.seq = int(record['state_seq'])
+        out.emotion = EMOTIONS[record['emotion']]
+        out.face_direction = DIRECTIONS[record['face_direction']]
+        out.volume = float(record['volume'])
+        for name in ('emotion_time', 'face_direction_time', 'volume_time'):
+            value = float(record[name])
+            setattr(out, name, None if np.isnan(value) else value)
+        return out
+
+    def get_all_data(self):
+        return self.get_state().as_dict()
+
+    def _debug_lines(self):
+        state = self.get_state()
+        return [f"Emotion: {state.emotion}", f"Face: {state.face_direction}", f"Volume: {state.volume:.2f}"]
+
+
+class GazeTrackerProcess(_WorkerProcess):
+    """GazeTracker と同じインターフェースで、視線追跡を別プロセスで動かすプロキシ"""
+    kind = 'gaze'
+
+    def get_current_gaze(self):
+        record = self._read()
+        if record is None:
+            return "Center"
+        return GAZES[record['gaze']]
+
+    def _debug_lines(self):
+        return [self.get_current_gaze()]
@@ -0,0 +1,87 @@
+import threading
+import time
+
+STATE_FIELDS = ('emotion', 'face_direction', 'volume')
+
+
+class SensorState:
+    """
+    センサーの状態のスナップショット
+    seq は値が変わるたびに増え、*_time は各値を最後に公開した時刻 (time.monotonic())
+    （値が変わらなくても、公開されるたびに更新される）
+    version は公開のたびに増え、読み出し中に書き換えられていないかの確認に使う
+    """
+    __slots__ = ('seq', 'version', 'emotion', 'face_direction', 'volume',
+                 'emotion_time', 'face_direction_time', 'volume_time')
+
+    def __init__(self):
+        self.seq = 0
+        self.version = 0
+        self.emotion = "Neutral"
+        self.face_direction = "center"
+        self.volume = 0
+        self.emotion_time = None
+        self.face_direction_time = None
+        self.volume_time = None
+
+    def copy_from(self, other):
+        for name in self.__slots__:
+            setattr(self, name, getattr(other, name))
+
+    def as_dict(self):
+        """従来の get_all_data() と同じ形式の辞書"""
+        return {
+            "emotion": self.emotion,
+            "face_direction": self.face_direction,
+            "volume": self.volume,
+        }
+
+
+class StateBuffer:
+    """
+    SensorState を二重バッファで公開するクラス
+    書き込み（映像スレッド・音声スレッド）は裏側のバッファを更新してから表裏を入れ替え、
+    読み出しはロックを取らず、書き込み中の値を読んだ場合（version が変わった場合）だけ読み直す
+    """
+    def __init__(self):
+        self._buffers = (SensorState(), SensorState())
+        self._front = 0
+        self._write_lock = threading.Lock()
+
+    def publish(self, **values):
+        """
+        値を更新して公開する
+        渡された値の *_time は毎回更新し、seq はいずれかの値が変わった場合だけ増やす
+        """
+        with self._write_lock:
+            front = self._buffers[self._front]
+            changed = any(getattr(front, name) != value for name, value in values.items())
+            back = self._buffers[1 - self._front]
+            back.version = -1  # 書き込み中
+            now = time.monotonic()
+            for name in STATE_FIELDS:
+                setattr(back, f"{name}_time", getattr(front, f"{name}_time"))
+                setattr(back, name, values.get(name, getattr(front, name)))
+            for name in values:
+                setattr(back, f"{name}_time", now)
+            back.seq = front.seq + 1 if changed else front.seq
+            back.version = front.version + 1
+            self._front = 1 - self._front
+
+    def read(self, out=None):
+        """最新の状態を out（省略時は新しい SensorState）に写して返す"""
+        if out is None:
+            out = SensorState()
+        while True:
+            state = self._buffers[self._front]
+            version = state.version
+            if version >= 0:
+                out.copy_from(state)
+                if state.version == version:
+                    out.version = version
+                    return out
+            time.sleep(0)  # 書き込み中の場合は書き込み側に譲って読み直す
+
+    @property
+    def seq(self):
+        return self._buffers[self._front].seq
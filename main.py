@@ -1,12 +1,19 @@
 import pygame
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from config import *
 
 # モジュールのインポート
 from input_processing.sensor import Sensor
+from input_processing.sensor_state import SensorState
+from input_processing.sensor_process import SensorProcess, GazeTrackerProcess
 from input_processing.gaze_tracker import GazeTracker
 from analysis.data_logger import DataLogger
+from analysis.perf_stats import PerfStats
+from analysis.startup_timeline import StartupTimeline
+from visuals.perf_hud import PerfHud
+from visuals.debug_compositor import DebugCompositor
 # ビジュアルエフェクト
 from visuals.confetti import Confetti
 from visuals.particle_fountain import ParticleFountain
@@ -15,36 +22,86 @@ from visuals.emotional_wave import EmotionalWave
 from visuals.gaze_particles import GazeParticles
 
 
+def timed(timeline, name, function, *args):
+    with timeline.span(name):
+        return function(*args)
+
+
+def wait_until_ready(sources, timeout):
+    """
+    全ての入力（センサー・視線追跡）が最初の結果を出すまで待ち、時間内に準備できなかったものを返す
+    待っている間もウィンドウが応答なしにならないよう、イベントを処理する
+    """
+    deadline = time.monotonic() + timeout
+    pending = list(sources)
+    while pending and time.monotonic() < deadline:
+        pygame.event.pump()
+        pending = [source for source in pending if not source.wait_until_ready(0.05)]
+    return pending
+
+
 def main():
     """メイン関数"""
-    pygame.init()
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.display.set_caption("インタラクティブ・プロジェクション")
+    timeline = StartupTimeline.shared()
+    with timeline.span("pygame.init"):
+        pygame.init()
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("インタラクティブ・プロジェクション")
     clock = pygame.time.Clock()
 
     # --- モジュールの初期化 ---
     print("各モジュールを初期化しています...")
-    # 入力処理
-    sensor1 = Sensor(camera_id=CAMERA1_ID, mic_id=MIC1_ID)
-    sensor2 = None
-    # --- 設定に応じてsensor2を初期化 ---
-    if NUM_SENSORS == 2:
-        print("センサー2を初期化します...")
-        sensor2 = Sensor(camera_id=CAMERA2_ID, mic_id=MIC2_ID)
-
-    if USE_GAZE_TRACKING:
-        gaze_tracker = GazeTracker(camera_id=GAZE_CAMERA_ID)
-
-    # ビジュアルエフェクト
-    visual_effects = []
-    if 'confetti' in ACTIVE_VISUALS: visual_effects.append(Confetti(SCREEN_WIDTH, SCREEN_HEIGHT))
-    if 'fountain' in ACTIVE_VISUALS:
-        visual_effects.append(ParticleFountain(screen, position='left'))
-        visual_effects.append(ParticleFountain(screen, position='right'))
-    if 'boids' in ACTIVE_VISUALS: visual_effects.append(Boids(screen, shape='triangle'))
-    if 'wave' in ACTIVE_VISUALS: visual_effects.append(EmotionalWave(screen))
-    if 'gaze' in ACTIVE_VISUALS and USE_GAZE_TRACKING: visual_effects.append(GazeParticles(screen))
+    # 入力処理（プロセス分離が有効な場合は、同じインターフェースのプロキシを使う）
+    SensorClass = SensorProcess if USE_PROCESS_ISOLATION else Sensor
+    GazeTrackerClass = GazeTrackerProcess if USE_PROCESS_ISOLATION else GazeTracker
+    # 同じカメラのセンサーがあれば、そのセンサーの顔ランドマークを視線追跡で再利用する（同一プロセス内のみ）
+    landmark_camera = None
+    if USE_GAZE_TRACKING and GAZE_REUSE_SENSOR_LANDMARKS and not USE_PROCESS_ISOLATION:
+        if GAZE_CAMERA_ID == CAMERA1_ID or (NUM_SENSORS == 2 and GAZE_CAMERA_ID == CAMERA2_ID):
+            landmark_camera = GAZE_CAMERA_ID
+
+    # モデルの読み込みは別スレッドで並列に行い、その間にビジュアルエフェクトを初期化する
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup") as executor:
+        sensor1_future = executor.submit(timed, timeline, "sensor1.init", SensorClass, CAMERA1_ID, MIC1_ID)
+        sensor2_future = None
+        # --- 設定に応じてsensor2を初期化 ---
+        if NUM_SENSORS == 2:
+            print("センサー2を初期化します...")
+            sensor2_future = executor.submit(timed, timeline, "sensor2.init", SensorClass, CAMERA2_ID, MIC2_ID)
+        gaze_future = None
+        if USE_GAZE_TRACKING and landmark_camera is None:
+            gaze_future = executor.submit(timed, timeline, "gaze.init", GazeTrackerClass, GAZE_CAMERA_ID)
+
+        # ビジュアルエフェクト
+        with timeline.span("visuals.init"):
+            visual_effects = []
+            if 'confetti' in ACTIVE_VISUALS: visual_effects.append(Confetti(SCREEN_WIDTH, SCREEN_HEIGHT))
+            if 'fountain' in ACTIVE_VISUALS:
+                visual_effects.append(ParticleFountain(screen, position='left'))
+                visual_effects.append(ParticleFountain(screen, position='right'))
+            if 'boids' in ACTIVE_VISUALS: visual_effects.append(Boids(screen, shape='triangle', num_boids=BOIDS_COUNT))
+            if 'wave' in ACTIVE_VISUALS: visual_effects.append(EmotionalWave(screen))
+            if 'gaze' in ACTIVE_VISUALS and USE_GAZE_TRACKING: visual_effects.append(GazeParticles(screen))
+
+        sensor1 = sensor1_future.result()
+        sensor2 = sensor2_future.result() if sensor2_future else None
+        if USE_GAZE_TRACKING:
+            if landmark_camera is not None:
+                landmark_source = sensor1 if landmark_camera == CAMERA1_ID else sensor2
+                gaze_tracker = GazeTracker(GAZE_CAMERA_ID, landmark_source=landmark_source)
+            else:
+                gaze_tracker = gaze_future.result()
     
+    # デバッグ表示（センシングのスレッドでは描画せず、メインループで頻度を抑えて描画する）
+    debug_compositor = None
+    if SHOW_DEBUG_WINDOWS:
+        debug_compositor = DebugCompositor([sensor1, sensor2, gaze_tracker if USE_GAZE_TRACKING else None])
+
+    # 処理段階ごとの処理時間の計測と、その表示
+    perf = PerfStats.shared()
+    perf_hud = PerfHud(perf)
+    perf_hud_key = pygame.key.key_code(PERF_HUD_KEY)
+
     # データロガー
     logger = DataLogger(LOG_FILE_PATH)
     logger.start_logging()
@@ -57,29 +114,50 @@ def main():
     if USE_GAZE_TRACKING: 
         gaze_tracker.start()
     
-    print(f"{CAMERA_WAIT_TIME}秒待機して、センサーの準備をします...")
-    time.sleep(CAMERA_WAIT_TIME)
+    # 固定の時間は待たず、全ての入力の最初の結果が揃った時点で開始する
+    print(f"センサーの準備を待っています（最大{STARTUP_TIMEOUT}秒）...")
+    with timeline.span("wait for first results"):
+        sources = [sensor1, sensor2, gaze_tracker if USE_GAZE_TRACKING else None]
+        not_ready = wait_until_ready([source for source in sources if source], STARTUP_TIMEOUT)
+    for source in not_ready:
+        print(f"{source.debug_name} の準備が{STARTUP_TIMEOUT}秒以内に終わりませんでした。待たずに開始します。")
+    timeline.mark("main loop start")
+    timeline.report()
     print("ログ記録と描画を開始します。")
 
     # --- メインループ ---
     running = True
     start_time = time.time()
     frame_count = 0
+    # センサーの状態は毎フレーム同じオブジェクトに読み込み、seq で更新の有無を判定する
+    state1 = SensorState()
+    state2 = SensorState() if sensor2 else state1
+    last_seqs = None
+    last_gaze_direction = None
 
     while running:
+        frame_start = time.perf_counter()
         if time.time() - start_time > DURATION: running = False
         for event in pygame.event.get():
             if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_q):
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == perf_hud_key:
+                perf_hud.toggle()
 
         # --- データ取得 ---
-        data1 = sensor1.get_all_data()
-        data2 = sensor2.get_all_data() if sensor2 else data1
+        sensor1.get_state(state1)
+        if sensor2:
+            sensor2.get_state(state2)
         gaze_direction = gaze_tracker.get_current_gaze() if USE_GAZE_TRACKING else "center"
         gaze_direction = "center"
 
         # --- データ記録 ---
-        logger.log(frame_count, data1, data1, gaze_direction)
+        # 前フレームから何も変わっていなければ記録しない（レポートでは行の継続フレーム数で集計する）
+        seqs = (state1.seq, state2.seq)
+        if seqs != last_seqs or gaze_direction != last_gaze_direction:
+            logger.log(frame_count, state1.as_dict(), state2.as_dict(), gaze_direction)
+            last_seqs, last_gaze_direction = seqs, gaze_direction
+        data1, data2 = state1, state2
 
         # --- 描画処理 ---
         screen.fill((0, 0, 0))
@@ -103,31 +181,45 @@ def main():
                 effect.update(gaze_direction)
         """
         for effect in visual_effects:
+            effect_name = type(effect).__name__
+            update_start = time.perf_counter()
             # 各エフェクトが必要とするデータを渡す
             if isinstance(effect, Confetti):
                 # センサーが1つの場合はdata1のHappyだけで判定
-                is_happy = data1['emotion'] == 'Happy'
+                is_happy = data1.emotion == 'Happy'
                 if sensor2: # センサーが2つあれば両方のHappyを考慮
-                    is_happy = is_happy and (data2['emotion'] == 'Happy')
+                    is_happy = is_happy and (data2.emotion == 'Happy')
                 effect.update(is_happy, clock.get_time() / 1000.0)
             elif isinstance(effect, ParticleFountain):
                 if effect.position == 'left':
-                    effect.update(data1['emotion'], data1['volume'])
+                    effect.update(data1.emotion, data1.volume)
                 else:
                     # sensor2がなければdata1のデータを使う
-                    effect.update(data2['emotion'], data2['volume'])
+                    effect.update(data2.emotion, data2.volume)
             elif isinstance(effect, Boids):
-                effect.update(data1['emotion']) # 例として片方の感情に連動
+                effect.update(data1.emotion) # 例として片方の感情に連動
             elif isinstance(effect, EmotionalWave):
-                effect.update(data1['emotion'], frame_count)
+                effect.update(data1.emotion, frame_count)
             elif isinstance(effect, GazeParticles):
                 effect.update(gaze_direction)
+            perf.record(f"visual.update.{effect_name}", time.perf_counter() - update_start)
 
+            with perf.measure(f"visual.draw.{effect_name}"):
+                if isinstance(effect, Confetti):
+                    effect.draw(screen) # Confetti は画面の大きさだけを持ち、描画先は呼び出し時に受け取る
+                else:
+                    effect.draw()
 
-            effect.draw()
+        if debug_compositor:
+            with perf.measure("main.debug_view"):
+                debug_compositor.update()
+                debug_compositor.draw(screen)
+        perf_hud.draw(screen)
 
-        pygame.display.flip()
+        with perf.measure("main.flip"):
+            pygame.display.flip()
         frame_count += 1
+        perf.record("main.frame", time.perf_counter() - frame_start)
         clock.tick(FPS)
 
     # --- 終了処理 ---
@@ -138,8 +230,14 @@ def main():
     
     if USE_GAZE_TRACKING: 
         gaze_tracker.stop()
+    if debug_compositor:
+        debug_compositor.close()
         
-    logger.save_report()
+    logger.save_report(last_frame=frame_count - 1)
+    if perf.enabled:
+        json_path, csv_path = perf.export(LOG_FILE_PATH)
+        print(f"処理時間の計測結果を {json_path} と {csv_path} に保存しました。")
+    timeline.export(LOG_FILE_PATH)
     pygame.quit()
     print("プログラムを終了しました。")
 
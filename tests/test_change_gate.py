@@ -0,0 +1,41 @@
+import numpy as np
+from input_processing.change_gate import ChangeGate
+
+
+def _run_frame(gate, gray, boxes, track_ids=None):
+    """InferenceEngine._classify と同じ順に check → (CNNの代わりの確率) → store を行う"""
+    probabilities, pending, context = gate.check(0, gray, boxes, track_ids)
+    probabilities[pending] = np.full(7, 1 / 7, dtype=np.float32)
+    gate.store(0, boxes, probabilities, pending, context)
+    return pending
+
+
+def test_identical_frames_without_track_ids_skip_cnn():
+    gray = np.random.default_rng(0).integers(0, 256, (240, 320), dtype=np.uint8)
+    boxes = np.array([[40, 40, 120, 140], [180, 60, 260, 160]])
+    gate = ChangeGate(threshold=0.02, refresh_interval=30)
+
+    first = _run_frame(gate, gray, boxes)
+    second = _run_frame(gate, gray, boxes)
+
+    assert first.all()
+    assert not second.any()
+    assert gate.faces_skipped > 0
+
+
+def test_tracked_frames_reuse_faces_stored_by_detection_frames():
+    gray = np.random.default_rng(1).integers(0, 256, (240, 320), dtype=np.uint8)
+    boxes = np.array([[40, 40, 120, 140], [180, 60, 260, 160]])
+    gate = ChangeGate(threshold=0.02, refresh_interval=30)
+
+    # 検出 → 追跡 → 検出 → 追跡 の順に、同じ顔が追跡IDあり・なしで交互に来る
+    detected = _run_frame(gate, gray, boxes)
+    tracked = _run_frame(gate, gray, boxes, track_ids=[7, 8])
+    detected_again = _run_frame(gate, gray, boxes)
+    tracked_again = _run_frame(gate, gray, boxes, track_ids=[7, 8])
+
+    assert detected.all()
+    assert not tracked.any()
+    assert not detected_again.any()
+    assert not tracked_again.any()
+    assert set(gate.entries[0]) == {7, 8}
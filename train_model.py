@@ -24,7 +24,7 @@ class EmotionCNN(nn.Module):
         x = self.pool(F.relu(self.conv1(x)))
         x = self.pool(F.relu(self.conv2(x)))
         x = self.pool(F.relu(self.conv3(x)))
-        x = x.view(-1, 128 * 6 * 6)
+        x = x.reshape(-1, 128 * 6 * 6) # 量子化後のテンソルは連続とは限らないため view ではなく reshape
         x = F.relu(self.fc1(x))
         x = self.dropout(x)
         x = self.fc2(x)
@@ -124,5 +124,42 @@ def train_model():
     plt.grid(True)
     plt.show()
 
+def load_calibration_batches(csv_file, num_samples=512, batch_size=64):
+    """量子化の校正・精度比較に使う FER2013 の画像を、推論時と同じ正規化で (N,1,48,48) のテンソルにする"""
+    data = pd.read_csv(csv_file, nrows=num_samples)
+    pixels = np.stack([np.fromstring(row, sep=' ') for row in data['pixels']]).astype(np.float32)
+    images = torch.from_numpy(pixels.reshape(-1, 1, 48, 48) / 127.5 - 1.0)
+    return list(torch.split(images, batch_size))
+
+def export_models(backends, csv_file='./fer2013.csv', weights_path='./assets/emotion_cnn1.pth'):
+    """学習済みの重みから、推論用のバックエンド（TorchScript・int8 量子化）を書き出す"""
+    import os
+    from input_processing.emotion_backends import load_eager_model, export_backend
+
+    model = load_eager_model(weights_path)
+    calibration_batches = None
+    if 'static_int8' in backends:
+        if os.path.exists(csv_file):
+            calibration_batches = load_calibration_batches(csv_file)
+        else:
+            print(f"{csv_file} が見つかりません。")
+
+    for backend in backends:
+        if backend == 'eager':
+            print(f"eager モデルは学習済みの重み {weights_path} をそのまま使うため、書き出しは不要です。")
+            continue
+        path = export_backend(model, backend, weights_path, calibration_batches)
+        print(f"{backend} モデルを {path} に保存しました。")
+
 if __name__ == "__main__":
-    train_model()
\ No newline at end of file
+    import argparse
+    from input_processing.emotion_backends import BACKENDS
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export', nargs='*', choices=BACKENDS,
+                        help="学習の代わりに、学習済みモデルから推論用のバックエンドを書き出す（省略時は全て）")
+    args = parser.parse_args()
+    if args.export is None:
+        train_model()
+    else:
+        export_models(args.export or [backend for backend in BACKENDS if backend != 'eager'])
\ No newline at end of file
@@ -1,127 +1,38 @@
+import cv2
 import pygame
-import math
-import random
-
-class Boid:
-    """群れを構成する個々のオブジェクト"""
-    def __init__(self, x, y, width, height, shape):
-        self.pos = pygame.Vector2(x, y)
-        angle = random.uniform(0, 2 * math.pi)
-        self.vel = pygame.Vector2(math.cos(angle), math.sin(angle))
-        self.acc = pygame.Vector2(0, 0)
-        self.width, self.height = width, height
-        self.shape = shape
-        self.max_speed = 4
-        self.max_force = 0.1
-        self.size = random.randint(15, 25)
-        self.rotation_angle = 0
-
-    def update(self):
-        self.vel += self.acc
-        self.vel.scale_to_length(min(self.vel.length(), self.max_speed))
-        self.pos += self.vel
-        self.acc *= 0
+import numpy as np
+from config import BOIDS_MAX_NEIGHBORS
 
-        # 壁でのループ
-        if self.pos.x > self.width: self.pos.x = 0
-        if self.pos.x < 0: self.pos.x = self.width
-        if self.pos.y > self.height: self.pos.y = 0
-        if self.pos.y < 0: self.pos.y = self.height
-
-    def apply_force(self, force):
-        self.acc += force
-
-    def flock(self, boids, params):
-        separation = self.separate(boids, params['repulsion_radius'])
-        alignment = self.align(boids, params['attraction_radius'])
-        cohesion = self.cohere(boids, params['attraction_radius'])
-        
-        separation *= params['repulsion_force']
-        alignment *= params['attraction_force']
-        cohesion *= params['attraction_force']
-        
-        self.apply_force(separation)
-        self.apply_force(alignment)
-        self.apply_force(cohesion)
-
-    def seek(self, target):
-        desired = target - self.pos
-        desired.scale_to_length(self.max_speed)
-        steer = desired - self.vel
-        if steer.length() > self.max_force:
-            steer.scale_to_length(self.max_force)
-        return steer
-
-    def separate(self, boids, radius):
-        steer = pygame.Vector2(0, 0)
-        total = 0
-        for other in boids:
-            d = self.pos.distance_to(other.pos)
-            if 0 < d < radius:
-                diff = self.pos - other.pos
-                diff /= d # 距離で割る
-                steer += diff
-                total += 1
-        if total > 0:
-            steer /= total
-            if steer.length() > 0:
-                steer.scale_to_length(self.max_speed)
-            steer -= self.vel
-            if steer.length() > self.max_force:
-                steer.scale_to_length(self.max_force)
-        return steer
+# 自分のセルを含む、上・同じ・下の行
+_NEIGHBOR_ROWS = np.array([-1, 0, 1], dtype=np.int32)
 
-    def align(self, boids, radius):
-        avg_vel = pygame.Vector2(0, 0)
-        total = 0
-        for other in boids:
-            d = self.pos.distance_to(other.pos)
-            if 0 < d < radius:
-                avg_vel += other.vel
-                total += 1
-        if total > 0:
-            avg_vel /= total
-            if avg_vel.length() > 0:
-                avg_vel.scale_to_length(self.max_speed)
-            steer = avg_vel - self.vel
-            if steer.length() > self.max_force:
-                steer.scale_to_length(self.max_force)
-            return steer
-        return pygame.Vector2(0, 0)
-
-    def cohere(self, boids, radius):
-        avg_pos = pygame.Vector2(0, 0)
-        total = 0
-        for other in boids:
-            d = self.pos.distance_to(other.pos)
-            if 0 < d < radius:
-                avg_pos += other.pos
-                total += 1
-        if total > 0:
-            avg_pos /= total
-            return self.seek(avg_pos)
-        return pygame.Vector2(0, 0)
-
-    def draw(self, screen, color):
-        if self.shape == 'circle':
-            pygame.draw.circle(screen, color, (int(self.pos.x), int(self.pos.y)), int(self.size / 2))
-        elif self.shape == 'triangle':
-            self.rotation_angle = self.vel.angle_to(pygame.Vector2(1, 0))
-            points = [
-                pygame.Vector2(self.size, 0).rotate(-self.rotation_angle),
-                pygame.Vector2(-self.size/2, self.size/2).rotate(-self.rotation_angle),
-                pygame.Vector2(-self.size/2, -self.size/2).rotate(-self.rotation_angle),
-            ]
-            points = [(p + self.pos) for p in points]
-            pygame.draw.polygon(screen, color, points)
 
 class Boids:
-    """感情に連動する群衆シミュレーション"""
-    def __init__(self, screen, shape='circle', num_boids=50):
+    """
+    感情に連動する群衆シミュレーション
+    個体ごとのオブジェクトは持たず、位置・速度を numpy の配列 (N,2) で保持し、
+    分離・整列・結合の3つの規則を全個体について一度に計算する
+    近傍の探索には格子を使い、周囲9セルの個体とだけ距離を比べる
+    近傍は各個体から半径内にいる個体のうち近い順に max_neighbors 体までとする（_neighbor_pairs を参照）
+    選び方は位置だけで決まるため、同じ配置からは毎フレーム同じ近傍が選ばれる
+    """
+    def __init__(self, screen, shape='circle', num_boids=50, max_neighbors=BOIDS_MAX_NEIGHBORS):
         self.screen = screen
         self.width, self.height = screen.get_size()
         self.shape = shape
-        self.boids = [Boid(random.uniform(0, self.width), random.uniform(0, self.height), self.width, self.height, self.shape) for _ in range(num_boids)]
+        self.num_boids = num_boids
+        self.max_neighbors = max_neighbors
+        self.max_speed = 4
+        self.max_force = 0.1
+
+        self.rng = np.random.default_rng()
+        self.pos = np.column_stack((self.rng.uniform(0, self.width, num_boids), self.rng.uniform(0, self.height, num_boids)))
+        angle = self.rng.uniform(0, 2 * np.pi, num_boids)
+        self.vel = np.column_stack((np.cos(angle), np.sin(angle)))
+        self.size = self.rng.integers(15, 26, num_boids).astype(np.float64)
+        self.mask = None  # 描画用の (高さ, 幅) の配列。layer はこの配列を画素として共有する
+        self.layer = None
+
         self.current_emotion = 'Neutral'
         self.target_params = None
         self.current_params = None
@@ -135,10 +46,10 @@ class Boids:
         }
         self.GROUP_PARAMS['Disgust'] = self.GROUP_PARAMS['Fear'] # DisgustはFearと同じ挙動
         self.current_params = self.GROUP_PARAMS['Neutral'].copy()
-        
+
     def lerp_color(self, c1, c2, t):
         return tuple(int(a + (b - a) * t) for a, b in zip(c1, c2))
-    
+
     def lerp(self, v1, v2, t):
         return v1 + (v2 - v1) * t
 
@@ -146,7 +57,7 @@ class Boids:
         if emotion != self.current_emotion:
             self.current_emotion = emotion
             self.target_params = self.GROUP_PARAMS.get(emotion, self.GROUP_PARAMS['Neutral'])
-        
+
         # パラメータを滑らかに変化させる
         if self.target_params:
             t = 0.05 # 補間係数
@@ -154,11 +65,172 @@ class Boids:
             for key in ['attraction_radius', 'repulsion_radius', 'attraction_force', 'repulsion_force']:
                 self.current_params[key] = self.lerp(self.current_params[key], self.target_params[key], t)
 
-        for boid in self.boids:
-            boid.flock(self.boids, self.current_params)
-            boid.update()
+        if self.num_boids > 0:
+            self._flock(self.current_params)
+            self._move()
+
+    def _grid(self, cell_size):
+        """
+        cell_size の格子に個体を振り分け、各個体のセル (cx, cy)、列数・行数と、
+        セルの順に並べた個体の添字・セルごとの開始位置・個数を返す（同じセルの個体は添字の順に並ぶ）
+        候補の組の数は個体数の数十倍になるため、添字は int32 で扱う
+        """
+        cols = int(self.width // cell_size) + 1
+        rows = int(self.height // cell_size) + 1
+        cx = np.clip((self.pos[:, 0] // cell_size).astype(np.int32), 0, cols - 1)
+        cy = np.clip((self.pos[:, 1] // cell_size).astype(np.int32), 0, rows - 1)
+        cells = cy * cols + cx
+        order = np.argsort(cells, kind='stable').astype(np.int32)
+        counts = np.bincount(cells, minlength=rows * cols).astype(np.int32)
+        return cx, cy, cols, rows, order, np.cumsum(counts, dtype=np.int32) - counts, counts
+
+    def _candidates(self, queries, cell_size):
+        """
+        個体 queries のそれぞれについて、cell_size の格子の周囲9セルにいる個体を全て候補として返す
+        周囲9セルには、各個体から cell_size 以内の個体が必ず含まれる
+        戻り値は (queries ごとの候補の数, 候補のセル順での位置, セル順に並べた個体の添字)。候補は queries の順に並ぶ
+        """
+        cx, cy, cols, rows, order, starts, counts = self._grid(cell_size)
+        # 同じ行の隣り合うセルの個体はセル順の配列でも連続するため、周囲9セルは行ごとの3つの範囲になる
+        cx, cy = cx.take(queries)[:, None], cy.take(queries)[:, None]
+        row = cy + _NEIGHBOR_ROWS
+        valid = (row >= 0) & (row < rows)
+        row = np.clip(row, 0, rows - 1) * cols
+        first = row + np.maximum(cx - 1, 0)
+        last = row + np.minimum(cx + 1, cols - 1)
+        neighbor_starts = starts.take(first).ravel()
+        neighbor_counts = np.where(valid, starts.take(last) + counts.take(last) - starts.take(first), 0).ravel()
+
+        # (個体, 行) ごとの候補の範囲を1列に展開する
+        offsets = neighbor_starts - (np.cumsum(neighbor_counts, dtype=np.int32) - neighbor_counts)
+        slots = np.arange(int(neighbor_counts.sum()), dtype=np.int32) + np.repeat(offsets, neighbor_counts)
+        return neighbor_counts.reshape(-1, 3).sum(axis=1), slots, order
+
+    def _neighbor_pairs(self, radius):
+        """
+        各個体について、距離が 0 より大きく radius 未満の個体のうち、近い順に最大 max_neighbors 体との組 (i, j) を返す
+        戻り値は (i, j, x[i] - x[j], y[i] - y[j], 距離)
+
+        最初は半径 cell_size の円に平均で max_neighbors の2倍の個体が入る細かい格子で探し、cell_size 以内に
+        max_neighbors 体以上いる個体はそこで確定する（それより近い個体は必ず周囲9セルに含まれるため、近い順の選択は厳密になる）。
+        残りの個体だけを、セルの大きさを倍にした格子で探し直し、最後は radius の格子で確定する
+        """
+        n, k = self.num_boids, self.max_neighbors
+        radius = max(radius, 1.0)
+        # 候補との距離は、位置を複素数 (float32 x 2) にまとめて求める
+        z = (self.pos[:, 0] + 1j * self.pos[:, 1]).astype(np.complex64)
+        cell_size = min(radius, np.sqrt(2 * k * self.width * self.height / (np.pi * n)))
+        queries = np.arange(n, dtype=np.int32)
+        found_i, found_j = [], []
+        while len(queries):
+            final = cell_size >= radius
+            limit = radius if final else cell_size
+            totals, slots, order = self._candidates(queries, limit)
+            d = np.repeat(z.take(queries), totals) - z.take(order).take(slots)
+            dist_sq = d.real * d.real + d.imag * d.imag
+            selected = np.flatnonzero((dist_sq > 0) & (dist_sq < limit * limit))
+            q = np.repeat(np.arange(len(queries), dtype=np.int32), totals).take(selected)
+            slots, dist_sq = slots.take(selected), dist_sq.take(selected)
+
+            # limit 以内に k 体以上いる個体（最後の格子では全ての個体）を確定する
+            if final:
+                resolved = np.ones(len(queries), dtype=bool)
+            else:
+                resolved = np.bincount(q, minlength=len(queries)) >= k
+                selected = np.flatnonzero(resolved.take(q))
+                q, slots, dist_sq = q.take(selected), slots.take(selected), dist_sq.take(selected)
+
+            # 個体ごとに距離の近い順に並べ、先頭の k 体を残す（q は昇順のため、q + 距離の割合で並べ替えればよい）
+            ranking = np.argsort(q + dist_sq / (limit * limit * 1.001))
+            q = q.take(ranking)
+            group_count = np.bincount(q, minlength=len(queries))
+            keep = np.arange(len(q)) - np.repeat(np.cumsum(group_count) - group_count, group_count) < k
+            found_i.append(queries.take(q[keep]))
+            found_j.append(order.take(slots.take(ranking[keep])))
+
+            queries = queries[~resolved]
+            cell_size *= 2
+        i, j = np.concatenate(found_i), np.concatenate(found_j)
+        dx = self.pos[:, 0].take(i) - self.pos[:, 0].take(j)
+        dy = self.pos[:, 1].take(i) - self.pos[:, 1].take(j)
+        return i, j, dx, dy, np.sqrt(dx * dx + dy * dy)
+
+    def _steer(self, desired, has_neighbors):
+        """目標の向きを最高速度に揃え、現在の速度との差を max_force 以下に抑えた操舵力（近傍がなければ0）"""
+        length = np.linalg.norm(desired, axis=1, keepdims=True)
+        desired = np.divide(desired * self.max_speed, length, out=np.zeros_like(desired), where=length > 0)
+        steer = desired - self.vel
+        steer_length = np.linalg.norm(steer, axis=1, keepdims=True)
+        steer *= np.minimum(1.0, self.max_force / np.maximum(steer_length, 1e-12))
+        steer[~has_neighbors] = 0
+        return steer
+
+    def _flock(self, params):
+        """分離・整列・結合の操舵力を全個体について1回の近傍探索で求め、速度に加える"""
+        n = self.num_boids
+        attraction_radius, repulsion_radius = params['attraction_radius'], params['repulsion_radius']
+        i, j, dx, dy, dist = self._neighbor_pairs(max(attraction_radius, repulsion_radius))
+
+        # 分離: repulsion_radius 内の個体から、距離に反比例して離れる
+        close = np.flatnonzero(dist < repulsion_radius)
+        ic, inverse = i.take(close), 1.0 / dist.take(close)
+        separation_count = np.bincount(ic, minlength=n)
+        separation_sum = np.column_stack((np.bincount(ic, dx.take(close) * inverse, minlength=n),
+                                          np.bincount(ic, dy.take(close) * inverse, minlength=n)))
+        separation = self._steer(separation_sum / np.maximum(separation_count, 1)[:, None], separation_count > 0)
+
+        # 整列・結合: attraction_radius 内の個体の平均の速度・位置に近づく
+        within = np.flatnonzero(dist < attraction_radius)
+        i, j = i.take(within), j.take(within)
+        count = np.bincount(i, minlength=n)
+        has_neighbors = count > 0
+        denominator = np.maximum(count, 1)[:, None]
+        average_vel = np.column_stack([np.bincount(i, self.vel[:, k].take(j), minlength=n) for k in range(2)]) / denominator
+        average_pos = np.column_stack([np.bincount(i, self.pos[:, k].take(j), minlength=n) for k in range(2)]) / denominator
+        alignment = self._steer(average_vel, has_neighbors)
+        cohesion = self._steer(average_pos - self.pos, has_neighbors)
+
+        self.vel += (separation * params['repulsion_force'] +
+                     (alignment + cohesion) * params['attraction_force'])
+
+    def _move(self):
+        speed = np.linalg.norm(self.vel, axis=1, keepdims=True)
+        self.vel *= np.minimum(1.0, self.max_speed / np.maximum(speed, 1e-12))
+        self.pos += self.vel
+
+        # 壁でのループ
+        x, y = self.pos[:, 0], self.pos[:, 1]
+        x[x > self.width] = 0
+        x[x < 0] = self.width
+        y[y > self.height] = 0
+        y[y < 0] = self.height
 
     def draw(self):
-        color = self.current_params['color']
-        for boid in self.boids:
-            boid.draw(self.screen, color)
\ No newline at end of file
+        # 全ての個体を1枚の8ビットの面（mask を画素として共有する）に塗り、パレットの色で1回だけ画面に重ねる
+        # 個体ごとの描画は cv2 の塗りつぶしで行う（pygame.draw より1回あたりの処理が軽い）
+        if self.layer is None:
+            self.mask = np.zeros((self.height, self.width), dtype=np.uint8)
+            self.layer = pygame.image.frombuffer(self.mask, (self.width, self.height), 'P')
+            self.layer.set_colorkey(0)
+        mask = self.mask
+        mask.fill(0)
+        if self.shape == 'circle':
+            centers = self.pos.astype(np.int32).tolist()
+            radii = (self.size / 2).astype(np.int32).tolist()
+            for center, radius in zip(centers, radii):
+                cv2.circle(mask, center, radius, 255, -1)
+        elif self.shape == 'triangle':
+            # 進行方向に頂点を向けた三角形（先端・左後ろ・右後ろ）の頂点をまとめて計算する
+            speed = np.linalg.norm(self.vel, axis=1, keepdims=True)
+            forward = np.divide(self.vel, speed, out=np.tile([1.0, 0.0], (self.num_boids, 1)), where=speed > 0)
+            side = np.column_stack((-forward[:, 1], forward[:, 0]))
+            size = self.size[:, None]
+            points = np.rint(np.stack((
+                self.pos + forward * size,
+                self.pos - forward * size / 2 + side * size / 2,
+                self.pos - forward * size / 2 - side * size / 2,
+            ), axis=1)).astype(np.int32)
+            for triangle in list(points):
+                cv2.fillConvexPoly(mask, triangle, 255)
+        self.layer.set_palette_at(255, self.current_params['color'])
+        self.screen.blit(self.layer, (0, 0))
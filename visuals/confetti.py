@@ -1,47 +1,47 @@
-import pygame
-import random
+import numpy as np
+from config import CONFETTI_PETAL_COUNT
+from .particle_pool import ParticlePool
+from .sprite_cache import SpriteCache
 
-class Petal:
-    """
-    一つ一つの紙吹雪（花びら）を管理するクラス
-    """
-    def __init__(self, width, height):
-        self.width = width
-        self.height = height
-        self.x = random.randint(0, width)
-        self.y = random.randint(-height, 0)
-        self.size = random.randint(2, 5)
-        self.color = (255, 182, 193)  # 薄いピンク
-        self.speed_x = random.uniform(-1, 1)
-        self.speed_y = random.uniform(2, 4)
-
-    def update(self):
-        self.x += self.speed_x
-        self.y += self.speed_y
-        if self.y > self.height or self.x < 0 or self.x > self.width:
-            self.x = random.randint(0, self.width)
-            self.y = random.randint(-self.height // 2, 0)
-
-    def draw(self, screen):
-        pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.size)
+PETAL_COLOR = (255, 182, 193)  # 薄いピンク
+PETAL_SIZES = (2, 5)  # 花びらの半径の範囲（両端を含む）
 
 
 class Confetti:
     """
     紙吹雪エフェクト全体を管理するクラス
     Happy状態が続くと表示される
+    花びらは容量 num_petals の ParticlePool に numpy 配列で保持し、表示のたびに同じ配列を使い回す
+    表示終了後は、花びらごとに生成時に決めた消える順番 (fade) と経過の割合を比べ、薄くしながら順に消していく
     """
-    def __init__(self, screen_width, screen_height, num_petals=100):
+    def __init__(self, screen_width, screen_height, num_petals=CONFETTI_PETAL_COUNT):
         self.screen_width = screen_width
         self.screen_height = screen_height
         self.num_petals = num_petals
-        self.petals = []
-        
+        self.rng = np.random.default_rng()
+        self.petals = ParticlePool(num_petals, {
+            'x': np.float32, 'y': np.float32, 'vx': np.float32, 'vy': np.float32,
+            'size': np.int16, 'fade': np.float32})
+        self.sprites = SpriteCache.shared()
+
         self.happy_timer = 0
         self.time_threshold = 1.0  # Happyが1秒続いたら表示
         self.display_duration = 3.0  # 3秒間表示
         self.display_timer = 0
         self.is_displaying = False
+        self.fade_duration = 15.0  # 表示終了後、全ての花びらが消えるまでの時間
+        self.fade_timer = 0
+
+    def _spawn(self):
+        """花びらを num_petals 枚、画面の上側に生成し直す"""
+        n = self.num_petals
+        self.petals.clear()
+        self.petals.spawn(n, x=self.rng.integers(0, self.screen_width + 1, n),
+                          y=self.rng.integers(-self.screen_height, 1, n),
+                          vx=self.rng.uniform(-1, 1, n), vy=self.rng.uniform(2, 4, n),
+                          size=self.rng.integers(PETAL_SIZES[0], PETAL_SIZES[1] + 1, n),
+                          fade=self.rng.uniform(0, 1, n))
+        self.fade_timer = 0
 
     def update(self, is_happy, delta_time):
         """
@@ -54,7 +54,7 @@ class Confetti:
             if self.happy_timer >= self.time_threshold and not self.is_displaying:
                 self.is_displaying = True
                 self.display_timer = self.display_duration
-                self.petals = [Petal(self.screen_width, self.screen_height) for _ in range(self.num_petals)]
+                self._spawn()
         else:
             self.happy_timer = 0
 
@@ -62,15 +62,31 @@ class Confetti:
             self.display_timer -= delta_time
             if self.display_timer <= 0:
                 self.is_displaying = False
-        
-        if not self.is_displaying and len(self.petals) > 0:
-             # 表示終了後、徐々に消えていく
-            if random.random() < 0.1:
-                self.petals.pop()
-                
-        for petal in self.petals:
-            petal.update()
-            
+
+        petals = self.petals
+        if not self.is_displaying and len(petals) > 0:
+            # 表示終了後、消える順番が経過の割合に達した花びらから消えていく
+            self.fade_timer += delta_time
+            petals.remove(petals['fade'] <= self.fade_timer / self.fade_duration)
+
+        petals['x'] += petals['vx']
+        petals['y'] += petals['vy']
+        # 画面の下や左右に出た花びらは、画面の上側に戻す
+        out = np.flatnonzero((petals['y'] > self.screen_height) | (petals['x'] < 0) | (petals['x'] > self.screen_width))
+        if len(out):
+            petals['x'][out] = self.rng.integers(0, self.screen_width + 1, len(out))
+            petals['y'][out] = self.rng.integers(-self.screen_height // 2, 1, len(out))
+
     def draw(self, screen):
-        for petal in self.petals:
-            petal.draw(screen)
\ No newline at end of file
+        petals = self.petals
+        # 画面より上にあってまだ見えない花びらは描画しない
+        visible = np.flatnonzero(petals['y'] + petals['size'] >= 0)
+        if len(visible) == 0:
+            return
+        # 消える直前の花びらは薄くする
+        alphas = 255
+        if not self.is_displaying:
+            remaining = petals['fade'][visible] - self.fade_timer / self.fade_duration
+            alphas = np.clip(remaining * 10, 0, 1) * 255
+        self.sprites.draw_circles(screen, petals['x'][visible].astype(np.int32), petals['y'][visible].astype(np.int32),
+                                  petals['size'][visible], PETAL_COLOR, alphas)
@@ -0,0 +1,91 @@
+import cv2
+import pygame
+import time
+from config import DEBUG_VIEW_MODE, DEBUG_VIEW_FPS, DEBUG_TILE_SIZE
+
+
+class DebugCompositor:
+    """
+    センサー・視線追跡の最新の結果からデバッグ表示を作るクラス（メインスレッドで使う）
+    センシングのスレッドでは描画を行わず、ここで一定の頻度 (fps) 以下に抑えて描画する
+    mode: 'window' の場合はOpenCVのウィンドウ、'tile' の場合はPygameの画面の右下に縮小して表示する
+    sources には get_debug_info() を持つ Sensor / GazeTracker（またはそのプロセス版）を渡す
+    """
+    def __init__(self, sources, mode=DEBUG_VIEW_MODE, fps=DEBUG_VIEW_FPS, tile_size=DEBUG_TILE_SIZE):
+        self.sources = [source for source in sources if source is not None]
+        self.mode = mode
+        self.interval = 1.0 / fps
+        self.tile_size = tile_size
+        self.last_render_time = 0.0
+        self.last_seqs = {}
+        self.tiles = {}  # source の番号 -> pygame.Surface
+        self.window_names = set()
+
+    def update(self):
+        """前回の描画から interval 以上経っていれば、更新のあったソースだけ描き直す"""
+        now = time.monotonic()
+        if now - self.last_render_time < self.interval:
+            return
+        self.last_render_time = now
+
+        for i, source in enumerate(self.sources):
+            info = source.get_debug_info()
+            if info is None or info["seq"] == self.last_seqs.get(i):
+                continue
+            self.last_seqs[i] = info["seq"]
+            if self.mode == 'tile':
+                image = self._render(info, self.tile_size)
+                rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                self.tiles[i] = pygame.image.frombuffer(rgb.tobytes(), (rgb.shape[1], rgb.shape[0]), 'RGB')
+            else:
+                image = self._render(info)
+                cv2.imshow(info["name"], image)
+                self.window_names.add(info["name"])
+
+        if self.window_names:
+            cv2.waitKey(1)
+
+    def _render(self, info, size=None):
+        """フレームのコピー（size 指定時は縮小したもの）に矩形・点・テキストを描く"""
+        frame = info["frame"]
+        scale = 1.0
+        if size is not None:
+            scale = min(size[0] / frame.shape[1], size[1] / frame.shape[0])
+            image = cv2.resize(frame, (int(frame.shape[1] * scale), int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        else:
+            # フレームは他の利用者と共有しているため、描画はコピーに対して行う
+            image = frame.copy()
+
+        for x1, y1, x2, y2 in info["boxes"]:
+            cv2.rectangle(image, (int(x1 * scale), int(y1 * scale)), (int(x2 * scale), int(y2 * scale)), (0, 255, 0), 2)
+        points = info.get("points")
+        if points is not None:
+            for x, y in points:
+                cv2.circle(image, (int(x * scale), int(y * scale)), 1, (0, 255, 255), -1)
+
+        font_scale = 0.7 if size is None else 0.45
+        line_height = int(30 * font_scale / 0.7)
+        for j, text in enumerate(info["lines"]):
+            cv2.putText(image, text, (10, line_height * (j + 1)), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), 2 if size is None else 1)
+        return image
+
+    def draw(self, screen):
+        """'tile' モードの場合、最後に作った縮小表示を画面の右下に並べて描く"""
+        if self.mode != 'tile':
+            return
+        margin = 8
+        x = screen.get_width() - margin
+        for i in sorted(self.tiles):
+            tile = self.tiles[i]
+            x -= tile.get_width()
+            screen.blit(tile, (x, screen.get_height() - tile.get_height() - margin))
+            x -= margin
+
+    def close(self):
+        for name in self.window_names:
+            try:
+                cv2.destroyWindow(name)
+            except cv2.error:
+                pass
+        self.window_names.clear()
+        self.tiles.clear()
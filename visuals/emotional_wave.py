@@ -1,15 +1,25 @@
 import pygame
 import math
 import numpy as np
-from perlin_noise import PerlinNoise
 import time
+from config import WAVE_LINES, WAVE_X_STEP, WAVE_NOISE_TEXTURE
+from .noise import GradientNoise, NoiseTexture
 
 class EmotionalWave:
-    """感情に応じて変化する波形を生成・描画するクラス"""
-    def __init__(self, screen):
+    """
+    感情に応じて変化する波形を生成・描画するクラス
+    全ての線のノイズは、(線の数, x の標本数) の座標の格子として GradientNoise でまとめて計算する
+    use_texture を指定した場合は、前もって計算したノイズの表 (NoiseTexture) から補間して引く
+    """
+    def __init__(self, screen, num_lines=WAVE_LINES, x_step=WAVE_X_STEP, use_texture=WAVE_NOISE_TEXTURE):
         self.screen = screen
         self.width, self.height = screen.get_size()
-        self.noise_gen = PerlinNoise()
+        self.num_lines = num_lines
+        self.x_vals = np.arange(0, self.width, x_step)
+        self.noise_gen = GradientNoise()
+        if use_texture:
+            self.noise_gen = NoiseTexture(self.noise_gen)
+        self.points_list = []
         self.t = 150  # 波の高さの基本係数
 
         self.emotion_color_map = {
@@ -60,21 +70,18 @@ class EmotionalWave:
             else:
                 self.current_params[key] = self._lerp(self.current_params[key], self.target_params[key], t)
 
-        # 描画用データの生成
-        self.points_list = []
+        # 描画用データの生成（全ての線を1回で計算する）
         phase_offset = (frame_count * self.current_params['wave_speed']) % (2 * math.pi)
-        x_vals = np.arange(0, self.width, 3)
+        x_vals = self.x_vals
+        seeds = np.arange(self.num_lines) * 0.1 - frame_count * self.current_params['speed'] * 0.02
+        noise = self.noise_gen(seeds[:, None] + x_vals * 0.01)
+        wave = np.sin((x_vals * self.current_params['period'] * (math.pi / 180)) + phase_offset)
+
+        y_vals = (noise * self.t * self.current_params['noise_scale'] - self.t / 2 +
+                  self.height / 4 * self.current_params['amplitude'] * wave + self.height / 2)
 
-        for j in range(25): # 25本の線
-            seed = j * 0.1 - frame_count * self.current_params['speed'] * 0.02
-            noise_input = (seed + x_vals * 0.01).tolist()
-            noise = np.array(self.noise_gen(noise_input))
-            wave = np.sin((x_vals * self.current_params['period'] * (math.pi / 180)) + phase_offset)
-            
-            y_vals = (noise * self.t * self.current_params['noise_scale'] - self.t / 2 +
-                      self.height / 4 * self.current_params['amplitude'] * wave + self.height / 2)
-            
-            self.points_list.append(np.column_stack((x_vals, y_vals)).astype(int))
+        # (線の数, x の標本数, 2) の点の配列。1行が1本の線になる
+        self.points_list = np.stack(np.broadcast_arrays(x_vals, y_vals), axis=-1).astype(int)
 
     def draw(self):
         """波形を描画"""
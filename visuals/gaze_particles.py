@@ -1,37 +1,43 @@
+import cv2
+import numpy as np
 import pygame
-import random
+from config import GAZE_PARTICLE_COUNT
 
-class Particle:
-    """パーティクル一つ一つを管理するクラス"""
-    def __init__(self, x, y):
-        self.pos = pygame.Vector2(x, y)
-        self.vel = pygame.Vector2(random.uniform(-2, 2), random.uniform(-2, 2))
-        self.gravity = pygame.Vector2(0, 0.09)
-        self.lifespan = random.randint(50, 155)
-        self.size = random.randint(3, 5)
+PARTICLE_COLOR = (255, 255, 245) # 少し黄色がかった白
+PARTICLE_SIZES = (3, 4, 5) # パーティクルの半径の候補
+GRAVITY = 0.09
 
-    def update(self):
-        self.lifespan -= 1
-        self.vel += self.gravity
-        self.pos += self.vel
 
-    def is_dead(self):
-        return self.lifespan <= 0
+def _disk(radius):
+    """半径 radius の円を1とした (2*radius+1) 四方のカーネル"""
+    dy, dx = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+    return (dx * dx + dy * dy <= radius * radius).astype(np.float32)
 
-    def draw(self, screen):
-        if self.lifespan > 0:
-            alpha = max(10, self.lifespan)
-            color = (255, 255, 245, alpha) # 少し黄色がかった白
-            temp_surface = pygame.Surface((self.size * 2, self.size * 2), pygame.SRCALPHA)
-            pygame.draw.circle(temp_surface, color, (self.size, self.size), self.size)
-            screen.blit(temp_surface, self.pos - pygame.Vector2(self.size, self.size))
 
 class ParticleSystem:
-    """パーティクル群全体を管理するクラス"""
+    """
+    パーティクル群全体を管理するクラス
+    位置・速度・寿命・大きさを numpy の配列で保持し、寿命が尽きたものはマスクでまとめてエミッターの位置から再生成する
+    描画では円を1つずつ描かず、不透明度を重ね合わせた画像を作って1回で合成する（_splat を参照）
+    """
     def __init__(self, num_particles):
-        self.particles = []
         self.num_particles = num_particles
         self.emitter_pos = pygame.Vector2(0, 0)
+        self.rng = np.random.default_rng()
+        self.x = np.zeros(num_particles, dtype=np.float32)
+        self.y = np.zeros(num_particles, dtype=np.float32)
+        self.vx = np.zeros(num_particles, dtype=np.float32)
+        self.vy = np.zeros(num_particles, dtype=np.float32)
+        self.lifespan = np.zeros(num_particles, dtype=np.int32)  # 0 以下は未生成または消滅
+        self.size = np.zeros(num_particles, dtype=np.int32)
+
+        self.kernels = [_disk(size) for size in PARTICLE_SIZES]
+        # 半径 -> PARTICLE_SIZES の中の番号
+        self.size_slots = np.zeros(max(PARTICLE_SIZES) + 1, dtype=np.int64)
+        self.size_slots[list(PARTICLE_SIZES)] = np.arange(len(PARTICLE_SIZES))
+        # PARTICLE_COLOR で塗った画面大の面。不透明度のチャンネルだけを毎フレーム書き換えて画面に重ねる
+        self.overlay = None
+        self.overlay_rect = None  # 前のフレームで不透明度を書き込んだ範囲
 
     def set_emitter(self, x, y):
         # 目標位置に滑らかに移動
@@ -39,24 +45,76 @@ class ParticleSystem:
         self.emitter_pos.y += (y - self.emitter_pos.y) * 0.1
 
     def update(self):
-        # 死んだパーティクルを新しい位置で再生成
-        for i in range(len(self.particles)):
-            if self.particles[i].is_dead():
-                self.particles[i] = Particle(self.emitter_pos.x, self.emitter_pos.y)
-        # 不足分を追加
-        while len(self.particles) < self.num_particles:
-            self.particles.append(Particle(self.emitter_pos.x, self.emitter_pos.y))
-        
-        for p in self.particles:
-            p.update()
-    
+        # 死んだパーティクル（最初は全て）を新しい位置で再生成
+        dead = self.lifespan <= 0
+        n = int(dead.sum())
+        if n:
+            self.x[dead] = self.emitter_pos.x
+            self.y[dead] = self.emitter_pos.y
+            self.vx[dead] = self.rng.uniform(-2, 2, n)
+            self.vy[dead] = self.rng.uniform(-2, 2, n)
+            self.lifespan[dead] = self.rng.integers(50, 156, n)
+            self.size[dead] = self.rng.choice(PARTICLE_SIZES, n)
+
+        self.lifespan -= 1
+        self.vy += GRAVITY
+        self.x += self.vx
+        self.y += self.vy
+
     def draw(self, screen):
-        for p in self.particles:
-            p.draw(screen)
+        # 消滅したパーティクル（不透明度0）も含めて渡し、配列の抜き出しを省く
+        alive = self.lifespan > 0
+        if alive.any():
+            self._splat(screen, np.where(alive, np.maximum(10, self.lifespan), 0))
+
+    def _splat(self, screen, alpha):
+        """
+        不透明度 alpha (0-255) の円をまとめて画面に重ねる
+        同じ色の半透明の円を重ねた結果は、各円の透過率 (1 - alpha) の積だけで決まるため、
+        -log(透過率) を粒子の中心の画素に足し合わせ、大きさごとの円のカーネルで広げたものから不透明度を求め、
+        overlay の不透明度のチャンネル（surfarray のビュー）に直接書き込んでから1回の blit で合成する
+        """
+        width, height = screen.get_size()
+        if self.overlay is None or self.overlay.get_size() != (width, height):
+            self.overlay = pygame.Surface((width, height), pygame.SRCALPHA)
+            self.overlay.fill((*PARTICLE_COLOR, 0))
+            self.overlay_rect = None
+
+        # 粒子のある範囲（画面内）だけを処理する
+        radius = max(PARTICLE_SIZES)
+        ix, iy = np.floor(self.x).astype(np.int32), np.floor(self.y).astype(np.int32)
+        x0, x1 = max(int(ix.min()) - radius, 0), min(int(ix.max()) + radius + 1, width)
+        y0, y1 = max(int(iy.min()) - radius, 0), min(int(iy.max()) + radius + 1, height)
+        alphas = pygame.surfarray.pixels_alpha(self.overlay)
+        if self.overlay_rect is not None:
+            alphas[self.overlay_rect] = 0
+            self.overlay_rect = None
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        # 範囲の外側に radius の余白を付ける。余白より外にある粒子は重みを0にする（surfarray は (x, y) の順）
+        w, h = x1 - x0 + 2 * radius, y1 - y0 + 2 * radius
+        ix -= x0 - radius
+        iy -= y0 - radius
+        inside = (ix >= 0) & (ix < w) & (iy >= 0) & (iy < h)
+        weight = -np.log1p(-alpha.astype(np.float32) / 255) * inside
+        # 大きさごとに別の面に足し合わせる
+        index = (self.size_slots[self.size] * w + np.clip(ix, 0, w - 1)) * h + np.clip(iy, 0, h - 1)
+        centers = np.bincount(index, weight, minlength=len(PARTICLE_SIZES) * w * h).astype(np.float32)
+        centers = centers.reshape(len(PARTICLE_SIZES), w, h)
+        depth = np.zeros((w, h), dtype=np.float32)
+        for plane, kernel in zip(centers, self.kernels):
+            depth += cv2.filter2D(plane, -1, kernel, borderType=cv2.BORDER_CONSTANT)
+
+        # 不透明度 = 1 - 透過率の積 = 1 - exp(-Σ)
+        self.overlay_rect = (slice(x0, x1), slice(y0, y1))
+        alphas[self.overlay_rect] = -np.expm1(-depth[radius:w - radius, radius:h - radius]) * 255 + 0.5
+        del alphas  # overlay のロックを解除する
+        screen.blit(self.overlay, (x0, y0), area=pygame.Rect(x0, y0, x1 - x0, y1 - y0))
 
 class GazeParticles:
     """視線に追従するパーティクルエフェクト"""
-    def __init__(self, screen, num_particles=3000):
+    def __init__(self, screen, num_particles=GAZE_PARTICLE_COUNT):
         self.screen = screen
         self.width, self.height = screen.get_size()
         self.center_x, self.center_y = self.width // 2, self.height // 2
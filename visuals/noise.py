@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def _fade(t):
+    """Perlin の改良版の補間曲線 6t^5 - 15t^4 + 10t^3"""
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+class GradientNoise:
+    """
+    numpy で実装した1次元の勾配ノイズ（Perlin ノイズ）
+    格子点の勾配は、あらかじめ作った順列の表で引くため、任意の形の座標の配列を1回の呼び出しでまとめて評価できる
+    （(線の数, 標本の数) の格子なども、そのまま渡せばよい）
+    ノイズは period ごとに繰り返し、値はおおよそ -0.5 から 0.5 の範囲になる
+    """
+    def __init__(self, seed=None, period=256):
+        if period & (period - 1):
+            raise ValueError("period expected to be a power of two")
+        rng = np.random.default_rng(seed)
+        self.period = period
+        self.mask = period - 1
+        # 順列を2周分並べ、perm[i + 1] が範囲外を参照しないようにする
+        self.perm = np.tile(rng.permutation(period), 2)
+        # 格子点ごとの勾配（-1 から 1 の傾き）
+        self.gradients = rng.uniform(-1, 1, period)
+
+    def noise1(self, x):
+        """座標 x（スカラーまたは任意の形の配列）の1次元ノイズ"""
+        x = np.asarray(x, dtype=np.float64)
+        cell = np.floor(x)
+        f = x - cell
+        i = cell.astype(np.int64) & self.mask
+        g0 = self.gradients[self.perm[i]]
+        g1 = self.gradients[self.perm[i + 1]]
+        return g0 * f + _fade(f) * (g1 * (f - 1) - g0 * f)
+
+    def __call__(self, x):
+        return self.noise1(x)
+
+
+class NoiseTexture:
+    """
+    GradientNoise の1周期分を resolution 刻みで前もって計算した表
+    座標をずらしながら（スクロールさせながら）引く用途で、格子点の計算の代わりに表の線形補間だけで値を返す
+    """
+    def __init__(self, noise, resolution=100):
+        self.resolution = resolution
+        self.size = noise.period * resolution
+        self.table = noise.noise1(np.arange(self.size + 1) / resolution)
+        self.table[-1] = self.table[0]  # 周期の端で補間がつながるようにする
+
+    def sample(self, x):
+        """座標 x（スカラーまたは任意の形の配列）のノイズを表から補間して返す"""
+        position = np.asarray(x, dtype=np.float64) * self.resolution
+        cell = np.floor(position)
+        f = position - cell
+        i = cell.astype(np.int64) % self.size
+        return self.table[i] + f * (self.table[i + 1] - self.table[i])
+
+    def __call__(self, x):
+        return self.sample(x)
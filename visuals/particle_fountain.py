@@ -1,63 +1,31 @@
-import pygame
 import random
-import math
 import numpy as np
+from config import FOUNTAIN_BALL_CAPACITY, FOUNTAIN_PARTICLE_CAPACITY
+from .particle_pool import ParticlePool
+from .sprite_cache import SpriteCache
 
-class Particle:
-    """消滅時のパーティクル"""
-    def __init__(self, x, y, speed, angle, color):
-        self.x = x
-        self.y = y
-        self.dx = math.cos(angle) * speed
-        self.dy = math.sin(angle) * speed
-        self.color = color
-        self.lifetime = 30
-
-    def update(self):
-        self.x += self.dx
-        self.y += self.dy
-        self.lifetime -= 1
-
-    def draw(self, screen):
-        if self.lifetime > 0:
-            alpha = max(0, int(255 * (self.lifetime / 30)))
-            temp_surface = pygame.Surface((5, 5), pygame.SRCALPHA)
-            pygame.draw.circle(temp_surface, (*self.color, alpha), (2, 2), 2)
-            screen.blit(temp_surface, (self.x, self.y))
-
-    def is_dead(self):
-        return self.lifetime <= 0
-
-class Ball:
-    """噴出するボール"""
-    def __init__(self, x, y, angle, emotion_params, speed):
-        self.x, self.y = x, y
-        self.params = emotion_params
-        self.speed = self.params['speed'] * (speed / 10.0) # 初期速度を反映
-        self.speed_x = self.speed * math.cos(angle)
-        self.speed_y = self.speed * math.sin(angle)
-        self.lifetime = random.randint(50, 150)
-        
-    def update(self):
-        self.speed_y += self.params['gravity']
-        self.x += self.speed_x
-        self.y += self.speed_y
-        self.lifetime -= 1
-
-    def draw(self, screen):
-        pygame.draw.circle(screen, self.params['color'], (int(self.x), int(self.y)), int(self.params['size']))
-
-    def is_dead(self):
-        return self.lifetime <= 0
+PARTICLE_LIFETIME = 30 # ボールが消滅した時に飛び散るパーティクルの寿命 (フレーム)
+PARTICLES_PER_BURST = 10
 
 class ParticleFountain:
     """
     音量と感情に連動してパーティクルが噴出するエフェクト
+    噴出するボールと、ボールの消滅時に飛び散るパーティクルは、それぞれ固定容量のプールに numpy 配列で保持し、
+    移動・消滅・パーティクルの生成をまとめて計算する
     """
-    def __init__(self, screen, position='left'):
+    def __init__(self, screen, position='left', ball_capacity=FOUNTAIN_BALL_CAPACITY,
+                 particle_capacity=FOUNTAIN_PARTICLE_CAPACITY):
         self.screen = screen
         self.position = position
-        self.items = [] # ボールとパーティクルを格納
+        self.rng = np.random.default_rng()
+        # ボールは生成時の感情の色・大きさ・重力を保持する
+        self.balls = ParticlePool(ball_capacity, {
+            'x': np.float32, 'y': np.float32, 'vx': np.float32, 'vy': np.float32, 'lifetime': np.int16,
+            'gravity': np.float32, 'size': np.int16, 'color': (np.uint8, 3)})
+        self.particles = ParticlePool(particle_capacity, {
+            'x': np.float32, 'y': np.float32, 'dx': np.float32, 'dy': np.float32, 'lifetime': np.int16,
+            'color': (np.uint8, 3)})
+        self.sprites = SpriteCache.shared()
         self.current_emotion = 'Neutral'
         self.base_size = random.randint(7, 12)
         
@@ -83,25 +51,53 @@ class ParticleFountain:
         self.current_emotion = emotion
         self._create_balls(volume)
 
-        for item in self.items[:]:
-            item.update()
-            if item.is_dead():
-                if isinstance(item, Ball): # ボールが死んだらパーティクル生成
-                    for _ in range(10):
-                        p_speed = random.uniform(2, 5)
-                        p_angle = random.uniform(0, 2 * np.pi)
-                        self.items.append(Particle(item.x, item.y, p_speed, p_angle, item.params['color']))
-                self.items.remove(item)
+        # パーティクル（前のフレームまでに生成されたもの）の移動と消滅
+        particles = self.particles
+        particles['x'] += particles['dx']
+        particles['y'] += particles['dy']
+        particles['lifetime'] -= 1
+        particles.remove(particles['lifetime'] <= 0)
+
+        # ボールの移動と消滅。消滅したボールの位置からパーティクルを飛び散らせる
+        balls = self.balls
+        balls['vy'] += balls['gravity']
+        balls['x'] += balls['vx']
+        balls['y'] += balls['vy']
+        balls['lifetime'] -= 1
+        dead = balls['lifetime'] <= 0
+        if dead.any():
+            self._burst(balls['x'][dead], balls['y'][dead], balls['color'][dead])
+            balls.remove(dead)
+
+    def _burst(self, x, y, colors):
+        n = len(x) * PARTICLES_PER_BURST
+        speed = self.rng.uniform(2, 5, n)
+        angle = self.rng.uniform(0, 2 * np.pi, n)
+        self.particles.spawn(n, x=np.repeat(x, PARTICLES_PER_BURST), y=np.repeat(y, PARTICLES_PER_BURST),
+                             dx=np.cos(angle) * speed, dy=np.sin(angle) * speed, lifetime=PARTICLE_LIFETIME,
+                             color=np.repeat(colors, PARTICLES_PER_BURST, axis=0))
 
     def draw(self):
-        for item in self.items:
-            item.draw(self.screen)
+        # ボールとパーティクルは、共有のキャッシュのスプライトでまとめて描画する
+        balls, particles = self.balls, self.particles
+        alphas = np.maximum(0, 255 * particles['lifetime'].astype(np.int32) // PARTICLE_LIFETIME)
+        # パーティクルは (x, y) を左上とする 5x5 の円（半径2）
+        self.sprites.draw_circles(
+            self.screen,
+            np.concatenate((balls['x'], particles['x'] + 2)),
+            np.concatenate((balls['y'], particles['y'] + 2)),
+            np.concatenate((balls['size'], np.full(len(particles), 2, dtype=np.int16))),
+            np.concatenate((balls['color'], particles['color'])),
+            np.concatenate((np.full(len(balls), 255), alphas)))
 
     def _create_balls(self, volume):
         num_balls = int(volume / 5) # 音量に応じて生成数を調整
         if num_balls > 0:
             emotion_params = self.EMOTION_PARAMS.get(self.current_emotion, self.EMOTION_PARAMS['Neutral'])
-            for _ in range(num_balls):
-                angle = random.uniform(*self.angle_range)
-                speed = random.uniform(5, 10) + volume / 10
-                self.items.append(Ball(self.start_x, self.start_y, angle, emotion_params, speed))
\ No newline at end of file
+            angle = self.rng.uniform(*self.angle_range, num_balls)
+            speed = self.rng.uniform(5, 10, num_balls) + volume / 10
+            speed = emotion_params['speed'] * (speed / 10.0) # 初期速度を反映
+            self.balls.spawn(num_balls, x=self.start_x, y=self.start_y,
+                             vx=speed * np.cos(angle), vy=speed * np.sin(angle),
+                             lifetime=self.rng.integers(50, 151, num_balls), gravity=emotion_params['gravity'],
+                             size=int(emotion_params['size']), color=emotion_params['color'])
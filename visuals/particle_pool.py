@@ -0,0 +1,70 @@
+import numpy as np
+
+
+class ParticlePool:
+    """
+    粒子の属性を、容量を固定した numpy 配列（属性ごとに1本）で保持するクラス
+    生きている粒子は常に配列の先頭 count 個に詰めて置き、消滅した粒子の位置には末尾の粒子を移して埋める
+    （リストからの remove のように要素をずらさないため、消滅の処理は消滅した数に比例する）
+
+        pool = ParticlePool(1000, {'x': np.float32, 'color': (np.uint8, 3)})
+        pool.spawn(10, x=xs, color=(255, 0, 0))
+        pool['x'] += 1.0
+        pool.remove(pool['x'] > 100)
+    """
+    def __init__(self, capacity, fields):
+        self.capacity = capacity
+        self.count = 0
+        self.arrays = {}
+        for name, spec in fields.items():
+            dtype, shape = (spec if isinstance(spec, tuple) else (spec, ()))
+            shape = shape if isinstance(shape, tuple) else (shape,)
+            self.arrays[name] = np.zeros((capacity,) + shape, dtype=dtype)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, name):
+        """生きている粒子の属性のビュー（書き換えると粒子に反映される）"""
+        return self.arrays[name][:self.count]
+
+    def __setitem__(self, name, value):
+        array = self.arrays[name]
+        # pool['x'] += dx のような加算代入は、取り出したビューがそのまま戻ってくるため書き戻さない
+        if isinstance(value, np.ndarray) and value.base is array and len(value) == self.count:
+            return
+        array[:self.count] = value
+
+    def spawn(self, n, **values):
+        """
+        n 個の粒子を追加し、追加できた数を返す（容量を超えた分は追加しない）
+        values には属性ごとの値（スカラー、または n 個分の配列）を渡す。渡さなかった属性は0になる
+        """
+        n = min(int(n), self.capacity - self.count)
+        if n <= 0:
+            return 0
+        new = slice(self.count, self.count + n)
+        for name, array in self.arrays.items():
+            value = values.get(name, 0)
+            if not np.isscalar(value) and len(np.shape(value)) > array.ndim - 1:
+                value = np.asarray(value)[:n]
+            array[new] = value
+        self.count += n
+        return n
+
+    def remove(self, dead):
+        """dead（生きている粒子と同じ長さの真偽値の配列）が True の粒子を消す"""
+        dead = np.asarray(dead, dtype=bool)
+        alive_count = self.count - int(dead.sum())
+        if alive_count == self.count:
+            return
+        # 残る範囲 [0, alive_count) にある消滅した位置を、範囲外の生きている粒子で埋める
+        holes = np.flatnonzero(dead[:alive_count])
+        movers = alive_count + np.flatnonzero(~dead[alive_count:])
+        if len(holes):
+            for array in self.arrays.values():
+                array[holes] = array[movers]
+        self.count = alive_count
+
+    def clear(self):
+        self.count = 0
@@ -0,0 +1,46 @@
+import pygame
+import time
+
+
+class PerfHud:
+    """
+    処理段階ごとの処理時間 (p50/p95/p99) を画面の左上に表示するクラス
+    文字の描画は重いため、表示内容は refresh 秒ごとにだけ作り直す
+    """
+    def __init__(self, stats, refresh=0.5, max_rows=24):
+        self.stats = stats
+        self.refresh = refresh
+        self.max_rows = max_rows
+        self.visible = False
+        self.font = None
+        self.surface = None
+        self.last_render_time = 0.0
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.surface = None
+
+    def _render(self):
+        if self.font is None:
+            self.font = pygame.font.SysFont("monospace", 14)
+        lines = [f"{'stage':<28}{'p50':>8}{'p95':>8}{'p99':>8}{'/s':>7}"]
+        for stage, values in list(self.stats.summary().items())[:self.max_rows]:
+            lines.append(f"{stage:<28}{values['p50_ms']:>8.2f}{values['p95_ms']:>8.2f}"
+                         f"{values['p99_ms']:>8.2f}{values['rate']:>7.1f}")
+
+        line_height = self.font.get_linesize()
+        width = max(self.font.size(line)[0] for line in lines) + 16
+        surface = pygame.Surface((width, line_height * len(lines) + 12), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 170))
+        for i, line in enumerate(lines):
+            surface.blit(self.font.render(line, True, (200, 255, 200)), (8, 6 + i * line_height))
+        return surface
+
+    def draw(self, screen):
+        if not self.visible:
+            return
+        now = time.monotonic()
+        if self.surface is None or now - self.last_render_time >= self.refresh:
+            self.surface = self._render()
+            self.last_render_time = now
+        screen.blit(self.surface, (8, 8))
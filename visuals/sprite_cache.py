@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pygame
+from config import SPRITE_CACHE_SIZE, SPRITE_ALPHA_LEVELS
+
+
+class SpriteCache:
+    """
+    半透明の円のスプライト（SRCALPHA の Surface）を、(半径, 色, 量子化した不透明度) ごとに1枚だけ作って使い回すクラス
+    粒子ごとに毎フレーム Surface を作る代わりに、ここで作ったスプライトを Surface.blits でまとめて描画する
+    スプライトの数が max_sprites を超えた場合は、最も長く使われていないものから捨てる
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """全てのエフェクトで共有するキャッシュを返す"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __init__(self, max_sprites=SPRITE_CACHE_SIZE, alpha_levels=SPRITE_ALPHA_LEVELS):
+        self.max_sprites = max_sprites
+        self.alpha_step = 255 / (alpha_levels - 1)
+        self.sprites = OrderedDict()  # (半径, r, g, b, 不透明度の段階) -> Surface
+        self.hits = 0
+        self.allocations = 0
+        self.evictions = 0
+
+    def quantize_alpha(self, alphas):
+        """不透明度 (0-255) を alpha_levels 段階の番号にする"""
+        return np.rint(np.clip(alphas, 0, 255) / self.alpha_step).astype(np.int64)
+
+    def _get(self, key):
+        """(半径, r, g, b, 不透明度の段階) の円のスプライト。大きさは (2*半径+1) 四方で、円の中心は (半径, 半径)"""
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+        radius, r, g, b, level = key
+        sprite = pygame.Surface((2 * radius + 1, 2 * radius + 1), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, (r, g, b, int(round(level * self.alpha_step))), (radius, radius), radius)
+        # 透明な画素を飛ばして転送できるよう、RLE で圧縮させる（画素ごとの不透明度はそのまま使われる）
+        sprite.set_alpha(255, pygame.RLEACCEL)
+        self.allocations += 1
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+            self.evictions += 1
+        return sprite
+
+    def draw_circles(self, screen, x, y, radii, colors, alphas=255):
+        """
+        中心 (x, y)・半径・色 (N,3)・不透明度の円を、1回の Surface.blits で描画する
+        radii・colors・alphas はスカラー（全ての円で共通）でもよい
+        """
+        n = len(x)
+        if n == 0:
+            return
+        radii = np.broadcast_to(np.asarray(radii, dtype=np.int64), (n,))
+        colors = np.broadcast_to(np.asarray(colors, dtype=np.int64), (n, 3))
+        levels = np.broadcast_to(self.quantize_alpha(alphas), (n,))
+
+        # 同じスプライトを使う円をまとめ、スプライトの取得は種類ごとに1回だけ行う
+        keys = ((((radii * 256 + colors[:, 0]) * 256 + colors[:, 1]) * 256 + colors[:, 2]) * 256 + levels)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        sprites = np.empty(len(unique_keys), dtype=object)
+        for i, key in enumerate(unique_keys.tolist()):
+            key, level = divmod(key, 256)
+            key, b = divmod(key, 256)
+            radius, rg = divmod(key, 65536)
+            sprites[i] = self._get((radius, rg // 256, rg % 256, b, level))
+
+        left = (np.asarray(x) - radii).astype(np.int32).tolist()
+        top = (np.asarray(y) - radii).astype(np.int32).tolist()
+        screen.blits(list(zip(sprites[inverse.ravel()].tolist(), zip(left, top))), doreturn=False)
+
+    def get_stats(self):
+        total = self.hits + self.allocations
+        return {
+            "hits": self.hits,
+            "allocations": self.allocations,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "sprites": len(self.sprites),
+        }